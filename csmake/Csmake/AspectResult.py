@@ -47,6 +47,7 @@ class AspectResult(Result):
     #      Status overwritten.
 
     def log(self, level, output, *params):
+        self._announceRecord(level, output, params)
         try:
             self.write("        &%s@(%s): %s: %s\n" % (
                 self.params['Type'],
@@ -0,0 +1,176 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import ConfigParser
+import os
+import os.path
+import time
+import threading
+
+class BuildspecCache:
+    """Keeps the parsed contents of csmakefiles (and included specs)
+       so a spec that has not changed is not parsed again.
+
+       Every entry is kept with the mtime and size of the file it came
+       from and the file is parsed again when either changes.
+       If a cache (see UserCache) is given, the entries are kept between
+       runs in a single file.  When it is saved, entries for files that
+       are gone or have changed and entries not used in MAX_AGE_SECONDS
+       are dropped, and only the MAX_SPECS most recently used are kept.
+
+       The parsed form of a spec is:
+           {'defaults' : [[option, value], ...],
+            'sections' : [[section, [[option, value], ...]], ...]}
+       in the order they appear in the spec."""
+
+    VERSION = 2
+
+    #Files changed this recently may change again within
+    #  the same mtime, so they are not saved
+    SETTLE_SECONDS = 2
+
+    MAX_SPECS = 100
+    MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+    #The time an entry was last used is only brought up to date
+    #  this often, so using the cache doesn't rewrite it every run
+    USED_SECONDS = 24 * 60 * 60
+
+    def __init__(self, cache=None, log=None):
+        self.cache = cache
+        self.log = log
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.specs = {}
+        if cache is not None:
+            document = cache.load()
+            if isinstance(document, dict) \
+                and document.get('version') == BuildspecCache.VERSION:
+                self.specs = document.get('specs', {})
+
+    @staticmethod
+    def _native(value):
+        #json gives back unicode, ConfigParser gives str
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    @staticmethod
+    def _nativePairs(pairs):
+        return [ [ BuildspecCache._native(key), BuildspecCache._native(value) ]
+                 for key, value in pairs ]
+
+    @staticmethod
+    def _fromCache(parsed):
+        return {
+            'defaults' : BuildspecCache._nativePairs(parsed['defaults']),
+            'sections' : [
+                [ BuildspecCache._native(name),
+                  BuildspecCache._nativePairs(options) ]
+                for name, options in parsed['sections'] ] }
+
+    @staticmethod
+    def parseFile(path):
+        """Parses the spec as csmake's ConfigParser would"""
+        parser = ConfigParser.RawConfigParser()
+        parser.optionxform = str
+        with open(path) as spec:
+            parser.readfp(spec, path)
+        return {
+            'defaults' : [ [key, value]
+                           for key, value in parser._defaults.items() ],
+            'sections' : [
+                [ name,
+                  [ [key, value] for key, value in options.items()
+                    if key != '__name__' ] ]
+                for name, options in parser._sections.items() ] }
+
+    def parse(self, path):
+        """Returns the parsed form of the spec at path.
+           Raises the same errors as ConfigParser would"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.specs.get(path)
+        now = time.time()
+        if entry is not None \
+            and entry[0] == stat.st_mtime \
+            and entry[1] == stat.st_size:
+            if now - entry[3] > BuildspecCache.USED_SECONDS:
+                with self.lock:
+                    entry[3] = now
+                    self.dirty = True
+            return BuildspecCache._fromCache(entry[2])
+        parsed = BuildspecCache.parseFile(path)
+        with self.lock:
+            if now - stat.st_mtime > BuildspecCache.SETTLE_SECONDS:
+                self.specs[path] = [stat.st_mtime, stat.st_size, parsed, now]
+                self.dirty = True
+            elif path in self.specs:
+                del self.specs[path]
+                self.dirty = True
+        return parsed
+
+    @staticmethod
+    def merge(parser, parsed):
+        """Adds a parsed spec to a ConfigParser the way reading the
+           spec would: options of a section that already exists are
+           added to it.  Returns the names of the sections in the spec"""
+        for key, value in parsed['defaults']:
+            parser._defaults[key] = value
+        result = []
+        for name, options in parsed['sections']:
+            section = parser._sections.get(name)
+            if section is None:
+                section = parser._dict()
+                section['__name__'] = name
+                parser._sections[name] = section
+            for key, value in options:
+                section[key] = value
+            result.append(name)
+        return result
+
+    def _prune(self):
+        #NOTE: Must be called with the lock held
+        now = time.time()
+        kept = []
+        for path, entry in self.specs.iteritems():
+            if now - entry[3] > BuildspecCache.MAX_AGE_SECONDS:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if entry[0] != stat.st_mtime or entry[1] != stat.st_size:
+                continue
+            kept.append((entry[3], path, entry))
+        kept.sort(reverse=True)
+        self.specs = dict([
+            (path, entry)
+            for used, path, entry in kept[:BuildspecCache.MAX_SPECS] ])
+
+    def save(self):
+        if self.cache is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            self._prune()
+            document = {
+                'version' : BuildspecCache.VERSION,
+                'specs' : self.specs }
+            self.dirty = False
+        self.cache.save(document)
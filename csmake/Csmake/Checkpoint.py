@@ -0,0 +1,240 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import json
+import base64
+import cPickle
+import threading
+from StepCache import StepCache
+
+class Checkpoint:
+    """Records every step that passes in a build so a build that failed
+       can be run again with --resume, skipping the steps that passed
+       and haven't changed since.
+
+       The checkpoint is kept in the results directory as one json
+       object per line, written as each step passes:
+           {"section", "phase", "fingerprint",
+            "return" : the step's return value (base64 pickle),
+            "outputs" : [[location, mtime, size], ...] the files the
+                        step declared (**maps, **yields-files),
+            "env" : the csmake environment after the step (if changed),
+            "transPhase" : the trans-phase environment (if changed)}
+
+       The fingerprint is the same as the --step-cache fingerprint
+       (see StepCache.digest) except files are compared by their stat
+       instead of their content so it stays cheap to compute for every
+       step.  A step is skipped when its fingerprint is in the
+       checkpoint and its outputs haven't changed.
+       Steps that run other steps or change the environment
+       (StepCache.NEVER_CACHE) and steps with aspects are never skipped.
+
+       The checkpoint is removed when the build passes"""
+
+    VERSION = 1
+
+    FILENAME = '.csmake-checkpoint'
+
+    def __init__(self, path, resume=False, log=None):
+        self.path = path
+        self.log = log
+        self.lock = threading.Lock()
+        self.completed = {}
+        self.stream = None
+        mode = 'w'
+        if resume:
+            #The steps that passed stay in the checkpoint
+            #  in case this build fails too
+            self.completed = Checkpoint.load(path, log)
+            mode = 'a'
+        try:
+            self.stream = open(path, mode)
+        except (IOError, OSError) as e:
+            self._devdebug("Checkpoint '%s' will not be written: %s", path, str(e))
+
+    def _devdebug(self, output, *params):
+        if self.log is not None:
+            self.log.devdebug(output, *params)
+
+    @staticmethod
+    def load(path, log=None):
+        """Returns {fingerprint : entry} from the checkpoint at path"""
+        result = {}
+        try:
+            with open(path) as checkpoint:
+                for line in checkpoint:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        #A build that was killed may leave half a line
+                        continue
+                    if isinstance(entry, dict) \
+                        and entry.get('version') == Checkpoint.VERSION:
+                        result[entry['fingerprint']] = entry
+        except (IOError, OSError) as e:
+            if log is not None:
+                log.devdebug("No checkpoint to resume from '%s': %s", path, str(e))
+        return result
+
+    @staticmethod
+    def _statPath(digest, path):
+        digest.update('\0path:%s' % path)
+        try:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        filepath = os.path.join(root, name)
+                        info = os.stat(filepath)
+                        digest.update('\0file:%s:%r:%d' % (
+                            os.path.relpath(filepath, path),
+                            info.st_mtime,
+                            info.st_size ))
+            else:
+                info = os.stat(path)
+                digest.update('\0stat:%r:%d:%d' % (
+                    info.st_mtime,
+                    info.st_size,
+                    info.st_ino ))
+        except OSError:
+            digest.update('\0missing')
+
+    def fingerprint(self, engine, section, instance, stepdict, phase, aspects):
+        """Returns the fingerprint of the step or None if the step is
+           never skipped"""
+        if section.split('@')[0] in StepCache.NEVER_CACHE \
+            or len(aspects) != 0:
+            return None
+        try:
+            return StepCache.digest(
+                'csmake-checkpoint:%d' % Checkpoint.VERSION,
+                engine,
+                section,
+                instance,
+                stepdict,
+                phase,
+                Checkpoint._statPath )
+        except Exception as e:
+            self._devdebug("Step '%s' has no checkpoint: %s", section, str(e))
+            return None
+
+    @staticmethod
+    def _stat(location):
+        try:
+            info = os.stat(location)
+        except OSError:
+            return None
+        return [info.st_mtime, info.st_size]
+
+    def begin(self, instance):
+        """Returns what is needed to see how the step changed the
+           environment, pass it to record"""
+        return (instance.env.env.generation, dict(instance.env.transPhase))
+
+    @staticmethod
+    def _strings(dictionary):
+        return dict([
+            (key, value) for key, value in dictionary.iteritems()
+            if isinstance(value, basestring) ])
+
+    def record(self, fingerprint, instance, phase, begun):
+        """Writes the checkpoint for a step that passed"""
+        if self.stream is None:
+            return
+        try:
+            generation, transPhase = begun
+            env = instance.env
+            entry = {
+                'version' : Checkpoint.VERSION,
+                'section' : instance.calledId,
+                'phase' : phase,
+                'fingerprint' : fingerprint,
+                'return' : base64.b64encode(cPickle.dumps(
+                    instance.log.getReturnValue(phase),
+                    2 )),
+                'outputs' : [] }
+            for location in StepCache.outputs(instance):
+                info = Checkpoint._stat(location)
+                if info is not None:
+                    entry['outputs'].append([location] + info)
+            if env.env.generation != generation:
+                entry['env'] = Checkpoint._strings(env.env)
+            if env.transPhase != transPhase:
+                entry['transPhase'] = Checkpoint._strings(env.transPhase)
+            line = json.dumps(entry)
+        except Exception as e:
+            self._devdebug(
+                "Step '%s' could not be checkpointed: %s",
+                instance.calledId,
+                str(e) )
+            return
+        with self.lock:
+            try:
+                self.stream.write(line + '\n')
+                self.stream.flush()
+            except (IOError, OSError, ValueError) as e:
+                self._devdebug("Checkpoint could not be written: %s", str(e))
+
+    @staticmethod
+    def _native(value):
+        #json gives back unicode
+        if isinstance(value, unicode):
+            return value.encode('utf-8')
+        return value
+
+    def restore(self, fingerprint, instance, phase):
+        """Puts back the result of a step that passed in the build
+           being resumed.  Returns True if the step can be skipped"""
+        entry = self.completed.get(fingerprint)
+        if entry is None:
+            return False
+        try:
+            for output in entry['outputs']:
+                if Checkpoint._stat(output[0]) != output[1:]:
+                    self._devdebug(
+                        "Step '%s' output '%s' changed since the checkpoint",
+                        instance.calledId,
+                        output[0] )
+                    return False
+            returnValue = cPickle.loads(base64.b64decode(entry['return']))
+        except (KeyError, TypeError, ValueError, cPickle.PickleError) as e:
+            self._devdebug(
+                "Step '%s' checkpoint not used: %s",
+                instance.calledId,
+                str(e) )
+            return False
+        env = instance.env
+        for key, value in entry.get('transPhase', {}).iteritems():
+            env.addTransPhase(Checkpoint._native(key), Checkpoint._native(value))
+        for key, value in entry.get('env', {}).iteritems():
+            env.env[Checkpoint._native(key)] = Checkpoint._native(value)
+        instance.log.setReturnValue(returnValue, phase)
+        instance.log.passed()
+        return True
+
+    def finish(self, passed):
+        """Closes the checkpoint, it is removed if the build passed"""
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        if passed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -42,6 +42,24 @@ from ProgramResult import ProgramResult
 from AspectResult import AspectResult
 from AspectFlowControl import AspectFlowControl
 from ParallelLaunchStack import ParallelLaunchStack
+from ParallelExecutor import ParallelExecutor
+from SectionIndex import SectionIndex
+from ModuleIndex import ModuleIndex
+from UserCache import UserCache
+from DocHarvester import DocHarvester
+from StepCache import StepCache
+from Checkpoint import Checkpoint
+from TimingHistory import TimingHistory
+from Plan import Plan
+from Profiler import Profiler
+from CriticalPath import CriticalPath
+from ResultOutput import ResultOutput
+from EventStream import EventStream
+from OutputMultiplexer import OutputMultiplexer
+from BuildspecCache import BuildspecCache
+from OutBuildspec import OutBuildspec
+from CsmakeServer import CsmakeServer
+from ProcessGroup import ProcessGroup
 from MetadataManager import DefaultMetadataModule
 import phases
 
@@ -62,12 +80,21 @@ CSMAKE_LIBRARY_VERSION = "1.10.1"
 
 class CliDriver(object):
 
+    #A csmake server (see CsmakeServer) keeps these warm between builds
+    sharedModuleIndex = None
+    sharedBuildspecCache = None
+
     def __init__(self, settings={}, name='<name>', version='<version>'):
         self.currentPhase = 'default'
+        self.settingsSeed = settings
         self.settings = Settings(settings)
         self.scriptName = name
         self.scriptVersion = version
         self.modulePathConstruct = None
+        self.moduleIndex = None
+        self.docHarvester = None
+        self.stepCache = None
+        self.stepCacheLock = threading.Lock()
         #This will be replaced with a "Results" type object
         logging.basicConfig()
         self.log = logging.getLogger("%s.%s" % (
@@ -81,14 +108,23 @@ class CliDriver(object):
         self.environment = Environment(self)
         self.launchStack = ParallelLaunchStack()
         self.launchStack.append(self)
+        self.parallelExecutor = None
+        self.parallelExecutorLock = threading.Lock()
         self.results = []
         self.buildspecLock = threading.Lock()
         self.buildspec = ConfigParser.RawConfigParser()
         self.buildspec.optionxform = str
-        self.outBuildspec = ConfigParser.RawConfigParser()
-        self.outBuildspec.optionxform = str
+        self.outBuildspec = OutBuildspec(self.buildspec)
+        self.buildspecCache = None
+        self.includedBuildspecs = []
+        self.sectionIndex = SectionIndex()
         self.phasesDecl = None
         self.onBuildExits = {}
+        self.listeners = []
+        self.recording = threading.local()
+        self.outputMultiplexer = None
+        self.checkpoint = None
+        self.timingHistory = None
         os.setpgrp()
         #H/T https://stackoverflow.com/questions/15200700/how-do-i-set-the-terminal-foreground-process-group-for-a-process-im-running-und
         self.ttou_handler = signal.signal(signal.SIGTTOU, signal.SIG_IGN)
@@ -152,17 +188,9 @@ class CliDriver(object):
                 self.log.error("import %s: Subpackages are not allowed for csmake modules", fullname)
                 raise ImportError(fullname)
 
-            imp.acquire_lock()
-            try:
-                if 'CsmakeModules' in sys.modules:
-                    csmakeModulesModule = sys.modules['CsmakeModules']
-                    if nameparts[1] in csmakeModulesModule.__dict__:
-                        self.log.devdebug("Module already loaded")
-                        return csmakeModulesModule.__dict__[nameparts[1]]
-            finally:
-                imp.release_lock()
-
-            self.log.devdebug("Loading module for the first time")
+            #_loadModules will use the module if it is already loaded
+            #  from the file that would be found for it
+            self.log.devdebug("Looking up module for import")
             modules, warnings = self._loadModules(nameparts[1])
             if len(warnings) != 0:
                 self.log.warning("import %s:  There were some problems")
@@ -296,38 +324,87 @@ class CliDriver(object):
         phases.__dict__['~~phases~~'] = phases.phases
         modules.append(('(built-in)', '~~phases~~', phases, phases.phases))
 
+    def _listModuleFiles(self):
+        """Returns [(path, name, modulePath)] for every module in the
+           module paths, in the order the modules would be loaded"""
+        moduleIndex = self._getModuleIndex()
+        result = []
+        for pathtype, path in self._constructModulePaths():
+            packagePath = "%s/CsmakeModules" % path
+            names = moduleIndex.moduleNames(packagePath)
+            if names is None:
+                continue
+            for name in names:
+                modulePath = "%s/%s.py" % (packagePath, name)
+                if os.path.isfile(modulePath):
+                    result.append((packagePath, name, modulePath))
+        return result
+
+    def _getDocHarvester(self):
+        if self.docHarvester is None:
+            cache = None
+            if not self.settings['no-module-cache']:
+                cache = UserCache('module-docs.json', self.log)
+            self.docHarvester = DocHarvester(cache, self.log)
+        return self.docHarvester
+
+    def _getModuleDocString(self, name, modulePath, actualModule, warnings, load):
+        """Gets the docstring from the module source when possible,
+           only importing the module when load is True or the docstring
+           can't be found in the source"""
+        found = False
+        docString = None
+        if modulePath is not None:
+            found, docString = self._getDocHarvester().docstring(
+                modulePath,
+                name )
+        if actualModule is None and (load or not found):
+            modules, loadWarnings = self._loadModules(name)
+            warnings.extend(loadWarnings)
+            if len(modules) != 0:
+                actualModule = modules[0][3]
+        if not found:
+            docString = "<<Module not documented>>"
+            try:
+                docString = actualModule.__doc__
+            except:
+                pass
+        try:
+            if docString is not None and '\n' in docString:
+                doclines = docString.split('\n')
+                docString = "%s\n%s" % (
+                    doclines[0],
+                    textwrap.dedent('\n'.join(doclines[1:])))
+        except:
+            pass
+        return docString
+
     def dumpTypes(self, singleType=None):
         self._parseModulePaths()
-        modules, warnings = self._loadModules()
+        warnings = []
+        modules = [
+            (path, name, modulePath, None)
+            for path, name, modulePath in self._listModuleFiles() ]
+        internals = []
+        self._addInternalDumpTypes(internals)
+        for path, name, module, actualModule in internals:
+            modules.append((path, name, None, actualModule))
         outputBlobs = {}
-        self._addInternalDumpTypes(modules)
-        for path, name, module, actualModule in modules:
-            self.log.devdebug("---Gathering %s, %s, %s, %s",
+        for path, name, modulePath, actualModule in modules:
+            self.log.devdebug("---Gathering %s, %s, %s",
                 path,
                 name,
-                module,
-                actualModule )
+                modulePath )
             if name in outputBlobs.keys():
                 warnings.append([
                     "Warning: found duplicate module '%s'" % name,
                     "    Loaded:     %s" % outputBlobs[name]["path"],
                     "    NOT Loaded: %s" % path])
                 continue
-
-            result = actualModule
-            docString = "<<Module not documented>>"
-            try:
-                docString = result.__doc__
-                if docString is not None and '\n' in docString:
-                    doclines = docString.split('\n')
-                    docString = "%s\n%s" % (
-                        doclines[0],
-                        textwrap.dedent('\n'.join(doclines[1:])))
-            except:
-                pass
             outputBlobs[name] = {
                 "path" : path,
-                "doc" : docString
+                "modulePath" : modulePath,
+                "actualModule" : actualModule
             }
 
         blobKeys = outputBlobs.keys()
@@ -340,6 +417,13 @@ class CliDriver(object):
                 self.chat("Error: Module (Section Type) not defined: %s" % singleType)
                 self.log.forceQuiet()
                 sys.exit(255)
+        for key in blobKeys:
+            outputBlobs[key]['doc'] = self._getModuleDocString(
+                key,
+                outputBlobs[key]['modulePath'],
+                outputBlobs[key]['actualModule'],
+                warnings,
+                singleType is not None )
         for key in blobKeys:
             self.chat("_"*51)
             self.chat("")
@@ -371,6 +455,99 @@ class CliDriver(object):
                 self.chat("")
         self.phasesDecl.dumpMulticommands()
 
+    def addListener(self, listener):
+        """Listeners are told when phases, steps, and aspect joinpoints
+           start and end.  A listener may implement any of:
+               phaseStarted(phase)
+               phaseEnded(token, phase, passed)
+               stepStarted(step, phase)
+               stepEnded(token, step, section, phase, result)
+               joinpointStarted(joinpoint, phase, execinstance)
+               joinpointEnded(token, joinpoint, phase, execinstance)
+                   - only for joinpoints an aspect of the step advises
+               logRecord(result, level, message)
+                   - a step (or csmake) logged a message
+               commandGroups(calledId, phase, groups)
+                   - a command is about to run its steps
+                     (see announceCommand)
+               close() - called when csmake exits
+           Whatever a ...Started method returns is passed as the token
+           to the matching ...Ended method."""
+        self.listeners = self.listeners + [listener]
+
+    def launchParallelStep(self, step, phase):
+        """Launches a step that is running alongside other steps.
+           With --parallel-output the step's output (and that of any
+           subprocess it starts) is kept apart from the other steps"""
+        if self.outputMultiplexer is None:
+            return self.launchStep(step, phase)
+        channel = self.outputMultiplexer.open(step)
+        try:
+            return self.launchStep(step, phase)
+        finally:
+            channel.close()
+
+    def announceCommand(self, calledId, groups):
+        """Called by command sections with the ','/'&' structure
+           of the steps they are about to run (a list of lists of
+           step names)"""
+        if len(self.listeners) > 0:
+            self._fireListeners(
+                'commandGroups',
+                None,
+                calledId,
+                self.getPhase(),
+                groups )
+
+    def _logRecord(self, result, level, output, params):
+        if len(self.listeners) == 0 \
+            or getattr(self.recording, 'active', False):
+            return
+        try:
+            message = output % params
+        except:
+            message = "%s %s" % (str(output), str(params))
+        #A listener that logs must not be told about its own records
+        self.recording.active = True
+        try:
+            self._fireListeners('logRecord', None, result, level.strip(), message)
+        finally:
+            self.recording.active = False
+
+    def _fireListeners(self, event, tokens, *args):
+        """Calls 'event' on every listener, returning the results.
+           tokens is None for a ...Started event or the result of the
+           ...Started event for a ...Ended event"""
+        listeners = self.listeners
+        results = []
+        for index, listener in enumerate(listeners):
+            result = None
+            method = getattr(listener, event, None)
+            if method is not None:
+                try:
+                    if tokens is None:
+                        result = method(*args)
+                    elif index < len(tokens):
+                        result = method(tokens[index], *args)
+                except Exception:
+                    self.log.exception(
+                        "Listener '%s' failed on '%s'",
+                        listener.__class__.__name__,
+                        event )
+            results.append(result)
+        return results
+
+    def _closeListeners(self):
+        for listener in self.listeners:
+            method = getattr(listener, 'close', None)
+            if method is not None:
+                try:
+                    method()
+                except Exception:
+                    self.log.exception(
+                        "Listener '%s' failed to close",
+                        listener.__class__.__name__ )
+
     def registerBuildExitCallback(self, callback):
         #Takes a callback that takes no parameters
         #Returns a uuid key to unregister the callback
@@ -470,6 +647,7 @@ class CliDriver(object):
             self.logfile = sys.stdout
         self.log = ProgramResult(self.environment, self.scriptVersion, {'Out' : self.logfile })
         self.log.setTargetModule(self)
+        self.log.recordListener = self._logRecord
 
     def _getOptions(self):
         self.getFileOptions([environ['HOME']+"/.csmake.conf", "./.csmake.conf"])
@@ -555,24 +733,9 @@ class CliDriver(object):
 
     def _lookupAspects(self, step):
         stepId = step
-        result = []
         if '@' in step:
             stepId = step.split('@')[1]
-        sections = None
-        self.buildspecLock.acquire()
-        try:
-            sections = self.buildspec.sections()
-        finally:
-            self.buildspecLock.release()
-        for section in sections:
-            if section[0] != '&':
-                continue
-            parts = section.split('@')
-            if len(parts) == 2:
-                cutsParts = parts[1].split(' ')
-                if cutsParts[0] == stepId:
-                    result.append(section)
-        return result
+        return self.sectionIndex.lookupAspects(stepId)
 
     def lookupSection(self, step):
         #TODO: Detect ambiguity
@@ -581,19 +744,64 @@ class CliDriver(object):
                 return step
             else:
                 return None
-        sections = None
+        return self.sectionIndex.lookupSection(step)
+
+    def getParallelExecutor(self):
+        """Returns the executor shared by all parallel steps in the build
+           The executor is limited by --parallel-limit"""
+        self.parallelExecutorLock.acquire()
+        try:
+            if self.parallelExecutor is None:
+                limit = self.settings['parallel-limit']
+                try:
+                    limit = int(limit)
+                except (ValueError, TypeError):
+                    self.log.error(
+                        "--parallel-limit must be a number, got '%s'",
+                        str(limit) )
+                    raise
+                if limit < 0:
+                    raise ValueError("--parallel-limit must be 0 or more")
+                self.parallelExecutor = ParallelExecutor(limit, self.log)
+            return self.parallelExecutor
+        finally:
+            self.parallelExecutorLock.release()
+
+    def getStepCache(self):
+        """Returns the cache of step results or None if --step-cache
+           is not in use"""
+        if not self.settings['step-cache']:
+            return None
+        self.stepCacheLock.acquire()
+        try:
+            if self.stepCache is None:
+                size = self.settings['step-cache-size']
+                try:
+                    size = int(size)
+                except (ValueError, TypeError):
+                    self.log.error(
+                        "--step-cache-size must be a number, got '%s'",
+                        str(size) )
+                    raise
+                self.stepCache = StepCache(
+                    os.path.join(UserCache.cacheDirectory(), 'steps'),
+                    size * 1024 * 1024,
+                    self.log )
+            return self.stepCache
+        finally:
+            self.stepCacheLock.release()
+
+    def getSectionOptions(self, section):
+        """Returns a new dictionary with the raw options of the section"""
+        result = {}
         self.buildspecLock.acquire()
         try:
-            sections = self.buildspec.sections()
+            stanzas = self.buildspec.options(section)
+            for stanza in stanzas:
+                result[stanza] = self.buildspec.get(section, stanza)
         finally:
             self.buildspecLock.release()
-        for section in sections:
-            if section[0] == '&':
-                continue
-            parts = section.split('@')
-            if len(parts) == 2 and parts[1] == step:
-                return section
-        return None
+        return result
 
     def launchAspects(
         self,
@@ -608,26 +816,54 @@ class CliDriver(object):
             return False
 
         execinstance.log.devdebug("Invoking %s on aspects", joinpoint)
+        return self._dispatchAspects(
+            aspects,
+            joinpoint,
+            phase,
+            execinstance,
+            stepdict,
+            extraOptions )
+
+    def _dispatchAspects(
+        self,
+        aspects,
+        joinpoint,
+        phase,
+        execinstance,
+        stepdict,
+        extraOptions ):
+        #Aspects that don't advise the joinpoint are skipped quietly,
+        # the listeners only hear about joinpoints that are advised
         joinpointsImplemented = False
-
-        for aspect, aspectdict in aspects:
-            aspectdict.update(extraOptions)
-            execinstance.log.devdebug(
-                "Dispatching '%s' Aspect: %s",
-                joinpoint,
-                repr(aspect))
-            method = None
-            try:
-                method = aspect._joinPointLookup(
-                    joinpoint,
-                    phase,
-                    aspectdict )
-            except:
-                aspect.log.exception("Attempt to lookup joinpoint failed")
-            if method is not None:
+        listenerTokens = None
+        try:
+            for aspect, aspectdict in aspects:
+                aspectdict.update(extraOptions)
+                method = None
+                try:
+                    method = aspect._joinPointLookup(
+                        joinpoint,
+                        phase,
+                        aspectdict )
+                except:
+                    aspect.log.exception("Attempt to lookup joinpoint failed")
+                if method is None:
+                    aspect.log.skipped()
+                    aspect._dontValidateFiles()
+                    continue
                 if not joinpointsImplemented:
+                    listenerTokens = self._fireListeners(
+                        'joinpointStarted',
+                        None,
+                        joinpoint,
+                        phase,
+                        execinstance )
                     execinstance.log.chatStartJoinPoint(joinpoint)
                 joinpointsImplemented = True
+                execinstance.log.devdebug(
+                    "Dispatching '%s' Aspect: %r",
+                    joinpoint,
+                    aspect)
                 aspect.log.executing()
                 aspect.log.chatStart()
                 aspect._executeFileMapping(aspectdict)
@@ -637,19 +873,24 @@ class CliDriver(object):
                 aspect._absorbNewMappedFiles()
                 aspect.log.chatStatus()
                 aspect.log.chatEnd()
-            else:
-                aspect.log.skipped()
-                aspect._dontValidateFiles()
-                aspect._absorbNewMappedFiles()
 
-        if not joinpointsImplemented:
-            self.log.debug("No joinpoints were defined: %s", joinpoint)
-        else:
-            execinstance.log.chatEndJoinPoint()
-        execinstance.log.devdebug("Completed %s on aspects", joinpoint)
-        return joinpointsImplemented
+            if not joinpointsImplemented:
+                self.log.debug("No joinpoints were defined: %s", joinpoint)
+            else:
+                execinstance.log.chatEndJoinPoint()
+            execinstance.log.devdebug("Completed %s on aspects", joinpoint)
+            return joinpointsImplemented
+        finally:
+            if joinpointsImplemented:
+                self._fireListeners(
+                    'joinpointEnded',
+                    listenerTokens,
+                    joinpoint,
+                    phase,
+                    execinstance )
 
     def launchStep(self, step, phase):
+        listenerTokens = self._fireListeners('stepStarted', None, step, phase)
         section = "<Unspecified>"
         resultObject = None
         execinstance = None
@@ -679,13 +920,8 @@ class CliDriver(object):
                 'Err':self.log.err(),
                 'Type':sectionType,
                 'Id':sectionId })
-            self.buildspecLock.acquire()
-            try:
-                stanzas = self.buildspec.options(section)
-                for stanza in stanzas:
-                    stepdict[stanza] = self.buildspec.get(section, stanza)
-            finally:
-                self.buildspecLock.release()
+            resultObject.recordListener = self._logRecord
+            stepdict = self.getSectionOptions(section)
 
             self.log.devdebug("stepdict: %s", str(stepdict))
             self.log.devdebug("Looking up module: %s", sectionType)
@@ -713,7 +949,7 @@ class CliDriver(object):
 
             execinstance.initFlowControl(flowcontrol)
             execinstance._initCallInfo(
-                self.outBuildspec._sections[section],
+                self.outBuildspec.writableSection(section),
                 section )
             execinstance._doOptionSubstitutions(stepdict)
 
@@ -725,7 +961,6 @@ class CliDriver(object):
                 'cuts':section }
             aspects = []
             for aspectSection in aspectSections:
-                aspectDict = {}
                 aspectParts = aspectSection.split('@')
                 aspectClass = aspectParts[0][1:]
                 aspectCutsParts = aspectParts[1].split(' ')
@@ -739,15 +974,10 @@ class CliDriver(object):
                 aspectResultInfo['AspectId'] = aspectId
                 self.log.devdebug("Looking up aspect: %s", aspectSection)
 
-                self.buildspecLock.acquire()
-                try:
-                    aspectStanzas = self.buildspec.options(aspectSection)
-                    for stanza in aspectStanzas:
-                        aspectDict[stanza] = self.buildspec.get(aspectSection, stanza)
-                finally:
-                    self.buildspecLock.release()
+                aspectDict = self.getSectionOptions(aspectSection)
 
                 aspectResult = AspectResult(self.environment, aspectResultInfo)
+                aspectResult.recordListener = self._logRecord
                 resultObject.appendChild(aspectResult)
                 aspectInstance = self.getSectionTypeInstance(aspectClass, aspectResult)
 
@@ -761,7 +991,7 @@ class CliDriver(object):
                 aspectResult.setTargetModule(aspectInstance)
                 aspectInstance.initFlowControl(flowcontrol)
                 aspectInstance._initCallInfo(
-                    self.outBuildspec._sections[section],
+                    self.outBuildspec.writableSection(section),
                     section )
                 aspectInstance._doOptionSubstitutions(aspectDict)
 
@@ -791,6 +1021,50 @@ class CliDriver(object):
                 except:
                     self.log.notice("Section '%s' doesn't have a '%s' or 'default' method.  (This is probably okay) ", section, self.getPhase())
             if method is not None:
+                checkpoint = self.checkpoint
+                checkpointPrint = None
+                if checkpoint is not None:
+                    checkpointPrint = checkpoint.fingerprint(
+                        self,
+                        section,
+                        execinstance,
+                        stepdict,
+                        phase,
+                        aspects )
+                if checkpointPrint is not None \
+                    and checkpoint.restore(checkpointPrint, execinstance, phase):
+                    resultObject.info(
+                        "Skipped on --resume: the step passed in the build being resumed" )
+                    launchPassed = True
+                    execinstance._absorbNewMappedFiles()
+                    return execinstance
+                checkpointBegun = None
+                if checkpointPrint is not None:
+                    checkpointBegun = checkpoint.begin(execinstance)
+                stepCache = self.getStepCache()
+                fingerprint = None
+                if stepCache is not None:
+                    fingerprint = stepCache.fingerprint(
+                        self,
+                        section,
+                        execinstance,
+                        stepdict,
+                        phase,
+                        aspects )
+                if fingerprint is not None \
+                    and stepCache.restore(fingerprint, execinstance, phase):
+                    resultObject.info(
+                        "Outputs restored from the step cache (%s)",
+                        fingerprint[:12] )
+                    launchPassed = True
+                    execinstance._absorbNewMappedFiles()
+                    if checkpointPrint is not None:
+                        checkpoint.record(
+                            checkpointPrint,
+                            execinstance,
+                            phase,
+                            checkpointBegun )
+                    return execinstance
                 tryagain = True
                 while tryagain:
                     tryagain = False
@@ -808,6 +1082,17 @@ class CliDriver(object):
                                 execinstance,
                                 stepdict)
                             execinstance._absorbNewMappedFiles()
+                            if fingerprint is not None:
+                                stepCache.store(
+                                    fingerprint,
+                                    execinstance,
+                                    phase )
+                            if checkpointPrint is not None:
+                                checkpoint.record(
+                                    checkpointPrint,
+                                    execinstance,
+                                    phase,
+                                    checkpointBegun )
                         elif execinstance.log.didFail():
                             self.launchAspects(
                                 aspects,
@@ -870,6 +1155,13 @@ class CliDriver(object):
             if resultObject is not None:
                 resultObject.chatStatus()
                 resultObject.chatEnd()
+            self._fireListeners(
+                'stepEnded',
+                listenerTokens,
+                step,
+                section,
+                phase,
+                resultObject )
             self.log.devdebug(" Step Completed: %s" % section)
             self.log.devdebug("-----------------------------------------")
 
@@ -878,14 +1170,34 @@ class CliDriver(object):
             self.log.error("File missing: build specification '%s' could not be found.", spec)
             return False
         else:
+            try:
+                parsed = self._getBuildspecCache().parse(spec)
+            except (IOError, OSError) as e:
+                self.log.error("Build specification '%s' could not be read: %s", spec, str(e))
+                return False
+            self.includedBuildspecs.append(os.path.abspath(spec))
             self.buildspecLock.acquire()
             try:
-                self.buildspec.read([spec])
-                self.outBuildspec.read([spec])
+                known = len(self.buildspec.sections())
+                BuildspecCache.merge(self.buildspec, parsed)
+                self.outBuildspec.include(parsed)
+                #New sections are always added after the known sections
+                self.sectionIndex.add(self.buildspec.sections()[known:])
             finally:
                 self.buildspecLock.release()
             return True
 
+    def _getBuildspecCache(self):
+        if self.buildspecCache is None:
+            cache = None
+            if not self.settings['no-buildspec-cache']:
+                if CliDriver.sharedBuildspecCache is not None:
+                    self.buildspecCache = CliDriver.sharedBuildspecCache
+                    return self.buildspecCache
+                cache = UserCache('buildspecs.json', self.log)
+            self.buildspecCache = BuildspecCache(cache, self.log)
+        return self.buildspecCache
+
     def _loadBuildspec(self):
         makefiles = [ x.strip() for x in self.settings['makefile'].split(',') ]
         wasErrors = False
@@ -913,6 +1225,18 @@ class CliDriver(object):
         finally:
             oldhandler = signal.signal(signal.SIGINT, signal.SIG_IGN)
             self.log.info("csmake exit sequence - ctrl-c disabled")
+            if self.parallelExecutor is not None:
+                self.parallelExecutor.shutdown()
+            if self.outputMultiplexer is not None:
+                self.log.multiplexer = None
+                self.outputMultiplexer.shutdown()
+            if self.moduleIndex is not None:
+                self.moduleIndex.save()
+            if self.buildspecCache is not None:
+                self.buildspecCache.save()
+            if self.docHarvester is not None:
+                self.docHarvester.save()
+            self._closeListeners()
             if self.log.__class__ == ProgramResult \
                and self.fakegit is not None \
                and self.resultsDir is not None:
@@ -935,6 +1259,59 @@ class CliDriver(object):
 
         self._afterLoadSettings()
 
+        if self.settings['serve'] is not None:
+            try:
+                CsmakeServer(self, self.settings['serve']).serve()
+            except (ValueError, IOError, OSError) as e:
+                self.log.error("--serve %s: %s", self.settings['serve'], str(e))
+                sys.exit(1)
+            return
+
+        try:
+            ResultOutput.parseRetention(self.settings['output-retention'])
+        except ValueError as e:
+            self.log.error("--output-retention: %s", str(e))
+            sys.exit(1)
+
+        parallelOutput = self.settings['parallel-output']
+        if parallelOutput not in OutputMultiplexer.MODES:
+            self.log.error(
+                "--parallel-output must be one of %s, got '%s'",
+                ', '.join(OutputMultiplexer.MODES),
+                str(parallelOutput) )
+            sys.exit(1)
+        if parallelOutput != 'direct':
+            self.outputMultiplexer = OutputMultiplexer(
+                self.log.out(),
+                parallelOutput,
+                self.log )
+            self.log.multiplexer = self.outputMultiplexer
+
+        if self.settings['profile-out'] is not None:
+            self.addListener(Profiler(self.settings['profile-out'], self.log))
+        if self.settings['events'] is not None:
+            try:
+                stream = EventStream.openStream(self.settings['events'])
+            except (IOError, OSError) as e:
+                self.log.error(
+                    "--events %s could not be opened: %s",
+                    self.settings['events'],
+                    str(e) )
+                sys.exit(1)
+            self.addListener(EventStream(stream, self.log))
+        if not self.settings['no-timing-history']:
+            self.timingHistory = TimingHistory(
+                TimingHistory.projectPath(
+                    UserCache.cacheDirectory(),
+                    [ x.strip() for x in self.settings['makefile'].split(',') ] ),
+                self.log )
+            self.addListener(self.timingHistory)
+        criticalPath = None
+        if self.settings['critical-path'] \
+            or self.settings['critical-path-out'] is not None:
+            criticalPath = CriticalPath(self, self.log)
+            self.addListener(criticalPath)
+
         target = self.settings['results-dir']
         self.resultsDir = target
         if not os.path.isdir(target):
@@ -989,6 +1366,7 @@ class CliDriver(object):
             self.usage(None, True)
             self.chat( "")
             self.buildspec = ConfigParser.RawConfigParser()
+            self.sectionIndex.clear()
             self._loadBuildspec()
             self.dumpTypes()
             self.dumpActions()
@@ -1022,8 +1400,13 @@ class CliDriver(object):
                 if self.buildspec.has_section(newcommand):
                     logging.critical("The specification has defined a section [command@~~multicommand~~], but this is used by csmake.  Resolution: rename the section with an id that does not start and end with two tildes '~'")
                     sys.exit(99)
-                self.buildspec.add_section(newcommand)
-                self.buildspec.set(newcommand, '0', rawcommand.strip())
+                self.buildspecLock.acquire()
+                try:
+                    self.buildspec.add_section(newcommand)
+                    self.buildspec.set(newcommand, '0', rawcommand.strip())
+                    self.sectionIndex.add([newcommand])
+                finally:
+                    self.buildspecLock.release()
                 #TODO: OUTSPEC: need restructuring...
                 self.outBuildspec.add_section(newcommand)
                 self.outBuildspec.set(newcommand, '0', rawcommand.strip())
@@ -1081,20 +1464,46 @@ class CliDriver(object):
         if len(self.phases) == 0:
             self.phases = [ 'default' ]
 
+        if self.settings['plan']:
+            self._printPlan(command)
+            self.log.forceQuiet()
+            sys.exit(0)
+
+        if not self.settings['no-checkpoint']:
+            self.checkpoint = Checkpoint(
+                os.path.join(self.resultsDir, Checkpoint.FILENAME),
+                self.settings['resume'],
+                self.log )
+        elif self.settings['resume']:
+            self.log.warning("--resume has no effect with --no-checkpoint")
+
         passed = True
         for phase in self.phases:
             self.currentPhase = phase
             phaseValid, phaseDoc = self.phasesDecl.validatePhase(phase)
             self.log.chatStartPhase(phase, phaseDoc)
 
+            listenerTokens = self._fireListeners('phaseStarted', None, phase)
             result = self.launchStep(command, phase)
             self.log.chatEndPhase(phase, phaseDoc)
+            phasePassed = not (result is None or result._didFail())
+            self._fireListeners(
+                'phaseEnded',
+                listenerTokens,
+                phase,
+                phasePassed )
             if result is None or result._didFail() and not self.settings['keep-going']:
                 self.log.failed()
                 passed = False
                 break
             self._endOfPhaseFlush()
 
+        if self.checkpoint is not None:
+            self.checkpoint.finish(passed)
+
+        if criticalPath is not None:
+            self._reportCriticalPath(criticalPath)
+
         if passed:
             self.log.passed()
         else:
@@ -1108,50 +1517,40 @@ class CliDriver(object):
         if not passed:
             sys.exit(1)
 
+    def longestFirst(self, steps, phase):
+        """Orders the members of an '&' group so the ones that took
+           the longest in past builds start first (see TimingHistory)"""
+        if self.timingHistory is None:
+            return steps
+        return self.timingHistory.longestFirst(
+            steps,
+            phase,
+            lambda step: self.lookupSection(step.strip()) )
+
+    def _printPlan(self, command):
+        plan = Plan(self, self.timingHistory, self.log)
+        for phase in self.phases:
+            self.currentPhase = phase
+            for line in Plan.report(plan.walk(command, phase), phase):
+                self.chat(line)
+            self.chat('')
+
+    def _reportCriticalPath(self, criticalPath):
+        analysis = criticalPath.analyze()
+        if self.settings['critical-path-out'] is not None:
+            criticalPath.write(self.settings['critical-path-out'], analysis)
+        if self.settings['critical-path']:
+            for line in criticalPath.report(analysis):
+                self.chat(line)
+
     def _getCurrentProcesses(self):
-        psproc = subprocess.Popen(
-            ['ps', '-e', '-o', 'pid,pgid'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE )
-        pidlist,err = psproc.communicate()
-        psprocpid = str(psproc.pid)
-        processedlist = [ x.split() for x in pidlist.split('\n') if len(x.split()) >= 2 ]
-        processedlist = [ x for x in processedlist if x[0] != psprocpid ]
-        self._previouslyRunningProcesses = processedlist
+        self.processGroup = ProcessGroup(self.log)
+        self.processGroup.snapshot()
 
     def _pgidTerminator(self):
-        psproc = subprocess.Popen(
-            ['ps', '-e', '-o', 'pid,pgid,cmd'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE )
-        pidlist,err = psproc.communicate()
-        psprocpid = str(psproc.pid)
-        processedlist = [ x.split() for x in pidlist.split('\n') if len(x.split()) >= 3 ]
-        processedlist = [ x for x in processedlist if x[0] != psprocpid and x[1] != psprocpid ]
-        #self._pidTreeTerminatorHelper([parent], processedlist)
-        mypid = str(os.getpid())
-        mypgrp = str(os.getpgrp())
-        self.log.debug("csmake pgroup: %s", mypgrp)
-        self.log.devdebug("processedlist: %s", str(processedlist))
-        for item in processedlist:
-            proc = item[0]
-            grp = item[1]
-            cmdname = ' '.join(item[2:])
-            if grp == mypgrp and proc != mypid:
-                if item[0:2] in self._previouslyRunningProcesses:
-                    self.log.devdebug("Process %s running before csmake started", str(item))
-                    continue
-                self.log.warning("Process %s (%s) is being killed - check build to ensure all processes are contained", proc, str(cmdname))
-                try:
-                    subprocess.check_call(
-                        ['kill', '-9', proc],
-                        stdout=self.log.out(),
-                        stderr=self.log.err() )
-                except:
-                    subprocess.call(
-                        ['sudo', 'kill', '-9', proc],
-                        stdout=self.log.out(),
-                        stderr=self.log.err() )
+        #The log may have changed since the snapshot
+        self.processGroup.log = self.log
+        self.processGroup.terminate()
 
     def _finishUp(self):
         #Kill off all child processes
@@ -1228,10 +1627,23 @@ class CliDriver(object):
         warning.append("    Trace:   %s" % trbk)
         return warning
 
+    def _getModuleIndex(self):
+        if self.moduleIndex is None:
+            cache = None
+            if not self.settings['no-module-cache']:
+                if CliDriver.sharedModuleIndex is not None:
+                    self.moduleIndex = CliDriver.sharedModuleIndex
+                    return self.moduleIndex
+                cache = UserCache('module-index.json', self.log)
+            self.moduleIndex = ModuleIndex(cache, self.log)
+        return self.moduleIndex
+
     def _constructModulePaths(self):
         if self.modulePathConstruct is not None:
             return self.modulePathConstruct
 
+        moduleIndex = self._getModuleIndex()
+
         allPaths = []
         #Gather up the proper order of the paths.
         #Avoiding any paths that don't have CsmakeModules subdirectories
@@ -1251,18 +1663,9 @@ class CliDriver(object):
                         allPaths.append((path, syspath))
 
                     #Now look at all the subdirectories
-                    try:
-                        syspathdirs = os.listdir(syspath)
-                        for syssubpath in syspathdirs:
-                            if os.path.isdir(os.path.join(
-                                syspath,
-                                syssubpath,
-                                'CsmakeModules' )):
-                                allPaths.append((path, os.path.join(
-                                    syspath,
-                                    syssubpath )))
-                    except:
-                        pass
+                    for syssubpath in moduleIndex.csmakeSubdirectories(
+                        syspath ):
+                        allPaths.append((path, syssubpath))
             else:
                 if os.path.isdir(os.path.join(
                     path,
@@ -1287,6 +1690,7 @@ class CliDriver(object):
            returns [(path, name, module)], [warnings]"""
 
         allPaths = self._constructModulePaths()
+        moduleIndex = self._getModuleIndex()
 
         modules = []
         warnings = []
@@ -1307,16 +1711,18 @@ class CliDriver(object):
             #If there's a specific target, optimize by seeking the module
             #in the current directory
             found = False
+            names = moduleIndex.moduleNames(packagePath)
+            if names is None:
+                self.log.devdebug("No modules in '%s'", packagePath)
+                continue
             if target is not None and len(target) != 0:
+                if target not in names:
+                    continue
                 packageFiles = ["%s.py"%target]
                 stopOnFoundOrFail = True
             else:
                 stopOnFoundOrFail = False
-                try:
-                    packageFiles = os.listdir(packagePath)
-                except Exception as e:
-                    self.log.devdebug("No modules in '%s'", packagePath)
-                    continue
+                packageFiles = [ "%s.py" % x for x in names ]
 
             for packageFile in packageFiles:
                 modulePath = "%s/%s" % (
@@ -1331,23 +1737,7 @@ class CliDriver(object):
                 try:
                     self.log.devdebug(
                         "Attempting load of '%s'", modulePath)
-                    module = None
-
-                    imp.acquire_lock()
-                    try:
-                        if 'CsmakeModules' in sys.modules:
-                            if name in sys.modules['CsmakeModules'].__dict__:
-                                module = sys.modules['CsmakeModules'].__dict__[name]
-                        else:
-                            sys.modules['CsmakeModules'] = CsmakeModulesModule(self)
-
-                        if module is None:
-                            module = imp.load_source(
-                                name,
-                                modulePath )
-                            sys.modules['CsmakeModules'].__dict__[name] = module
-                    finally:
-                        imp.release_lock()
+                    module = self._loadModuleSource(name, modulePath)
 
                     actualModule = None
                     try:
@@ -1382,6 +1772,35 @@ class CliDriver(object):
                     return (modules, warnings)
         return (modules, warnings)
 
+    def _loadModuleSource(self, name, modulePath):
+        """Loads the module from modulePath as CsmakeModules.<name>.
+           A module already loaded is only used again if it came from
+           the same file and the file hasn't changed since - a csmake
+           server (see CsmakeServer) keeps modules loaded between builds
+           from different directories."""
+        modulePath = os.path.abspath(modulePath)
+        mtime = os.stat(modulePath).st_mtime
+        imp.acquire_lock()
+        try:
+            if 'CsmakeModules' in sys.modules:
+                csmakeModules = sys.modules['CsmakeModules']
+                if name in csmakeModules.__dict__ \
+                    and csmakeModules.__sources__.get(name) \
+                        == (modulePath, mtime):
+                    return csmakeModules.__dict__[name]
+            else:
+                csmakeModules = CsmakeModulesModule(self)
+                sys.modules['CsmakeModules'] = csmakeModules
+
+            module = imp.load_source(
+                name,
+                modulePath )
+            csmakeModules.__dict__[name] = module
+            csmakeModules.__sources__[name] = (modulePath, mtime)
+            return module
+        finally:
+            imp.release_lock()
+
     def getSectionTypeInstance(self, target, logger=None):
         if logger is None:
             logger = Result(self.env, self.log.info)
@@ -0,0 +1,356 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import json
+import time
+import threading
+import collections
+from StepScheduler import StepDependencyGraph
+
+class StepTiming:
+    """The wall clock time of one execution of a step.
+       children are the steps launched while this step ran.
+       groups is the ','/'&' structure of a command (see
+       command._prepareCommand), or None if the step is not a command"""
+
+    def __init__(self, step, phase, thread, parent):
+        self.step = step
+        self.phase = phase
+        self.thread = thread
+        self.parent = parent
+        self.section = step
+        self.status = None
+        self.start = time.time()
+        self.end = None
+        self.children = []
+        self.groups = None
+        self.nodes = None
+        self._members = None
+
+    def duration(self):
+        end = self.end
+        if end is None:
+            end = time.time()
+        return end - self.start
+
+    def members(self):
+        """Returns a list of the groups of the command where each entry
+           is the timing of the group member or None if it did not run.
+           Children are matched to the group members by step name in
+           the order they were started"""
+        if self._members is not None:
+            return self._members
+        if self.groups is None:
+            return None
+        started = collections.defaultdict(collections.deque)
+        for child in sorted(self.children, key=lambda x: x.start):
+            started[child.step].append(child)
+        result = []
+        for group in self.groups:
+            current = []
+            for stepname in group:
+                queue = started.get(stepname)
+                if queue:
+                    current.append(queue.popleft())
+                else:
+                    current.append(None)
+            result.append(current)
+        self._members = result
+        return result
+
+    def toDict(self):
+        result = {
+            'step' : self.step,
+            'section' : self.section,
+            'status' : self.status,
+            'seconds' : round(self.duration(), 6) }
+        if len(self.children) > 0:
+            result['children'] = [
+                child.toDict()
+                for child in sorted(self.children, key=lambda x: x.start) ]
+        return result
+
+class CriticalPath:
+    """Listens to the engine (see CliDriver.addListener) and times
+       every step it runs.  Commands tell the listener how their steps
+       are grouped (the 'commandGroups' event), so at the end of the
+       build the executed command tree can be reported:
+
+         - The critical path: the longest member of each ',' group
+           of a command, followed down into nested commands.  Its
+           length is how long the build would take with no overhead
+           between steps.
+         - The dependency limited time: how long the build would take
+           if each step waited only for the steps it depends on
+           (see StepScheduler.StepDependencyGraph) instead of every
+           ',' barrier before it.  Measured step times are used.
+         - The '&' groups where the members took very different
+           amounts of time, so the group spent most of its time
+           waiting on a single step."""
+
+    #An '&' group is unbalanced when its longest member took at least
+    #  UNBALANCED_RATIO times the mean time of the members and at least
+    #  UNBALANCED_SECONDS longer than the mean.
+    UNBALANCED_RATIO = 2.0
+    UNBALANCED_SECONDS = 1.0
+
+    def __init__(self, engine=None, log=None):
+        self.engine = engine
+        self.log = log
+        self.lock = threading.Lock()
+        self.open = {}
+        self.roots = []
+
+    def _innermost(self, thread):
+        #NOTE: Must be called with the lock held
+        while thread is not None:
+            timings = self.open.get(thread)
+            if timings:
+                return timings[-1]
+            try:
+                thread = thread.parent()
+            except AttributeError:
+                return None
+        return None
+
+    #Engine listener interface
+    def stepStarted(self, step, phase):
+        thread = threading.currentThread()
+        with self.lock:
+            parent = self._innermost(thread)
+            timing = StepTiming(step, phase, thread, parent)
+            if parent is None:
+                self.roots.append(timing)
+            else:
+                parent.children.append(timing)
+            self.open.setdefault(thread, []).append(timing)
+            return timing
+
+    def stepEnded(self, timing, step, section, phase, result):
+        timing.end = time.time()
+        timing.section = section
+        if result is not None:
+            timing.status = result.params['status']
+        with self.lock:
+            timings = self.open.get(timing.thread, [])
+            if timing in timings:
+                timings.remove(timing)
+            if len(timings) == 0 and timing.thread in self.open:
+                del self.open[timing.thread]
+
+    def commandGroups(self, calledId, phase, groups):
+        thread = threading.currentThread()
+        with self.lock:
+            timing = self._innermost(thread)
+        if timing is None:
+            return
+        timing.groups = [
+            [ stepname.strip() for stepname in group
+              if len(stepname.strip()) > 0 ]
+            for group in groups ]
+        if self.engine is None:
+            return
+        try:
+            graph = StepDependencyGraph.forEngine(self.engine)
+            nodes = graph.createNodes(
+                StepDependencyGraph.flattenCommand(timing.groups) )
+            for node in nodes:
+                graph._parseStep(node)
+            graph.analyze([ x for x in nodes if not x.barrier ])
+            timing.nodes = nodes
+        except Exception as e:
+            if self.log is not None:
+                self.log.devdebug(
+                    "Could not work out the dependencies of '%s': %s",
+                    calledId,
+                    str(e) )
+
+    #Analysis
+    @staticmethod
+    def _longest(group):
+        ran = [ x for x in group if x is not None ]
+        if len(ran) == 0:
+            return None
+        return max(ran, key=CriticalPath.barrierTime)
+
+    @staticmethod
+    def barrierTime(timing):
+        """The time the step takes when every ',' is a barrier and
+           there is no overhead"""
+        members = timing.members()
+        if members is None:
+            return timing.duration()
+        result = 0.0
+        for group in members:
+            longest = CriticalPath._longest(group)
+            if longest is not None:
+                result += CriticalPath.barrierTime(longest)
+        return result
+
+    @staticmethod
+    def criticalPath(timing):
+        """Returns the list of (non-command) step timings on the
+           critical path through the step"""
+        members = timing.members()
+        if members is None:
+            return [timing]
+        result = []
+        for group in members:
+            longest = CriticalPath._longest(group)
+            if longest is not None:
+                result.extend(CriticalPath.criticalPath(longest))
+        return result
+
+    @staticmethod
+    def dependencyTime(timing):
+        """The time the step takes when a step waits only for the steps
+           in earlier ',' groups that it depends on.  Steps in the same
+           '&' group still run together, and a barrier step (see
+           StepDependencyGraph) still waits for, and is waited for by,
+           every step in the groups around it"""
+        members = timing.members()
+        if members is None:
+            return timing.duration()
+        if timing.nodes is None:
+            return CriticalPath.barrierTime(timing)
+        flattened = [ x for group in members for x in group ]
+        finishes = []
+        for node in timing.nodes:
+            child = flattened[node.index]
+            duration = 0.0
+            if child is not None:
+                duration = CriticalPath.dependencyTime(child)
+            ready = 0.0
+            for earlier in timing.nodes[:node.index]:
+                if earlier.group == node.group:
+                    continue
+                if node.barrier or earlier.barrier or earlier in node.deps:
+                    ready = max(ready, finishes[earlier.index])
+            finishes.append(ready + duration)
+        return max(finishes + [0.0])
+
+    @staticmethod
+    def unbalancedGroups(timing):
+        """Returns (command timing, group number, member timings) for
+           every unbalanced '&' group in the step and its children"""
+        result = []
+        members = timing.members()
+        if members is None:
+            return result
+        for groupnum, group in enumerate(members):
+            ran = [ x for x in group if x is not None ]
+            if len(ran) >= 2:
+                times = [ x.duration() for x in ran ]
+                longest = max(times)
+                mean = sum(times) / len(times)
+                if longest >= mean * CriticalPath.UNBALANCED_RATIO \
+                    and longest - mean >= CriticalPath.UNBALANCED_SECONDS:
+                    result.append((timing, groupnum, ran))
+            for child in ran:
+                result.extend(CriticalPath.unbalancedGroups(child))
+        return result
+
+    def analyze(self):
+        """Returns a dictionary per top level step (one per phase)"""
+        with self.lock:
+            roots = list(self.roots)
+        result = []
+        for root in roots:
+            wall = root.duration()
+            barrier = CriticalPath.barrierTime(root)
+            dependency = CriticalPath.dependencyTime(root)
+            speedup = None
+            if dependency > 0:
+                speedup = barrier / dependency
+            unbalanced = []
+            for command, groupnum, ran in CriticalPath.unbalancedGroups(root):
+                times = [ x.duration() for x in ran ]
+                longest = max(ran, key=lambda x: x.duration())
+                unbalanced.append({
+                    'command' : command.section,
+                    'group' : groupnum + 1,
+                    'steps' : [ x.step for x in ran ],
+                    'longest' : longest.step,
+                    'longestSeconds' : round(longest.duration(), 6),
+                    'meanSeconds' : round(sum(times) / len(times), 6),
+                    'idle' : round(
+                        1.0 - sum(times) / (len(times) * max(times)), 4) })
+            result.append({
+                'phase' : root.phase,
+                'step' : root.step,
+                'wallSeconds' : round(wall, 6),
+                'criticalPathSeconds' : round(barrier, 6),
+                'criticalPath' : [
+                    { 'step' : x.step,
+                      'section' : x.section,
+                      'seconds' : round(x.duration(), 6) }
+                    for x in CriticalPath.criticalPath(root) ],
+                'dependencySeconds' : round(dependency, 6),
+                'speedup' : None if speedup is None else round(speedup, 4),
+                'unbalanced' : unbalanced,
+                'steps' : root.toDict() })
+        return result
+
+    def report(self, analysis=None):
+        """Returns the analysis as lines of text"""
+        if analysis is None:
+            analysis = self.analyze()
+        lines = []
+        for phase in analysis:
+            lines.append(
+                "Critical path for '%s' in phase '%s': %0.3fs of %0.3fs wall time" % (
+                    phase['step'],
+                    phase['phase'],
+                    phase['criticalPathSeconds'],
+                    phase['wallSeconds'] ))
+            for entry in phase['criticalPath']:
+                lines.append("    %10.3fs  %s" % (
+                    entry['seconds'],
+                    entry['section'] ))
+            if phase['speedup'] is not None:
+                lines.append(
+                    "With ',' only between dependent steps: %0.3fs (%0.2fx speedup)" % (
+                        phase['dependencySeconds'],
+                        phase['speedup'] ))
+            if len(phase['unbalanced']) == 0:
+                lines.append("No unbalanced '&' groups")
+            else:
+                lines.append("Unbalanced '&' groups:")
+                for group in phase['unbalanced']:
+                    lines.append(
+                        "    %s group %d (%s): '%s' took %0.3fs, mean %0.3fs, %d%% idle" % (
+                            group['command'],
+                            group['group'],
+                            '&'.join(group['steps']),
+                            group['longest'],
+                            group['longestSeconds'],
+                            group['meanSeconds'],
+                            int(group['idle'] * 100) ))
+            lines.append("")
+        return lines
+
+    def write(self, path, analysis=None):
+        if analysis is None:
+            analysis = self.analyze()
+        try:
+            with open(path, 'w') as output:
+                json.dump({'phases' : analysis}, output, indent=2)
+        except (IOError, OSError) as e:
+            if self.log is not None:
+                self.log.error(
+                    "Critical path could not be written to '%s': %s",
+                    path,
+                    str(e) )
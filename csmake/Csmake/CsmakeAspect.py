@@ -22,12 +22,50 @@ class CsmakeAspect(CsmakeModule):
            passed
            failed
            exception
-           end """
+           end
+       The methods that advise each joinpoint are found once for each
+       aspect class and phase (see _joinPointTable)"""
+
+    #{(class, phase) : {joinpoint : (specific name, generic name)}}
+    JOIN_POINT_TABLES = {}
 
     def __init__(self, env, log):
         CsmakeModule.__init__(self, env, log)
         self.optionSubstitutionsDone = False
 
+    @classmethod
+    def _joinPointTable(cls, phase):
+        """Returns the names of the methods of the class that advise
+           the joinpoints in the given phase:
+               {joinpoint : (<joinpoint>__<phase> or None,
+                             <joinpoint> or None)}
+           Returns None if the class finds its attributes with
+           __getattr__ or has its own _getDispatchString, so the
+           joinpoints have to be looked up every time"""
+        key = (cls, phase)
+        if key in CsmakeAspect.JOIN_POINT_TABLES:
+            return CsmakeAspect.JOIN_POINT_TABLES[key]
+        if hasattr(cls, '__getattr__') \
+            or cls._getDispatchString.im_func \
+                is not CsmakeAspect._getDispatchString.im_func:
+            table = None
+        else:
+            table = {}
+            suffix = '__%s' % phase
+            for name in dir(cls):
+                if name.startswith('_') \
+                    or not callable(getattr(cls, name, None)):
+                    continue
+                specific, generic = table.get(name, (None, None))
+                table[name] = (specific, name)
+                if name.endswith(suffix) and len(name) > len(suffix):
+                    joinpoint = name[:-len(suffix)]
+                    specific, generic = table.get(joinpoint, (None, None))
+                    table[joinpoint] = (name, generic)
+        #Two threads may both build the table, either one will do
+        CsmakeAspect.JOIN_POINT_TABLES[key] = table
+        return table
+
     def _getDispatchString(self, joinpoint, phase):
         dispatchString = "%s__%s" % (
             joinpoint,
@@ -39,9 +77,23 @@ class CsmakeAspect(CsmakeModule):
         CsmakeModule._doOptionSubstitutions(self, options)
 
     def _joinPointLookup(self, joinpoint, phase, options):
+        table = self._joinPointTable(phase)
+        if table is None:
+            return self._dynamicJoinPointLookup(joinpoint, phase, options)
+        specific, generic = table.get(joinpoint, (None, None))
+        if specific is None and generic is None:
+            return None
+        result = None
+        alsoResult = None
+        if specific is not None:
+            result = getattr(self, specific)
+        if generic is not None:
+            alsoResult = getattr(self, generic)
+        return self._joinPointCall(result, alsoResult)
+
+    def _dynamicJoinPointLookup(self, joinpoint, phase, options):
         result = None
         alsoResult = None
-        finalResult = None
         dispatchString = self._getDispatchString(
             joinpoint,
             phase )
@@ -63,6 +115,13 @@ class CsmakeAspect(CsmakeModule):
             self.log.devdebug(
                 "<<%s join point not implemented>>",
                 dispatchString)
+        return self._joinPointCall(result, alsoResult)
+
+    def _joinPointCall(self, result, alsoResult):
+        """Returns the call for the specific (<joinpoint>__<phase>)
+           and generic (<joinpoint>) advice, or None if neither
+           is implemented"""
+        finalResult = None
         if result is not None and alsoResult is not None:
             #Doing this allows subclasses to override the more
             # specific behavior and still have the generic
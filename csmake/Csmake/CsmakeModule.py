@@ -40,6 +40,7 @@ class CsmakeModule:
         self.newfiles = None
         self.mapping = None
         self.yieldsfiles = None
+        self.yieldedfiles = None
         self.validateFiles = True
         self.deletingFiles = False
         self.outOptions = None
@@ -361,11 +362,12 @@ class CsmakeModule:
     def _absorbNewMappedFiles(self):
         fileManager = self._getFileManager()
         if self.yieldsfiles is not None and self._didPass():
-            fileManager.addFileIndexes(
+            self.yieldedfiles = fileManager.addFileIndexes(
                 self.yieldsfiles,
                 self.env.env['RESULTS'],
                 self.deletingFiles,
-                self.validateFiles )
+                self.validateFiles,
+                produced=True )
         if self.mapping is not None and self._didPass():
             fileManager.absorbMappings(
                 self.mapping,
@@ -18,10 +18,12 @@
 class CsmakeModulesModule:
     """Esoterically named, CsmakeModulesModule is the placeholder object
        For dealing with CsmakeModule regular imports by creating a
-       package/module namespace in python."""
+       package/module namespace in python.
+       __sources__ has the (path, mtime) each module was loaded from"""
 
     def __init__(self, loader):
         self.__file__ = "<csmake modules>"
         self.__package__ = 'CsmakeModule'
         self.__loader__ = loader
         self.__path__ = []
+        self.__sources__ = {}
@@ -0,0 +1,474 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import fcntl
+import json
+import os
+import os.path
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+
+class CsmakeFrames:
+    """The messages between a csmake client and server are frames:
+       a one character kind, a four byte length, and the payload.
+
+       Client to server:
+           'r' - The request: json {argv, cwd, env}
+           'k' - Interrupt the build (the client got ctrl-c)
+       Server to client:
+           'o' - Output for stdout
+           'e' - Output for stderr
+           'x' - The build is done, the payload is the exit code
+
+       Strings in the request are sent as latin-1 so every byte of the
+       arguments and environment makes it through json unchanged."""
+
+    HEADER = struct.Struct('!cI')
+
+    @staticmethod
+    def send(connection, kind, payload=''):
+        connection.sendall(
+            CsmakeFrames.HEADER.pack(kind, len(payload)) + payload )
+
+    @staticmethod
+    def _receiveAll(connection, size):
+        chunks = []
+        while size > 0:
+            chunk = connection.recv(size)
+            if len(chunk) == 0:
+                return None
+            chunks.append(chunk)
+            size -= len(chunk)
+        return ''.join(chunks)
+
+    @staticmethod
+    def receive(connection):
+        """Returns (kind, payload) or (None, None) when the connection
+           is closed"""
+        header = CsmakeFrames._receiveAll(
+            connection,
+            CsmakeFrames.HEADER.size )
+        if header is None:
+            return (None, None)
+        kind, size = CsmakeFrames.HEADER.unpack(header)
+        payload = CsmakeFrames._receiveAll(connection, size)
+        if payload is None:
+            return (None, None)
+        return (kind, payload)
+
+    @staticmethod
+    def encodeRequest(argv, cwd, env):
+        return json.dumps(
+            {'argv' : argv, 'cwd' : cwd, 'env' : env},
+            encoding='latin-1' )
+
+    @staticmethod
+    def decodeRequest(payload):
+        request = json.loads(payload)
+        return (
+            [ x.encode('latin-1') for x in request['argv'] ],
+            request['cwd'].encode('latin-1'),
+            dict([ (key.encode('latin-1'), value.encode('latin-1'))
+                   for key, value in request['env'].iteritems() ]) )
+
+class CsmakeClient:
+    """Runs a csmake command in a csmake server (csmake --serve)
+       instead of in this process.  The output of the build is
+       written to stdout and stderr as the server sends it."""
+
+    def __init__(self, path):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.connection.connect(path)
+        except:
+            self.connection.close()
+            raise
+
+    @staticmethod
+    def requestedServer(args, env):
+        """Returns (path, explicit) for the server that should run the
+           command or (None, False) if the command should run here.
+           A server is asked for with --server or CSMAKE_SERVER"""
+        path = env.get('CSMAKE_SERVER')
+        if path is not None and len(path) == 0:
+            path = None
+        explicit = False
+        for index, arg in enumerate(args):
+            if arg.startswith('--server='):
+                path = arg[len('--server='):]
+                explicit = True
+            elif arg == '--server' and index + 1 < len(args):
+                path = args[index + 1]
+                explicit = True
+            elif arg == '--serve' or arg.startswith('--serve='):
+                return (None, False)
+        return (path, explicit)
+
+    @staticmethod
+    def forward(argv, env=None):
+        """Runs the command in the requested server, if any.
+           Returns the exit code of the command, or None if the command
+           should be run here instead"""
+        if env is None:
+            env = os.environ
+        path, explicit = CsmakeClient.requestedServer(argv[1:], env)
+        if path is None:
+            return None
+        try:
+            client = CsmakeClient(path)
+        except socket.error as e:
+            if explicit:
+                sys.stderr.write(
+                    "csmake: Server '%s' is not available, running here: %s\n"
+                    % (path, str(e)) )
+            return None
+        return client.run(argv, os.getcwd(), dict(env))
+
+    def run(self, argv, cwd, env):
+        try:
+            CsmakeFrames.send(
+                self.connection,
+                'r',
+                CsmakeFrames.encodeRequest(argv, cwd, env) )
+            while True:
+                try:
+                    kind, payload = CsmakeFrames.receive(self.connection)
+                except KeyboardInterrupt:
+                    CsmakeFrames.send(self.connection, 'k')
+                    continue
+                if kind is None:
+                    sys.stderr.write(
+                        "csmake: The server ended the build unexpectedly\n" )
+                    return 1
+                elif kind == 'o':
+                    sys.stdout.write(payload)
+                    sys.stdout.flush()
+                elif kind == 'e':
+                    sys.stderr.write(payload)
+                    sys.stderr.flush()
+                elif kind == 'x':
+                    return int(payload)
+        finally:
+            self.connection.close()
+
+class ServedOutput:
+    """Sends everything written to stdout and stderr (fds 1 and 2) in a
+       served build, including the output of subprocesses, to the client"""
+
+    #Seconds to wait for the output of processes the build left running
+    FINISH_TIMEOUT = 5
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+        self.pumps = []
+        for fd, kind in [(1, 'o'), (2, 'e')]:
+            readfd, writefd = os.pipe()
+            os.dup2(writefd, fd)
+            os.close(writefd)
+            pump = threading.Thread(
+                target=self._pump,
+                args=(readfd, kind),
+                name='csmake-served-%s' % kind )
+            pump.daemon = True
+            pump.start()
+            self.pumps.append(pump)
+
+    def _pump(self, fd, kind):
+        try:
+            while True:
+                chunk = os.read(fd, 65536)
+                if len(chunk) == 0:
+                    break
+                self.send(kind, chunk)
+        except (OSError, socket.error):
+            pass
+        finally:
+            os.close(fd)
+
+    def send(self, kind, payload=''):
+        with self.lock:
+            CsmakeFrames.send(self.connection, kind, payload)
+
+    def finish(self, returncode):
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except IOError:
+                pass
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        os.close(devnull)
+        for pump in self.pumps:
+            pump.join(ServedOutput.FINISH_TIMEOUT)
+        self.send('x', str(returncode))
+
+class CsmakeServer:
+    """Serves csmake commands from csmake clients over a Unix socket
+       (csmake --serve=<path>, see CsmakeClient).
+
+       The server keeps the csmake modules loaded and the build specs
+       parsed (see BuildspecCache) between builds.  The specs and
+       modules used by each build are watched and parsed or loaded
+       again when they change.
+       Every build runs in a process forked from the server with a
+       fresh CliDriver, so the Environment, MetadataManager,
+       FileManager, and everything else about the build is new.
+       The build reports the specs and modules it used back to the
+       server on a pipe when it is done."""
+
+    #Seconds between looks at the watched specs and modules
+    WATCH_SECONDS = 2
+    BACKLOG = 16
+
+    def __init__(self, driver, path):
+        self.driver = driver
+        self.log = driver.log
+        self.path = os.path.abspath(path)
+        self.listener = None
+        self.reports = {}
+        self.buildspecs = set()
+        self.modules = {}
+
+    @staticmethod
+    def _closeOnExec(fd):
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+    def _listen(self):
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise ValueError(
+                    "A csmake server is already running on '%s'" % self.path)
+            except socket.error:
+                #Nothing is listening, the socket was left behind
+                os.remove(self.path)
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        oldmask = os.umask(0077)
+        try:
+            listener.bind(self.path)
+        finally:
+            os.umask(oldmask)
+        listener.listen(CsmakeServer.BACKLOG)
+        CsmakeServer._closeOnExec(listener.fileno())
+        return listener
+
+    @staticmethod
+    def _loadedModules():
+        """Returns [[name, path], ...] for the loaded csmake modules"""
+        if 'CsmakeModules' not in sys.modules:
+            return []
+        return [ [name, source[0]] for name, source
+                 in sys.modules['CsmakeModules'].__sources__.iteritems() ]
+
+    def _warmUp(self):
+        driverClass = self.driver.__class__
+        driverClass.sharedModuleIndex = self.driver._getModuleIndex()
+        driverClass.sharedBuildspecCache = self.driver._getBuildspecCache()
+        self.driver._parseModulePaths()
+        modules, warnings = self.driver._loadModules()
+        self.log.info(
+            "Loaded %d modules (%d had problems)",
+            len(modules),
+            len(warnings) )
+        self.modules.update(dict(CsmakeServer._loadedModules()))
+        for makefile in self.driver.settings['makefile'].split(','):
+            makefile = makefile.strip()
+            if os.path.isfile(makefile):
+                self.buildspecs.add(os.path.abspath(makefile))
+        self._refresh()
+
+    def _refresh(self):
+        """Parses or loads any watched spec or module that has changed"""
+        buildspecCache = self.driver._getBuildspecCache()
+        for path in list(self.buildspecs):
+            try:
+                buildspecCache.parse(path)
+            except Exception as e:
+                self.log.info("No longer watching spec '%s': %s", path, str(e))
+                self.buildspecs.discard(path)
+        moduleIndex = self.driver._getModuleIndex()
+        for name, path in self.modules.items():
+            try:
+                moduleIndex.moduleNames(os.path.dirname(path))
+                self.driver._loadModuleSource(name, path)
+            except Exception as e:
+                self.log.info(
+                    "No longer watching module '%s' (%s): %s",
+                    name,
+                    path,
+                    str(e) )
+                del self.modules[name]
+        buildspecCache.save()
+        moduleIndex.save()
+
+    def _learn(self, report):
+        try:
+            document = json.loads(report)
+        except ValueError:
+            self.log.devdebug("A build did not report what it used")
+            return
+        for path in document.get('buildspecs', []):
+            self.buildspecs.add(path.encode('latin-1'))
+        for name, path in document.get('modules', []):
+            self.modules[name.encode('latin-1')] = path.encode('latin-1')
+        self._refresh()
+
+    def _terminate(self, signum, frame):
+        sys.exit(0)
+
+    def serve(self):
+        self.listener = self._listen()
+        oldterm = signal.signal(signal.SIGTERM, self._terminate)
+        try:
+            self._warmUp()
+            self.log.chat("csmake: Serving builds on '%s'" % self.path)
+            while True:
+                readers = [self.listener] + self.reports.keys()
+                ready = select.select(
+                    readers, [], [], CsmakeServer.WATCH_SECONDS )[0]
+                if len(ready) == 0:
+                    self._refresh()
+                    continue
+                for reader in ready:
+                    if reader is self.listener:
+                        connection, address = self.listener.accept()
+                        self._refresh()
+                        self._fork(connection)
+                    else:
+                        self._readReport(reader)
+        except KeyboardInterrupt:
+            self.log.info("csmake server interrupted")
+        finally:
+            signal.signal(signal.SIGTERM, oldterm)
+            self.listener.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _readReport(self, fd):
+        pid, chunks = self.reports[fd]
+        chunk = os.read(fd, 65536)
+        if len(chunk) != 0:
+            chunks.append(chunk)
+            return
+        os.close(fd)
+        del self.reports[fd]
+        os.waitpid(pid, 0)
+        self._learn(''.join(chunks))
+
+    def _fork(self, connection):
+        readfd, writefd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            returncode = 1
+            try:
+                os.close(readfd)
+                returncode = self._serveBuild(connection, writefd)
+            finally:
+                os._exit(returncode)
+        os.close(writefd)
+        connection.close()
+        self.reports[readfd] = (pid, [])
+
+    def _serveBuild(self, connection, report):
+        """Runs in the forked process - returns the exit code"""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        #The server may have been started with ctrl-c ignored
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        self.listener.close()
+        for fd in self.reports.keys():
+            os.close(fd)
+        CsmakeServer._closeOnExec(connection.fileno())
+        CsmakeServer._closeOnExec(report)
+        if self.driver in sys.meta_path:
+            sys.meta_path.remove(self.driver)
+        kind, payload = CsmakeFrames.receive(connection)
+        if kind != 'r':
+            return 1
+        argv, cwd, env = CsmakeFrames.decodeRequest(payload)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        os.environ['PWD'] = cwd
+        sys.argv = argv
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        output = ServedOutput(connection)
+        building = threading.Event()
+        building.set()
+        interrupts = threading.Thread(
+            target=self._forwardInterrupts,
+            args=(connection, building),
+            name='csmake-served-interrupts' )
+        interrupts.daemon = True
+        interrupts.start()
+
+        driver = self.driver.__class__(
+            self.driver.settingsSeed,
+            self.driver.scriptName,
+            self.driver.scriptVersion )
+        returncode = 1
+        try:
+            driver.main()
+        except SystemExit as sysexit:
+            try:
+                returncode = int(str(sysexit))
+            except ValueError:
+                returncode = 1
+        except BaseException:
+            self.log.exception("Served build failed")
+        building.clear()
+        output.finish(returncode)
+        connection.close()
+        self._report(report, driver)
+        return returncode
+
+    def _forwardInterrupts(self, connection, building):
+        while building.is_set():
+            try:
+                kind, payload = CsmakeFrames.receive(connection)
+            except socket.error:
+                kind = None
+            if not building.is_set():
+                return
+            if kind == 'k' or kind is None:
+                #The client is interrupted or gone - end the build
+                #  as ctrl-c would
+                os.kill(os.getpid(), signal.SIGINT)
+            if kind is None:
+                return
+
+    def _report(self, fd, driver):
+        document = json.dumps({
+            'buildspecs' : driver.includedBuildspecs,
+            'modules' : CsmakeServer._loadedModules() },
+            encoding='latin-1' )
+        try:
+            while len(document) > 0:
+                document = document[os.write(fd, document):]
+        except OSError:
+            pass
+        os.close(fd)
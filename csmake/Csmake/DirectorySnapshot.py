@@ -0,0 +1,146 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import glob
+import fnmatch
+import threading
+import time
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+class DirectorySnapshot:
+    """Remembers directory listings (with whether each entry is
+       a directory) so file declarations over the same trees don't
+       read the same directories over and over.
+       A listing is only reused while the directory's mtime is the
+       same as when it was read, and a directory changed less than
+       RACY_SECONDS before it was read isn't remembered at all (a
+       change in the same mtime tick couldn't be seen).
+       invalidate() forgets a path outright, for the files a step
+       says it produced.
+       The Environment keeps one of these for each phase."""
+
+    RACY_SECONDS = 2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listings = {}
+
+    @staticmethod
+    def readDirectory(path):
+        """Returns [(name, isDirectory), ...] for the directory,
+           or None if it can't be read.
+           Symbolic links to directories are not directories here
+           (as in os.walk)"""
+        try:
+            if scandir is not None:
+                return [ (entry.name, entry.is_dir(follow_symlinks=False))
+                         for entry in scandir(path) ]
+            result = []
+            for name in os.listdir(path):
+                entry = os.path.join(path, name)
+                result.append((
+                    name,
+                    os.path.isdir(entry) and not os.path.islink(entry) ))
+            return result
+        except OSError:
+            return None
+
+    def _listing(self, path):
+        """Returns (entries, matches) for the directory, where matches
+           remembers the paths matching each glob pattern for as long
+           as the listing is kept. entries is None if the directory
+           can't be read"""
+        key = os.path.normpath(path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return (None, {})
+        with self.lock:
+            known = self.listings.get(key)
+        if known is not None and known[0] == mtime:
+            return known[1:]
+        readAt = time.time()
+        entries = DirectorySnapshot.readDirectory(path)
+        matches = {}
+        with self.lock:
+            if entries is None \
+                or readAt - mtime < DirectorySnapshot.RACY_SECONDS:
+                self.listings.pop(key, None)
+            else:
+                self.listings[key] = (mtime, entries, matches)
+        return (entries, matches)
+
+    def listDirectory(self, path):
+        """Returns [(path, isDirectory), ...] for the entries
+           in the directory ([] if it can't be read)"""
+        entries, _ = self._listing(path)
+        if entries is None:
+            return []
+        return [ (os.path.join(path, name), isDirectory)
+                 for name, isDirectory in entries ]
+
+    def glob(self, pathname):
+        """glob.glob, reading directories through the snapshot"""
+        dirname, basename = os.path.split(pathname)
+        if not dirname or not glob.has_magic(pathname):
+            return glob.glob(pathname)
+        if dirname != pathname and glob.has_magic(dirname):
+            dirs = self.glob(dirname)
+        else:
+            dirs = [dirname]
+        result = []
+        for dirname in dirs:
+            if not glob.has_magic(basename):
+                result.extend([
+                    os.path.join(dirname, name)
+                    for name in glob.glob0(dirname, basename) ])
+                continue
+            entries, matches = self._listing(dirname)
+            if entries is None:
+                continue
+            paths = matches.get((dirname, basename))
+            if paths is None:
+                names = [ name for name, _ in entries ]
+                if basename[0] != '.':
+                    names = [ name for name in names if name[0] != '.' ]
+                paths = [ os.path.join(dirname, name)
+                          for name in fnmatch.filter(names, basename) ]
+                matches[(dirname, basename)] = paths
+            result.extend(paths)
+        return result
+
+    def invalidate(self, path):
+        """Forgets the listings of the path, its directory and
+           everything under it"""
+        path = os.path.normpath(path)
+        under = os.path.join(path, '')
+        with self.lock:
+            for known in self.listings.keys():
+                if known == path or known.startswith(under):
+                    del self.listings[known]
+            self.listings.pop(os.path.dirname(path), None)
+
+    def clear(self):
+        with self.lock:
+            self.listings.clear()
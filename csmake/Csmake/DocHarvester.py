@@ -0,0 +1,131 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import ast
+import os
+import time
+import threading
+
+class DocHarvester:
+    """Finds the docstring of a csmake module's class by parsing the
+       module's source instead of importing it.
+       Results are kept with the mtime and size of the source file.
+       If a cache (see UserCache) is given, results are kept between runs.
+       The paths and docstrings are bytes in whatever encoding the
+       source has, so they are kept in the cache as latin-1, which gives
+       back every byte"""
+
+    VERSION = 2
+
+    #Files changed this recently may change again within
+    #  the same mtime, so they are not remembered
+    SETTLE_SECONDS = 2
+
+    def __init__(self, cache=None, log=None):
+        self.cache = cache
+        self.log = log
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = {}
+        if cache is not None:
+            document = cache.load()
+            if isinstance(document, dict) \
+                and document.get('version') == DocHarvester.VERSION:
+                try:
+                    self.entries = DocHarvester._fromCache(
+                        document.get('entries', {}) )
+                except (AttributeError, TypeError, ValueError) as e:
+                    if self.log is not None:
+                        self.log.devdebug(
+                            "Module docstring cache not used: %s", str(e) )
+
+    @staticmethod
+    def _native(value):
+        #json gives back unicode
+        if isinstance(value, unicode):
+            return value.encode('latin-1')
+        return value
+
+    @staticmethod
+    def _fromCache(entries):
+        return dict([
+            (DocHarvester._native(path),
+             [ DocHarvester._native(x) for x in entry ])
+            for path, entry in entries.iteritems() ])
+
+    @staticmethod
+    def _toCache(entries):
+        def toJson(value):
+            if isinstance(value, str):
+                return value.decode('latin-1')
+            return value
+        return dict([
+            (toJson(path), [ toJson(x) for x in entry ])
+            for path, entry in entries.iteritems() ])
+
+    @staticmethod
+    def _parse(modulePath, name):
+        with open(modulePath) as source:
+            tree = ast.parse(source.read(), modulePath)
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and node.name == name:
+                doc = ast.get_docstring(node, clean=False)
+                if isinstance(doc, unicode):
+                    doc = doc.encode('utf-8')
+                return (True, doc)
+        return (False, None)
+
+    def docstring(self, modulePath, name):
+        """Returns (found, docstring)
+           found is False when the class could not be found in the source
+           (and the module will need to be imported to get the docstring)"""
+        modulePath = os.path.abspath(modulePath)
+        try:
+            stat = os.stat(modulePath)
+        except OSError:
+            return (False, None)
+        key = [stat.st_mtime, stat.st_size, name]
+        with self.lock:
+            entry = self.entries.get(modulePath)
+            if entry is not None and entry[:3] == key:
+                return tuple(entry[3:])
+        try:
+            found, doc = DocHarvester._parse(modulePath, name)
+        except (SyntaxError, TypeError, ValueError, IOError) as e:
+            if self.log is not None:
+                self.log.devdebug(
+                    "Could not parse '%s': %s", modulePath, str(e) )
+            return (False, None)
+        with self.lock:
+            if time.time() - stat.st_mtime > DocHarvester.SETTLE_SECONDS:
+                self.entries[modulePath] = key + [found, doc]
+                self.dirty = True
+            elif modulePath in self.entries:
+                del self.entries[modulePath]
+                self.dirty = True
+        return (found, doc)
+
+    def save(self):
+        if self.cache is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            document = {
+                'version' : DocHarvester.VERSION,
+                'entries' : DocHarvester._toCache(self.entries) }
+            self.dirty = False
+        self.cache.save(document)
@@ -16,15 +16,20 @@
 # </copyright>
 from MetadataManager import MetadataManager
 from FileManager import MetadataFileTracker
+from DirectorySnapshot import DirectorySnapshot
+from Substitutions import Substitutions
+from Substitutions import SubstitutionDict
 
 class Environment:
     """Shared environment for all build steps"""
     def __init__(self, engine):
         self.transPhase = {}
-        self.env = {}
+        self.env = SubstitutionDict()
+        self.substitutions = Substitutions()
         self.engine = engine
         self.settings = engine.settings
         self.metadata = MetadataManager(self.engine.log, self)
+        self.directorySnapshot = DirectorySnapshot()
 
     def __repr__(self):
         return "Env: %s" % str(self.env)
@@ -34,24 +39,20 @@ class Environment:
         self.env[key] = value
 
     def flushAll(self):
-        self.env = self.transPhase.copy()
+        self.env = SubstitutionDict(self.transPhase)
         self.metadata = MetadataManager(self.engine.log, self)
+        self.directorySnapshot = DirectorySnapshot()
         
     def update(self, dictionary):
-        tryAgain = False
-        for key, value in dictionary.iteritems():
-            if key.startswith('**'):
-                continue
-            try:
-                self.env[key] = self.doSubstitutions(value.strip())
-            except:
-                tryAgain = True
-                self.engine.log.devdebug("update failed on '%s' - first pass" % key )
-        if tryAgain:
-            for key, value in dictionary.iteritems():
-                if key.startswith('**'):
-                    continue
-                self.env[key] = self.doSubstitutions(value.strip())
+        """Adds the dictionary to the environment.  Values may refer to
+           each other to any depth, they are substituted in the order
+           of their references.  Raises ValueError on a reference cycle"""
+        values = dict([
+            (key, value.strip())
+            for key, value in dictionary.iteritems()
+            if not key.startswith('**') ])
+        for key in self.substitutions.order(values):
+            self.env[key] = self.doSubstitutions(values[key])
 
     def doSubstitutions(self, target):
-        return target % self.env
+        return self.substitutions.substitute(target, self.env)
@@ -0,0 +1,161 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import json
+import time
+import threading
+import Queue
+
+class EventStream:
+    """Listens to the engine (see CliDriver.addListener) and writes a
+       JSON object per line for every phase, step, aspect joinpoint,
+       and log record as the build runs (see --events).
+
+       Every event has:
+           event  - phaseStarted, phaseEnded, stepStarted, stepEnded,
+                    joinpointStarted, joinpointEnded, or log
+           ts     - seconds since the epoch
+           thread - the name of the thread the event happened on
+           nesting - how many steps deep the event is (0 is the phase)
+       and, as applies, phase, step, section, status, passed, seconds,
+       joinpoint, level, and message.
+
+       The events are written by a background thread so the build
+       never waits on the stream."""
+
+    def __init__(self, stream, log=None):
+        self.stream = stream
+        self.log = log
+        self.lock = threading.Lock()
+        self.open = {}
+        self.queue = Queue.Queue()
+        self.writer = threading.Thread(
+            target=self._write,
+            name='csmake-events' )
+        self.writer.daemon = True
+        self.writer.start()
+
+    @staticmethod
+    def openStream(target):
+        """target is a file name or the number of an open file descriptor"""
+        if target.isdigit():
+            return os.fdopen(int(target), 'w')
+        return open(target, 'w')
+
+    def _write(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                self.stream.write(json.dumps(event))
+                self.stream.write('\n')
+                if self.queue.empty():
+                    self.stream.flush()
+            except (IOError, OSError, TypeError, ValueError) as e:
+                if self.log is not None:
+                    self.log.devdebug("Event could not be written: %s", str(e))
+        try:
+            self.stream.close()
+        except (IOError, OSError):
+            pass
+
+    def _nesting(self, thread):
+        #NOTE: Must be called with the lock held
+        nesting = 0
+        while thread is not None:
+            nesting += len(self.open.get(thread, []))
+            try:
+                thread = thread.parent()
+            except AttributeError:
+                break
+        return nesting
+
+    def emit(self, event, **fields):
+        thread = threading.currentThread()
+        with self.lock:
+            nesting = self._nesting(thread)
+        fields['event'] = event
+        fields['ts'] = time.time()
+        fields['thread'] = thread.name
+        fields['nesting'] = nesting
+        self.queue.put(fields)
+
+    #Engine listener interface
+    def phaseStarted(self, phase):
+        self.emit('phaseStarted', phase=phase)
+
+    def phaseEnded(self, token, phase, passed):
+        self.emit('phaseEnded', phase=phase, passed=passed)
+
+    def stepStarted(self, step, phase):
+        self.emit('stepStarted', step=step, phase=phase)
+        thread = threading.currentThread()
+        with self.lock:
+            self.open.setdefault(thread, []).append(step)
+        return (thread, time.time())
+
+    def stepEnded(self, token, step, section, phase, result):
+        thread, start = token
+        with self.lock:
+            steps = self.open.get(thread, [])
+            if len(steps) > 0:
+                steps.pop()
+            if len(steps) == 0 and thread in self.open:
+                del self.open[thread]
+        status = None
+        if result is not None:
+            status = result.params['status']
+        self.emit(
+            'stepEnded',
+            step=step,
+            section=section,
+            phase=phase,
+            status=status,
+            seconds=round(time.time() - start, 6) )
+
+    def joinpointStarted(self, joinpoint, phase, execinstance):
+        self.emit(
+            'joinpointStarted',
+            joinpoint=joinpoint,
+            phase=phase,
+            section=execinstance.calledId )
+        return time.time()
+
+    def joinpointEnded(self, start, joinpoint, phase, execinstance):
+        self.emit(
+            'joinpointEnded',
+            joinpoint=joinpoint,
+            phase=phase,
+            section=execinstance.calledId,
+            status=execinstance.log.params['status'],
+            seconds=round(time.time() - start, 6) )
+
+    def logRecord(self, result, level, message):
+        section = None
+        if result is not self.log:
+            #Otherwise it is csmake's own log
+            section = "%s@%s" % (result.params['Type'], result.params['Id'])
+        self.emit(
+            'log',
+            section=section,
+            level=level,
+            message=message )
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
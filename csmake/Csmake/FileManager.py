@@ -18,7 +18,8 @@ import re
 import os.path
 import os
 import glob
-import threading
+from ReadWriteLock import ReadWriteLock
+from DirectorySnapshot import DirectorySnapshot
 
 # A file spec is a specification of a set of instances
 #  consisting of search axes - primarily id, type, intent, and location
@@ -94,10 +95,16 @@ class FileMapping:
     def __len__(self):
         return len(self.mappings)
 
-class IndexedFileEntry:
+class IndexedFileEntry(object):
     """Base class of any index "lookup-able" file or record of files.
        This represents a protocol that anything that represents a file
        should respond to"""
+
+    #There is one of these (or more) for every file tracked, so they
+    #  are kept compact with __slots__.  Subclasses declare the slots
+    #  for the attributes set in __init__ (FileRecord gets 'index'
+    #  from FileManager)
+    __slots__ = ()
     def __repr__(self, offset=0, terse=False):
         keys = self.index.keys()
         values = {}
@@ -170,17 +177,16 @@ class IndexedFileEntry:
 
     def _axisMatch(self, axis, spec, specValue, instanceValue):
         if axis == 'location':
-            locationre = spec.getSourceLocationRE()
+            locationre = spec.getSourceLocationCompiledRE()
             if locationre is not None:
-                locationMatch = re.match(locationre,instanceValue)
+                locationMatch = locationre.match(instanceValue)
                 return locationMatch is not None
             else:
                 return False
         elif axis == 'relLocation':
-
-            locationre = spec.getSourceRelLocationRE()
+            locationre = spec.getSourceRelLocationCompiledRE()
             if locationre is not None:
-                locationMatch = re.match(locationre, instanceValue)
+                locationMatch = locationre.match(instanceValue)
                 return locationMatch is not None
             else:
                 return False
@@ -213,6 +219,11 @@ class IndexedFileEntry:
 
 
 class FileSpec(IndexedFileEntry):
+    __slots__ = (
+        'index', 'precedence', 'currentPrecedenceKey', 'record', 'recordid',
+        'locationre', 'relLocationre', 'resultre', 'relResultre',
+        'locationCompiled', 'relLocationCompiled' )
+
     def __init__(self, **keywords):
         IndexedFileEntry.__init__(self)
         self.index = keywords
@@ -220,6 +231,8 @@ class FileSpec(IndexedFileEntry):
         self.relLocationre = None
         self.resultre = None
         self.relResultre = None
+        self.locationCompiled = None
+        self.relLocationCompiled = None
 
     def getRESafeLocation(self):
         return self.index['location']
@@ -251,6 +264,23 @@ class FileSpec(IndexedFileEntry):
                     #    self.index['relLocation'] )
         return self.relLocationre
 
+    #The compiled source regexes are kept on the spec because the re
+    #  module's own cache is too small to hold the patterns of a
+    #  large mapping
+    def getSourceLocationCompiledRE(self):
+        if self.locationCompiled is None:
+            locationre = self.getSourceLocationRE()
+            if locationre is not None:
+                self.locationCompiled = re.compile(locationre)
+        return self.locationCompiled
+
+    def getSourceRelLocationCompiledRE(self):
+        if self.relLocationCompiled is None:
+            locationre = self.getSourceRelLocationRE()
+            if locationre is not None:
+                self.relLocationCompiled = re.compile(locationre)
+        return self.relLocationCompiled
+
     def getResultLocationRE(self):
         if self.resultre is None:
             if 'location' in self.index:
@@ -284,6 +314,8 @@ class FileSpec(IndexedFileEntry):
         yield self
 
 class FileInstance(FileSpec):
+    __slots__ = ()
+
     def _reescape(self, s):
         return re.escape(s).replace("\/","/").replace("\.",".")
 
@@ -302,6 +334,8 @@ class FileInstance(FileSpec):
             raise ValueError("FileInstance '%s' does not exist" % self.index['location'])
 
 class DeletedFileInstance(FileInstance):
+    __slots__ = ()
+
     def __init__(self, **keywords):
         FileSpec.__init__(self, **keywords)
 
@@ -311,15 +345,67 @@ class DeletedFileInstance(FileInstance):
             raise ValueError("DeletedFileInstance '%s' exists" % self.index['location'])
 
 class NonValidatedFileInstance(FileInstance):
+    __slots__ = ()
+
     def __init__(self, **keywords):
         FileSpec.__init__(self, **keywords)
 
-class FileManager:
+class PathPrefixIndex:
+    """Finds the paths (keys of a location axis) that start with a
+       given prefix without looking at every path.
+       The paths are kept in a tree of their directories:
+           node = ({directory : node}, {file name : path})"""
+
+    def __init__(self, paths=()):
+        self.root = ({}, {})
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        if not isinstance(path, basestring):
+            return
+        parts = path.split('/')
+        node = self.root
+        for part in parts[:-1]:
+            child = node[0].get(part)
+            if child is None:
+                child = ({}, {})
+                node[0][part] = child
+            node = child
+        node[1][parts[-1]] = path
+
+    def pathsWithPrefix(self, prefix):
+        parts = prefix.split('/')
+        node = self.root
+        for part in parts[:-1]:
+            node = node[0].get(part)
+            if node is None:
+                return []
+        partial = parts[-1]
+        result = [ path for name, path in node[1].iteritems()
+                   if name.startswith(partial) ]
+        pending = [ child for name, child in node[0].iteritems()
+                    if name.startswith(partial) ]
+        while len(pending) > 0:
+            children, paths = pending.pop()
+            result.extend(paths.itervalues())
+            pending.extend(children.itervalues())
+        return result
+
+class FileManager(object):
     """This is an unordered, searchable record container"""
 
+    #Every FileRecord is a FileManager, see IndexedFileEntry
+    __slots__ = (
+        'lock', 'index', 'log', 'prefixIndexes', 'working', 'metadata',
+        'env', 'results', 'parents', 'records' )
+
     #We need to have a file manager global lock to prevent deadlocking
     #  across subclasses of filemanager.
-    FILE_MANAGER_LOCK=threading.RLock()
+    #  Lookups only take it for reading, so parallel steps can query
+    #  the index at the same time, changes to any index take it for
+    #  writing.
+    FILE_MANAGER_LOCK=ReadWriteLock()
 
     AXES = ['id','type','intent', 'location', 'relLocation']
     NON_AXES = ['useRE']
@@ -340,6 +426,12 @@ class FileManager:
         '*-1' : 'mapFilesManyToOne',
         '1-*' : 'mapFilesOneToMany',
         '*-*' : 'mapFilesManyToMany' }
+
+    #Location axes with fewer paths than this are just scanned
+    #  for the literal prefix of a lookup, bigger ones get a
+    #  PathPrefixIndex (see _candidateKeys)
+    PREFIX_INDEX_MIN_KEYS = 512
+    PREFIX_INDEX_AXES = ['location', 'relLocation']
     def __init__(self, parents=[]):
         #TODO: Consider throwing exceptions instead erroring on
         #      Parse failures - would yield a way to communicate
@@ -347,6 +439,7 @@ class FileManager:
         self.lock = FileManager.FILE_MANAGER_LOCK
         self.index = {}
         self.log = None #TODO: Should be a good default logger
+        self.prefixIndexes = None
         self.working = None
         self.metadata = None
         self.env = None
@@ -363,7 +456,7 @@ class FileManager:
         self.records = []
 
     def __repr__(self, offset=0, terse=False):
-        self.lock.acquire()
+        self.lock.acquireRead()
         try:
             space = ' ' * offset
             result = [
@@ -383,7 +476,7 @@ class FileManager:
             result.append("%s++++++++++++++++++++++++++++++++++++++++++++" % space)
             result.append("")
         finally:
-            self.lock.release()
+            self.lock.releaseRead()
         return '\n'.join(result)
 
     def __str__(self, offset=0, terse=False):
@@ -515,6 +608,62 @@ class FileManager:
             filepart,
             extpart )
 
+    @staticmethod
+    def regexLiteralPrefix(pattern):
+        """Returns (prefix, anchored) - the text every match of the
+           regex pattern has to start with and if the pattern is
+           anchored to the start of the searched string with ^.
+           The prefix may be shorter than it could be, but never
+           longer, e.g., '(?P<path>/a/b)/(?P<file>[^/]*)' -> '/a/b/'"""
+        if '|' in pattern:
+            return ('', False)
+        anchored = pattern.startswith('^')
+        i = 1 if anchored else 0
+        prefix = []
+        groups = []
+        while i < len(pattern):
+            c = pattern[i]
+            if c == '(':
+                if pattern.startswith('(?P<', i):
+                    end = pattern.find('>', i)
+                    if end < 0:
+                        break
+                    i = end + 1
+                elif pattern.startswith('(?:', i):
+                    i = i + 3
+                elif pattern.startswith('(?', i):
+                    break
+                else:
+                    i = i + 1
+                groups.append(len(prefix))
+                continue
+            if c == ')':
+                if len(groups) == 0:
+                    break
+                start = groups.pop()
+                i = i + 1
+                if i < len(pattern) and pattern[i] in '*?{':
+                    del prefix[start:]
+                    break
+                if i < len(pattern) and pattern[i] == '+':
+                    break
+                continue
+            if c == '\\':
+                if i + 1 >= len(pattern) or pattern[i+1].isalnum():
+                    break
+                c = pattern[i+1]
+                i = i + 2
+            elif c in '.^$*+?{}[]':
+                break
+            else:
+                i = i + 1
+            if i < len(pattern) and pattern[i] in '*?{':
+                break
+            prefix.append(c)
+            if i < len(pattern) and pattern[i] == '+':
+                break
+        return (''.join(prefix), anchored)
+
     @staticmethod
     def translateStarsToResultRegex(s):
         starcount = 1
@@ -529,51 +678,202 @@ class FileManager:
         return result
 
     @staticmethod
-    def findDiskPrunedPossibleMatchingRegexFiles(pathparts, curpath = '/'):
-        #This will pruposely return more than what actually matches pathparts
-        #You can't actually break a regex into path parts and sample each
-        #Without rewriting regex parsing and grocking in a way that is
-        #Sensitive to the way a directory structure works.
-        if len(pathparts) == 0:
-            return []
-        if len(pathparts[0]) == len(re.escape(pathparts[0])):
-            newpath = os.path.join(
-                curpath,
-                pathparts[0] )
-            if os.path.exists(newpath):
-                return FileManager.findDiskPrunedPossibleMatchingRegexFiles(
-                    pathparts[1:],
-                    newpath)
+    def splitRegexPath(repath):
+        """Splits a regex for a path at the '/'s that aren't inside
+           a group or a [] set"""
+        parts = []
+        current = []
+        depth = 0
+        inSet = False
+        i = 0
+        while i < len(repath):
+            c = repath[i]
+            if c == '\\' and i + 1 < len(repath):
+                if repath[i+1] == '/' and depth == 0 and not inSet:
+                    parts.append(''.join(current))
+                    current = []
+                else:
+                    current.append(repath[i:i+2])
+                i = i + 2
+                continue
+            if inSet:
+                if c == ']' and current[-1] not in ('[', '[^'):
+                    inSet = False
+            elif c == '[':
+                inSet = True
+                if repath.startswith('[^', i):
+                    c = '[^'
+            elif c == '(':
+                depth = depth + 1
+            elif c == ')':
+                depth = depth - 1
+            elif c == '/' and depth == 0:
+                parts.append(''.join(current))
+                current = []
+                i = i + 1
+                continue
+            current.append(c)
+            i = i + len(c)
+        parts.append(''.join(current))
+        return parts
+
+    REGEX_SAFE_ESCAPES = 'wdsbBAZ'
+
+    @staticmethod
+    def classifyRegexPathPart(part):
+        """Returns ('literal', name) for a part that only matches name,
+           ('name', part) for a part that can't match a '/', so it only
+           matches (part of) one name in the path, or ('any', part)"""
+        literal = []
+        isLiteral = True
+        i = 0
+        while i < len(part):
+            c = part[i]
+            if c == '\\':
+                escaped = part[i+1:i+2]
+                if escaped == '/':
+                    #Only inside a group, the part spans directories
+                    return ('any', part)
+                if escaped.isalnum():
+                    isLiteral = False
+                    if escaped not in FileManager.REGEX_SAFE_ESCAPES:
+                        return ('any', part)
+                else:
+                    literal.append(escaped)
+                i = i + 2
+                continue
+            if c == '[':
+                end = part.find(']', i + 2 if part.startswith('[^', i) else i + 1)
+                if end < 0:
+                    return ('any', part)
+                try:
+                    if re.match(part[i:end+1], '/'):
+                        return ('any', part)
+                except re.error:
+                    return ('any', part)
+                isLiteral = False
+                i = end + 1
+                continue
+            if c in './|':
+                return ('any', part)
+            if c == '(' and part.startswith('(?', i) \
+                and not part.startswith('(?:', i) \
+                and not part.startswith('(?P<', i):
+                return ('any', part)
+            if c in '^$*+?{}()':
+                isLiteral = False
             else:
-                return []
-        else:
-            result = []
-            for base, dirs, files in os.walk(curpath):
-                for name in files:
-                    result.append(os.path.join(
-                        base,
-                        name ))
-                for name in dirs:
-                    result.append(os.path.join(
-                        base,
-                        name ))
-            return result
+                literal.append(c)
+            i = i + 1
+        if isLiteral:
+            return ('literal', ''.join(literal))
+        try:
+            re.compile(part)
+        except re.error:
+            return ('any', part)
+        return ('name', part)
 
     @staticmethod
-    def findDiskFilesMatchingRegex(repath):
-        pathparts = repath.split('/')
-        if len(pathparts) == 0:
+    def _listDirectory(path):
+        """Returns [(path, isDirectory), ...] for the entries in the
+           directory, see DirectorySnapshot.readDirectory"""
+        entries = DirectorySnapshot.readDirectory(path)
+        if entries is None:
             return []
-        assert(len(pathparts[0])) == 0
-        pathparts = pathparts[1:]
-        candidates = FileManager.findDiskPrunedPossibleMatchingRegexFiles(
-            pathparts )
+        return [ (os.path.join(path, name), isDirectory)
+                 for name, isDirectory in entries ]
+
+    @staticmethod
+    def _walkDisk(path, listDirectory):
+        """Yields every file and directory under the path"""
+        pending = [path]
+        while len(pending) > 0:
+            for entry, isDirectory in listDirectory(pending.pop()):
+                yield entry
+                if isDirectory:
+                    pending.append(entry)
+
+    @staticmethod
+    def walkDiskMatchingRegex(repath, snapshot=None):
+        """Yields the files and directories matching repath, an
+           absolute path regex (the match isn't anchored at the end).
+           The regex is matched a path component at a time where
+           possible, so directories that can't match aren't read.
+           Once a component that might match a '/' is found,
+           everything under the directory reached so far is tried.
+           Directories are read through the snapshot (a
+           DirectorySnapshot) if one is given"""
+        if snapshot is None:
+            listDirectory = FileManager._listDirectory
+        else:
+            listDirectory = snapshot.listDirectory
+        parts = FileManager.splitRegexPath(repath)
+        assert len(parts[0]) == 0
+        parts = [ FileManager.classifyRegexPathPart(x) for x in parts[1:] ]
         repathCompiled = re.compile(repath)
-        return [ f for f in candidates if repathCompiled.match(f) ]
+        pending = [('/', 0, False)]
+        while len(pending) > 0:
+            path, index, walked = pending.pop()
+            kind, part = parts[index]
+            last = index == len(parts) - 1
+            if kind == 'any':
+                for entry in FileManager._walkDisk(path, listDirectory):
+                    if repathCompiled.match(entry):
+                        yield entry
+                continue
+            if kind == 'literal' and not last:
+                entry = os.path.join(path, part)
+                if os.path.isdir(entry) \
+                    and not (walked and os.path.islink(entry)):
+                    pending.append((entry, index + 1, walked))
+                continue
+            if kind == 'name':
+                test = re.compile(part + r'\Z' if not last else part)
+                matches = lambda name: test.match(name) is not None
+            else:
+                matches = lambda name: name.startswith(part)
+            for entry, isDirectory in listDirectory(path):
+                if not matches(os.path.basename(entry)):
+                    continue
+                if not last:
+                    if isDirectory:
+                        pending.append((entry, index + 1, True))
+                    continue
+                #The regex isn't anchored at the end, everything under
+                #  a match could match too
+                if repathCompiled.match(entry):
+                    yield entry
+                if isDirectory:
+                    for child in FileManager._walkDisk(entry, listDirectory):
+                        if repathCompiled.match(child):
+                            yield child
+
+    @staticmethod
+    def findDiskFilesMatchingRegex(repath, snapshot=None):
+        return list(FileManager.walkDiskMatchingRegex(repath, snapshot))
 
     @staticmethod
-    def findDiskFilesMatchingStarred(path):
-        return glob.glob(path)
+    def findDiskFilesMatchingStarred(path, snapshot=None):
+        if snapshot is None:
+            return glob.glob(path)
+        return snapshot.glob(path)
+
+    #Axes whose values repeat across many files
+    INTERNED_AXES = ['id', 'type', 'intent']
+
+    @staticmethod
+    def compactFileInfo(info):
+        """Trims the index info for a file on disk before it is
+           stored: the NON_AXES only describe how a declaration was
+           written, and the repeating axis values are interned"""
+        for nonaxis in FileManager.NON_AXES:
+            if nonaxis in info:
+                del info[nonaxis]
+        for axis in FileManager.INTERNED_AXES:
+            value = info.get(axis)
+            if type(value) is str:
+                info[axis] = intern(value)
+        return info
 
     @staticmethod
     def fileInstanceCorrectTracking(deleting, validate):
@@ -649,6 +949,14 @@ class FileManager:
 
     def absorbMappings(self, mappingResult, deleting=False, validate=True):
         FileInstanceClass = FileManager.fileInstanceCorrectTracking(deleting, validate)
+        snapshot = self._directorySnapshot()
+        if snapshot is not None:
+            self._forgetProducedFiles(
+                snapshot,
+                set([ os.path.dirname(tospec['location'])
+                      for _, tospecs in mappingResult.itermappings()
+                      for tospec in tospecs
+                      if 'location' in tospec ]) )
         for frominstances, tospecs in mappingResult.itermappings():
             newid = []
             fromrecords = []
@@ -663,6 +971,7 @@ class FileManager:
                 containingRecord = None
                 if 'id' not in tospec:
                     tospec['id'] = '+'.join(newid)
+                FileManager.compactFileInfo(tospec)
                 if tospec['id'] in newid:
                     containingRecord = fromrecords[newid.index(tospec['id'])]
                     instance = FileInstanceClass(**tospec)
@@ -716,35 +1025,63 @@ class FileManager:
         except:
             return []
 
+    def _candidateKeys(self, axis, revalue):
+        """Returns the keys of the axis that could be found by
+           searching for revalue.
+           Only a pattern anchored with ^, or an absolute path
+           on the location axis (paths in it are always absolute),
+           narrows the keys to the ones starting with its literal prefix"""
+        #NOTE: Must be called with the lock held, at least for reading.
+        #      Readers racing to build the same prefix index is harmless,
+        #      one of the (identical) indexes is kept
+        keys = self.index[axis]
+        if axis not in FileManager.PREFIX_INDEX_AXES:
+            return keys
+        prefix, anchored = FileManager.regexLiteralPrefix(revalue)
+        if len(prefix) == 0 \
+            or not (anchored or (axis == 'location' and prefix[0] == '/')):
+            return keys
+        if len(keys) < FileManager.PREFIX_INDEX_MIN_KEYS:
+            return [ key for key in keys
+                     if isinstance(key, basestring)
+                         and key.startswith(prefix) ]
+        if self.prefixIndexes is None:
+            self.prefixIndexes = {}
+        if axis not in self.prefixIndexes:
+            self.prefixIndexes[axis] = PathPrefixIndex(keys)
+        return self.prefixIndexes[axis].pathsWithPrefix(prefix)
+
     def findRecordsOnREAxis(self, axis, revalue):
+        """revalue may be a pattern string or a compiled pattern"""
         locked = False
         try:
-            self.lock.acquire()
+            self.lock.acquireRead()
             locked = True
             test = re.compile(revalue)
+            values = self.index[axis]
             return [value \
-               for key, values in self.index[axis].iteritems() \
+               for key in self._candidateKeys(axis, test.pattern) \
                if test.search(key) \
-                   for value in values ]
+                   for value in values[key] ]
         except re.error:
             raise
         except Exception:
             return []
         finally:
             if locked:
-                self.lock.release()
+                self.lock.releaseRead()
 
     def findRecordsOnLocationSpec(self, spec):
         if 'location' not in spec.index:
             return None
-        location = spec.getSourceLocationRE()
+        location = spec.getSourceLocationCompiledRE()
         return self.findRecordsOnREAxis('location', location)
 
     def findRecordsOnRelLocationSpec(self, spec):
         if 'relLocation' not in spec.index:
             return None
-        location = spec.getSourceRelLocationRE()
-        self.log.devdebug("Rel location to try: '%s'", location)
+        location = spec.getSourceRelLocationCompiledRE()
+        self.log.devdebug("Rel location to try: '%s'", location.pattern)
         return self.findRecordsOnREAxis('relLocation', location)
 
     def findInstances(self, spec):
@@ -758,7 +1095,7 @@ class FileManager:
         resultSet = None
         locked = False
         try:
-            self.lock.acquire()
+            self.lock.acquireRead()
             locked = True
             for axis, value in spec.index.iteritems():
                 if axis in FileManager.NON_AXES:
@@ -787,13 +1124,13 @@ class FileManager:
                 return list(resultSet)
         finally:
             if locked:
-                self.lock.release()
+                self.lock.releaseRead()
 
     def findRecords(self, spec):
         resultSet = None
         locked = False
         try:
-            self.lock.acquire()
+            self.lock.acquireRead()
             locked = True
             if 'id' in spec.index:
                 #If the id is called out in the spec, this takes
@@ -806,7 +1143,7 @@ class FileManager:
                     return []
         finally:
             if locked:
-                self.lock.release()
+                self.lock.releaseRead()
         return self._standardAxesIndexLookup(spec)
 
     def _getFileDeclarationList(self, statement):
@@ -835,10 +1172,42 @@ class FileManager:
         filematch = filematch.groupdict()
         return filematch
 
-    def addFileIndexes(self, filematches, defaultPath=None, deleting=False, validate=True):
+    def _directorySnapshot(self):
+        if self.env is None:
+            return None
+        return getattr(self.env, 'directorySnapshot', None)
+
+    @staticmethod
+    def literalDirectory(filematch):
+        """Returns the directory of a declaration's location before
+           any wildcard or regex in it ('' if there isn't one)"""
+        location = filematch['location']
+        if 'useRE' in filematch and filematch['useRE']:
+            prefix = FileManager.regexLiteralPrefix(location)[0]
+        else:
+            prefix = re.split(r'[*?[]', location, 1)[0]
+        return os.path.dirname(prefix)
+
+    def _forgetProducedFiles(self, snapshot, directories):
+        for directory in directories:
+            if len(directory) == 0:
+                snapshot.clear()
+                return
+            snapshot.invalidate(directory)
+
+    def addFileIndexes(self, filematches, defaultPath=None, deleting=False, validate=True, produced=False):
+        """Adds records for the files on disk matching the parsed
+           declarations.  produced means the step just made the files
+           (e.g., **yields-files), so the phase's directory snapshot
+           forgets what it knew about their directories first.
+           The records for all the declarations are built first, then
+           they are published with the write lock taken once"""
         if defaultPath is None:
             defaultPath = self.working
+        snapshot = self._directorySnapshot()
+        parents = [self]
         addedResults = []
+        found = []
         for filematch in filematches:
 
             if 'location' not in filematch or not filematch['location']:
@@ -847,13 +1216,19 @@ class FileManager:
                 defaultPath,
                 filematch['location'],
                 filematch )
+            if produced and snapshot is not None:
+                self._forgetProducedFiles(
+                    snapshot,
+                    [FileManager.literalDirectory(filematch)] )
             newPaths = []
             if 'useRE' in filematch and filematch['useRE']:
                 newPaths = FileManager.findDiskFilesMatchingRegex(
-                    filematch['location'] )
+                    filematch['location'],
+                    snapshot )
             else:
                 newPaths = FileManager.findDiskFilesMatchingStarred(
-                    filematch['location'] )
+                    filematch['location'],
+                    snapshot )
 
             if len(newPaths) == 0 and not deleting and validate:
                 self.log.error("No files were found for specification: %s",
@@ -868,18 +1243,29 @@ class FileManager:
 
             ftemplate = filematch
             records = []
-            result = []
             for new in newPaths:
                 FileManager.fixupLocationWithBase(
                     defaultPath,
                     new,
                     ftemplate )
                 self.log.devdebug("Adding file record: %s", str(ftemplate))
-                record = FileRecord([self], deleting, validate, **ftemplate)
-                result.append(record.getSourceInstance())
+                record = FileRecord(
+                    parents, deleting, validate, publish=False, **ftemplate)
+                addedResults.append(record.getSourceInstance())
                 records.append(record)
-            self.addRecords(records)
-            addedResults.extend(result)
+            found.append(records)
+
+        locked = False
+        try:
+            self.lock.acquireWrite()
+            locked = True
+            for records in found:
+                for record in records:
+                    record.publish()
+                self.addRecords(records)
+        finally:
+            if locked:
+                self.lock.releaseWrite()
         return addedResults
 
     def addFileDeclaration(self, parseableFileEntry):
@@ -890,17 +1276,25 @@ class FileManager:
     def addIndicies(self, indicies, item):
         locked = False
         try:
-            self.lock.acquire()
+            self.lock.acquireWrite()
             locked = True
-            for axis, value in indicies.iteritems():
-                if axis not in self.index:
-                    self.index[axis] = {}
-                if value not in self.index[axis]:
-                    self.index[axis][value] = []
-                self.index[axis][value].append(item)
+            self._addIndiciesUnlocked(indicies, item)
         finally:
             if locked:
-                self.lock.release()
+                self.lock.releaseWrite()
+
+    def _addIndiciesUnlocked(self, indicies, item):
+        #NOTE: Must be called with the write lock held, or on a
+        #      FileManager no other thread can see yet
+        for axis, value in indicies.iteritems():
+            if axis not in self.index:
+                self.index[axis] = {}
+            if value not in self.index[axis]:
+                self.index[axis][value] = []
+                if self.prefixIndexes is not None \
+                    and axis in self.prefixIndexes:
+                    self.prefixIndexes[axis].add(value)
+            self.index[axis][value].append(item)
 
     def addRecords(self, records):
         if len(records) > 0:
@@ -962,25 +1356,25 @@ class FileManager:
         return newinstanceSpec
 
     def _deriveResultFileFromSource(self, instance, fromSpec, toSpec):
-        sourcere = fromSpec.getSourceLocationRE()
+        sourcere = fromSpec.getSourceLocationCompiledRE()
         instanceAxis = 'location'
         resultre = toSpec.getResultLocationRE()
         if sourcere is None:
-            sourcere = fromSpec.getSourceRelLocationRE()
+            sourcere = fromSpec.getSourceRelLocationCompiledRE()
             instanceAxis = 'relLocation'
             resultre = toSpec.getResultRelLocationRE()
         if sourcere is None:
-            sourcere = instance.getSourceRelLocationRE()
+            sourcere = instance.getSourceRelLocationCompiledRE()
             instanceAxis = 'relLocation'
             resultre = toSpec.getResultRelLocationRE()
-        self.log.devdebug("Matching: %s", sourcere)
-        matcher = re.match(sourcere, instance.index[instanceAxis])
+        self.log.devdebug("Matching: %s", sourcere.pattern)
+        matcher = sourcere.match(instance.index[instanceAxis])
         if matcher is None:
             self.log.error(
                 "Error: Requested location didn't match the spec")
             self.log.error(
                 "From: %s   Location: %s",
-                sourcere,
+                sourcere.pattern,
                 instance.index[instanceAxis] )
             self.log.debug(
                 "   --params: instance: %s", str(instance))
@@ -994,16 +1388,16 @@ class FileManager:
         except IndexError as ie:
             self.log.devdebug(
                 "toSpec wanted: %s", str(ie))
-            sourcere = instance.getSourceLocationRE()
+            sourcere = instance.getSourceLocationCompiledRE()
             instanceAxis = 'location'
             resultre = toSpec.getResultLocationRE()
-            matcher = re.match(sourcere, instance.index[instanceAxis])
+            matcher = sourcere.match(instance.index[instanceAxis])
             if matcher is None:
                 self.log.error(
                     "Error: chosen location didn't match the spec")
                 self.log.error(
                     "From: %s   Location: %s",
-                    sourcere,
+                    sourcere.pattern,
                     instance.index['location'] )
                 return None
             try:
@@ -1011,13 +1405,13 @@ class FileManager:
             except Exception:
                 self.log.exception(
                     "From: %s  To: %s  Instance: %s",
-                    sourcere,
+                    sourcere.pattern,
                     resultre,
                     instance.index['location'] )
         except Exception:
             self.log.exception(
                 "From: %s  To: %s  Instance: %s",
-                sourcere,
+                sourcere.pattern,
                 resultre,
                 instance.index['location'] )
         return None
@@ -1103,20 +1497,34 @@ class MetadataFileTracker(FileManager):
         self.results = env.env['RESULTS']
 
 class FileRecord(FileManager, IndexedFileEntry):
-    def __init__(self, parents, deleting=False, validate=True, **instanceInfo):
+    __slots__ = (
+        'precedence', 'currentPrecedenceKey', 'record', 'recordid',
+        'sourceInstance', 'parent' )
+
+    def __init__(self, parents, deleting=False, validate=True, publish=True, **instanceInfo):
+        """publish=False leaves the record out of its parents' indexes
+           until publish() is called, so it can be built without
+           holding the lock"""
         IndexedFileEntry.__init__(self)
         FileManager.__init__(self, parents)
+        FileManager.compactFileInfo(instanceInfo)
 
         FileInstanceClass = FileManager.fileInstanceCorrectTracking(deleting, validate)
         instance = FileInstanceClass(**instanceInfo)
         self.recordid = instanceInfo['id']
         instance.setRecord(self)
         self.sourceInstance = instance
-        self.addInstanceIndicies(instanceInfo, instance)
+        #Nothing else can see this record yet
+        self._addIndiciesUnlocked(instanceInfo, instance)
         instance.setPrecedence(1, self)
         self.records.append(instance)
-        for parent in parents:
-            parent.addIndicies(instanceInfo, self)
+        if publish:
+            self.publish()
+
+    def publish(self):
+        """Adds the record to its parents' indexes"""
+        for parent in self.parents:
+            parent.addIndicies(self.sourceInstance.index, self)
 
     def __repr__(self, offset=0, terse=False):
         result = ["Record Id: %s" % self.recordid,
@@ -1143,7 +1551,7 @@ class FileRecord(FileManager, IndexedFileEntry):
     def addIndicies(self, instanceInfo, item):
         locked = False
         try:
-            self.lock.acquire()
+            self.lock.acquireWrite()
             locked = True
             FileManager.addIndicies(self, instanceInfo, item)
             self.index['id'][instanceInfo['id']].append(item)
@@ -1151,7 +1559,7 @@ class FileRecord(FileManager, IndexedFileEntry):
                 parent.addIndicies(instanceInfo, item)
         finally:
             if locked:
-                self.lock.release()
+                self.lock.releaseWrite()
 
     def addRecords(self, records):
         FileManager.addRecords(self, records)
@@ -0,0 +1,153 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import stat
+import time
+import threading
+
+class ModuleIndex:
+    """Remembers which directories have CsmakeModules and which modules
+       each CsmakeModules directory has, so csmake doesn't need to
+       walk every sys.path directory to find a module.
+
+       Every entry is kept with the mtime of the directory it came from
+       (and, for a sys.path directory, of the CsmakeModules directories
+       found in it) and is looked up again when any of those change.
+       Installing or removing a package changes the sys.path directory,
+       but adding a CsmakeModules directory to a package that is already
+       installed does not, and isn't seen until the sys.path directory
+       changes (or with --no-module-cache).  Checking every package in
+       sys.path would cost as much as not having the index.
+       If a cache (see UserCache) is given, the index is kept between runs"""
+
+    VERSION = 3
+
+    #Directories changed this recently may change again within
+    #  the same mtime, so they are not saved
+    SETTLE_SECONDS = 2
+
+    def __init__(self, cache=None, log=None):
+        self.cache = cache
+        self.log = log
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.syspaths = {}
+        self.packages = {}
+        if cache is not None:
+            document = cache.load()
+            if isinstance(document, dict) \
+                and document.get('version') == ModuleIndex.VERSION:
+                self.syspaths = document.get('syspaths', {})
+                self.packages = document.get('packages', {})
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def _unchanged(path, entry, mtime):
+        if entry is None or entry[0] != mtime:
+            return False
+        for name, submtime in entry[2].iteritems():
+            if ModuleIndex._mtime(os.path.join(path, name)) != submtime:
+                return False
+        return True
+
+    def _lookup(self, table, path, scanner):
+        """scanner(path) returns (contents, {subdirectory : mtime})
+           for the subdirectories the contents also depend on"""
+        path = os.path.abspath(path)
+        mtime = ModuleIndex._mtime(path)
+        if mtime is None:
+            return None
+        with self.lock:
+            entry = table.get(path)
+        if ModuleIndex._unchanged(path, entry, mtime):
+            return entry[1]
+        contents, depends = scanner(path)
+        newest = max([mtime] + depends.values())
+        with self.lock:
+            if time.time() - newest > ModuleIndex.SETTLE_SECONDS:
+                table[path] = [mtime, contents, depends]
+                self.dirty = True
+            elif path in table:
+                del table[path]
+                self.dirty = True
+        return contents
+
+    @staticmethod
+    def _scanSysPath(path):
+        result = []
+        depends = {}
+        try:
+            for subpath in os.listdir(path):
+                modules = os.path.join(subpath, 'CsmakeModules')
+                try:
+                    status = os.stat(os.path.join(path, modules))
+                except OSError:
+                    continue
+                if not stat.S_ISDIR(status.st_mode):
+                    continue
+                depends[modules] = status.st_mtime
+                result.append(subpath)
+        except OSError:
+            pass
+        return (result, depends)
+
+    @staticmethod
+    def _scanPackage(path):
+        try:
+            return (
+                [ x[:-3] for x in os.listdir(path) if x.endswith('.py') ],
+                {} )
+        except OSError:
+            return ([], {})
+
+    def csmakeSubdirectories(self, syspath):
+        """Returns the subdirectories of syspath that have CsmakeModules"""
+        result = self._lookup(
+            self.syspaths,
+            syspath,
+            ModuleIndex._scanSysPath )
+        if result is None:
+            return []
+        return [ os.path.join(syspath, x) for x in result ]
+
+    def moduleNames(self, packagePath):
+        """Returns the names of the modules in a CsmakeModules directory
+           or None if the directory doesn't exist"""
+        return self._lookup(
+            self.packages,
+            packagePath,
+            ModuleIndex._scanPackage )
+
+    def save(self):
+        if self.cache is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            document = {
+                'version' : ModuleIndex.VERSION,
+                'syspaths' : self.syspaths,
+                'packages' : self.packages }
+            self.dirty = False
+        self.cache.save(document)
@@ -0,0 +1,75 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import ConfigParser
+import threading
+
+class OutBuildspec(ConfigParser.RawConfigParser):
+    """The buildspec as executed: the options of each step with
+       the substitutions done (see --replay).
+
+       Sections are shared with the buildspec they come from until
+       they are changed, so the spec is only held in memory once."""
+
+    def __init__(self, base):
+        ConfigParser.RawConfigParser.__init__(self)
+        self.optionxform = str
+        self.base = base
+        self._defaults = base._defaults
+        self.private = set()
+        self.lock = threading.Lock()
+
+    def include(self, parsed):
+        """Takes on the sections of a spec just merged into the
+           base buildspec (see BuildspecCache.merge)"""
+        with self.lock:
+            for name, options in parsed['sections']:
+                if name in self.private:
+                    section = self._sections[name]
+                    for key, value in options:
+                        section[key] = value
+                elif name not in self._sections:
+                    self._sections[name] = self.base._sections[name]
+
+    def writableSection(self, name):
+        """Returns the options dictionary of the section, copying it
+           from the base buildspec the first time"""
+        with self.lock:
+            if name not in self.private:
+                section = self._dict()
+                section.update(self._sections[name])
+                self._sections[name] = section
+                self.private.add(name)
+            return self._sections[name]
+
+    def add_section(self, section):
+        with self.lock:
+            ConfigParser.RawConfigParser.add_section(self, section)
+            self.private.add(section)
+
+    def set(self, section, option, value=None):
+        if section != ConfigParser.DEFAULTSECT:
+            self.writableSection(section)
+        ConfigParser.RawConfigParser.set(self, section, option, value)
+
+    def remove_option(self, section, option):
+        self.writableSection(section)
+        return ConfigParser.RawConfigParser.remove_option(self, section, option)
+
+    def remove_section(self, section):
+        with self.lock:
+            self.private.discard(section)
+            return ConfigParser.RawConfigParser.remove_section(self, section)
@@ -0,0 +1,251 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import fcntl
+import os
+import select
+import threading
+import errno
+
+class OutputChannel:
+    """The output of one parallel step.  The channel is a file that
+       can be written to or handed to a subprocess.  Everything written
+       is read back by the multiplexer's writer thread through a pipe.
+       Anything written after the channel is closed (by an exit
+       callback, say) goes straight to the log."""
+
+    def __init__(self, multiplexer, name, parent, thread):
+        self.multiplexer = multiplexer
+        self.name = name
+        self.parent = parent
+        self.thread = thread
+        self.prefix = "[%s] " % name
+        readfd, writefd = os.pipe()
+        #Subprocesses of other steps must not hold the channel open
+        OutputMultiplexer._closeOnExec(readfd)
+        OutputMultiplexer._closeOnExec(writefd)
+        self.readfd = readfd
+        #Unbuffered so the output keeps its order with that of
+        #  subprocesses and of the steps this one launches
+        self.outfile = os.fdopen(writefd, 'w', 0)
+        self.closed = False
+        self.buffer = []
+        self.partial = ''
+        self.finished = threading.Event()
+
+    def write(self, output):
+        if self.closed:
+            self.multiplexer._emit(output)
+        else:
+            self.outfile.write(output)
+
+    def flush(self):
+        if not self.closed:
+            self.outfile.flush()
+
+    def fileno(self):
+        if self.closed:
+            return self.multiplexer.target.fileno()
+        self.outfile.flush()
+        return self.outfile.fileno()
+
+    def close(self):
+        """Closes the step's end of the channel and waits for the
+           writer to pass on what the step wrote.  A process started
+           by the step that is still running may keep the channel
+           open; the rest of its output is passed on when it ends"""
+        self.multiplexer._detach(self)
+        self.closed = True
+        try:
+            self.outfile.close()
+        except (IOError, OSError):
+            pass
+        self.finished.wait(self.multiplexer.CLOSE_TIMEOUT)
+
+    #The methods below are only called on the writer thread
+    def _receive(self, data):
+        if self.multiplexer.mode == 'line':
+            lines = (self.partial + data).split('\n')
+            self.partial = lines[-1]
+            if len(lines) > 1:
+                self._emit(''.join([
+                    "%s%s\n" % (self.prefix, line) for line in lines[:-1] ]))
+        else:
+            self.buffer.append(data)
+
+    def _drain(self):
+        """Takes in what is waiting in the pipe already"""
+        while select.select([self.readfd], [], [], 0)[0]:
+            data = os.read(self.readfd, 65536)
+            if len(data) == 0:
+                #Closed - the writer will see it too
+                break
+            self._receive(data)
+
+    def _finish(self):
+        if self.multiplexer.mode == 'line':
+            if len(self.partial) > 0:
+                self._emit("%s%s\n" % (self.prefix, self.partial))
+                self.partial = ''
+        else:
+            self._emit(''.join(self.buffer))
+            self.buffer = []
+        self.finished.set()
+
+    def _emit(self, data):
+        if len(data) == 0:
+            return
+        if self.parent is not None and not self.parent.finished.isSet():
+            #Keep the output together with the step that launched this one
+            #  after anything that step wrote before launching it
+            self.parent._drain()
+            self.parent._receive(data)
+        else:
+            self.multiplexer._emit(data)
+
+class OutputMultiplexer:
+    """Gives each step run in parallel its own channel for its output
+       so the output of concurrent steps (and their subprocesses) is
+       not interleaved.  A single writer thread reads the channels and
+       writes to the log in one of two modes:
+           step - all of a step's output is written when the step ends
+           line - each whole line is written as it arrives, prefixed
+                  with the name of the step
+       A step run in parallel inside another parallel step writes
+       through the channel of the outer step."""
+
+    MODES = ['direct', 'step', 'line']
+
+    #Seconds a finishing step waits for its output to be written
+    CLOSE_TIMEOUT = 5.0
+
+    def __init__(self, target, mode='step', log=None):
+        if mode not in ['step', 'line']:
+            raise ValueError("Output mode must be 'step' or 'line'")
+        self.target = target
+        self.mode = mode
+        self.log = log
+        self.lock = threading.Lock()
+        self.current = {}
+        self.reading = {}
+        self.shuttingDown = False
+        self.wakeRead, self.wakeWrite = os.pipe()
+        OutputMultiplexer._closeOnExec(self.wakeRead)
+        OutputMultiplexer._closeOnExec(self.wakeWrite)
+        self.writer = threading.Thread(
+            target=self._run,
+            name='csmake-output' )
+        self.writer.daemon = True
+        self.writer.start()
+
+    @staticmethod
+    def _closeOnExec(fd):
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+    def _innermost(self, thread):
+        #NOTE: Must be called with the lock held
+        while thread is not None:
+            channels = self.current.get(thread)
+            if channels:
+                return channels[-1]
+            try:
+                thread = thread.parent()
+            except AttributeError:
+                return None
+        return None
+
+    def channel(self):
+        """Returns the channel output on this thread should go to,
+           or None if the output should go straight to the log"""
+        with self.lock:
+            return self._innermost(threading.currentThread())
+
+    def open(self, name):
+        """Starts a channel for a step run on the current thread"""
+        thread = threading.currentThread()
+        with self.lock:
+            parent = self._innermost(thread)
+            channel = OutputChannel(self, name, parent, thread)
+            self.current.setdefault(thread, []).append(channel)
+            self.reading[channel.readfd] = channel
+        self._wake()
+        return channel
+
+    def _detach(self, channel):
+        with self.lock:
+            channels = self.current.get(channel.thread, [])
+            if channel in channels:
+                channels.remove(channel)
+            if len(channels) == 0 and channel.thread in self.current:
+                del self.current[channel.thread]
+
+    def _wake(self):
+        try:
+            os.write(self.wakeWrite, 'x')
+        except OSError:
+            pass
+
+    def _emit(self, data):
+        try:
+            self.target.write(data)
+            self.target.flush()
+        except (IOError, OSError):
+            pass
+
+    def _run(self):
+        while True:
+            with self.lock:
+                reading = dict(self.reading)
+                if self.shuttingDown and len(reading) == 0:
+                    break
+            try:
+                ready = select.select(
+                    reading.keys() + [self.wakeRead], [], [] )[0]
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in ready:
+                if fd == self.wakeRead:
+                    os.read(self.wakeRead, 4096)
+                    continue
+                channel = reading[fd]
+                data = os.read(fd, 65536)
+                if len(data) > 0:
+                    channel._receive(data)
+                else:
+                    with self.lock:
+                        del self.reading[fd]
+                    os.close(fd)
+                    channel._finish()
+        os.close(self.wakeRead)
+        os.close(self.wakeWrite)
+
+    def shutdown(self, timeout=CLOSE_TIMEOUT):
+        """Waits for the open channels to finish and stops the writer.
+           Output still held for a channel after timeout is written
+           as it is"""
+        with self.lock:
+            self.shuttingDown = True
+        self._wake()
+        self.writer.join(timeout)
+        if self.writer.isAlive():
+            with self.lock:
+                reading = self.reading
+                self.reading = {}
+            for channel in reading.values():
+                channel._finish()
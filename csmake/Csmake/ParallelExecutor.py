@@ -0,0 +1,218 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import threading
+import collections
+import time
+import sys
+
+class ParallelTask:
+    """A single function queued on a ParallelBatch.
+       The thread that submitted the task is remembered as the parent
+       so the ParallelLaunchStack can find the nesting of the step."""
+
+    def __init__(self, batch, name, function):
+        self.batch = batch
+        self.name = name
+        self.function = function
+        self._parent = threading.currentThread()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.excinfo = None
+
+    def parent(self):
+        return self._parent
+
+    def waited(self):
+        """Seconds the task spent in the queue waiting for a worker"""
+        if self.started is None:
+            return time.time() - self.submitted
+        return self.started - self.submitted
+
+    def failed(self):
+        return self.excinfo is not None
+
+    def _run(self):
+        self.started = time.time()
+        try:
+            self.result = self.function()
+        except:
+            self.excinfo = sys.exc_info()
+        finally:
+            self.finished = time.time()
+
+class ParallelWorker(threading.Thread):
+    """A pooled thread that runs tasks for the ParallelExecutor.
+       parent() follows the task being run."""
+
+    def __init__(self, executor):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.executor = executor
+        self.task = None
+
+    def parent(self):
+        if self.task is None:
+            return None
+        return self.task.parent()
+
+    def run(self):
+        self.executor._work(self)
+
+class ParallelBatch:
+    """A group of tasks submitted and waited on by a single thread.
+       No more than 'limit' tasks from the batch are queued or running
+       at once (0 is no limit beyond the executor's)."""
+
+    def __init__(self, executor, limit=0):
+        self.executor = executor
+        self.limit = limit
+        self.pending = collections.deque()
+        self.completed = collections.deque()
+        self.active = 0
+        self.outstanding = 0
+
+    def __len__(self):
+        return self.outstanding
+
+    def submit(self, name, function):
+        task = ParallelTask(self, name, function)
+        with self.executor.condition:
+            self.pending.append(task)
+            self.outstanding += 1
+            self._release()
+        return task
+
+    def wait(self):
+        """Returns the next task in the batch to complete, or None
+           if there are no tasks left to wait for"""
+        return self.executor._waitFor(self)
+
+    def join(self):
+        """Waits for all the tasks in the batch to complete.
+           Returns the tasks in the order they completed"""
+        result = []
+        while True:
+            task = self.wait()
+            if task is None:
+                return result
+            result.append(task)
+
+    def _release(self):
+        #NOTE: Must be called with the executor's condition held
+        while len(self.pending) > 0 \
+            and (self.limit <= 0 or self.active < self.limit):
+            self.active += 1
+            self.executor.queue.append(self.pending.popleft())
+        self.executor._dispatch()
+
+    def _finished(self, task):
+        #NOTE: Must be called with the executor's condition held
+        self.active -= 1
+        self.completed.append(task)
+        self._release()
+
+class ParallelExecutor:
+    """Runs the parallel ('&') parts of a build on a shared pool of
+       threads.  No more than 'limit' tasks will be running at once
+       (0 is unlimited).  A pooled thread waiting on the tasks it has
+       submitted does not count against the limit, so nested
+       parallel groups cannot starve each other."""
+
+    def __init__(self, limit=0, log=None):
+        self.limit = limit
+        self.log = log
+        self.condition = threading.Condition()
+        self.queue = collections.deque()
+        self.workers = []
+        self.idle = 0
+        self.runnable = 0
+        self.shuttingDown = False
+
+    def batch(self, limit=0):
+        return ParallelBatch(self, limit)
+
+    def shutdown(self):
+        with self.condition:
+            self.shuttingDown = True
+            self.condition.notifyAll()
+
+    def _canStart(self):
+        return len(self.queue) > 0 \
+            and (self.limit <= 0 or self.runnable < self.limit)
+
+    def _dispatch(self):
+        #NOTE: Must be called with the condition held
+        available = len(self.queue)
+        if self.limit > 0:
+            available = min(available, self.limit - self.runnable)
+        if available <= 0:
+            return
+        for _ in range(available - self.idle):
+            worker = ParallelWorker(self)
+            self.workers.append(worker)
+            self.idle += 1
+            worker.start()
+        self.condition.notifyAll()
+
+    def _work(self, worker):
+        while True:
+            with self.condition:
+                while not self.shuttingDown and not self._canStart():
+                    self.condition.wait()
+                if self.shuttingDown:
+                    self.idle -= 1
+                    self.workers.remove(worker)
+                    return
+                task = self.queue.popleft()
+                self.idle -= 1
+                self.runnable += 1
+            worker.task = task
+            if self.log is not None:
+                self.log.devdebug(
+                    "Task '%s' started after %0.3f seconds in the queue",
+                    task.name,
+                    task.waited() )
+            task._run()
+            worker.task = None
+            with self.condition:
+                self.runnable -= 1
+                self.idle += 1
+                task.batch._finished(task)
+                self.condition.notifyAll()
+
+    def _waitFor(self, batch):
+        with self.condition:
+            if batch.outstanding == 0:
+                return None
+            current = threading.currentThread()
+            blocked = isinstance(current, ParallelWorker) \
+                and current.executor is self \
+                and len(batch.completed) == 0
+            if blocked:
+                #Give up our slot while we wait for our own tasks
+                self.runnable -= 1
+                self._dispatch()
+            try:
+                while len(batch.completed) == 0:
+                    self.condition.wait()
+                batch.outstanding -= 1
+                return batch.completed.popleft()
+            finally:
+                if blocked:
+                    self.runnable += 1
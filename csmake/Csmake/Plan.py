@@ -0,0 +1,195 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+class PlanStep:
+    """A step in a Plan.  groups has the PlanSteps a command or
+       subcommand will run, in the order they will start.
+       estimate is in seconds, or None if nothing is known.
+       partial is True when the estimate leaves out steps
+       that have no history."""
+
+    def __init__(self, step, section):
+        self.step = step
+        self.section = section
+        self.groups = None
+        self.limit = 0
+        self.estimate = None
+        self.partial = False
+
+class Plan:
+    """Walks a command and its subcommands without running anything
+       to show the order the steps will run in, the '&' groups, and
+       how long the build should take (see --plan).
+
+       The estimate of each step comes from the TimingHistory.
+       A command's estimate adds up its groups; an '&' group takes as
+       long as its longest member unless max-parallel or
+       --parallel-limit hold the group back, then the members are
+       laid out longest first on that many lanes."""
+
+    def __init__(self, engine, history, log):
+        self.engine = engine
+        self.history = history
+        self.log = log
+
+    @staticmethod
+    def groupTime(estimates, limit=0):
+        """Seconds an '&' group takes running limit (0 = all) at once"""
+        if len(estimates) == 0:
+            return 0.0
+        if limit <= 0 or limit >= len(estimates):
+            return max(estimates)
+        lanes = [0.0] * limit
+        for estimate in sorted(estimates, reverse=True):
+            lanes[lanes.index(min(lanes))] += estimate
+        return max(lanes)
+
+    def _parallelLimit(self, limit):
+        try:
+            engineLimit = int(self.engine.settings['parallel-limit'])
+        except (ValueError, TypeError, KeyError):
+            engineLimit = 0
+        limits = [ x for x in (limit, engineLimit) if x > 0 ]
+        if len(limits) == 0:
+            return 0
+        return min(limits)
+
+    def _commandGroups(self, section):
+        """Returns (groups, max-parallel) if the section is a command
+           (anything with _prepareCommand) or None"""
+        sectionType = section.split('@')[0]
+        modules, warnings = self.engine._loadModules(sectionType)
+        if len(modules) == 0 \
+            or not hasattr(modules[0][3], '_prepareCommand'):
+            return None
+        instance = self.engine.getSectionTypeInstance(sectionType, self.log)
+        if instance is None:
+            return None
+        options = self.engine.getSectionOptions(section)
+        for key, value in options.items():
+            try:
+                options[key] = self.engine.environment.doSubstitutions(
+                    value.strip() )
+            except (KeyError, ValueError, TypeError):
+                pass
+        try:
+            limit = instance._getMaxParallel(options)
+        except (AttributeError, ValueError):
+            limit = 0
+        return (instance._prepareCommand(options), limit)
+
+    def walk(self, step, phase, active=None):
+        """Returns the PlanStep for the step"""
+        if active is None:
+            active = []
+        step = step.strip()
+        node = PlanStep(step, self.engine.lookupSection(step))
+        if node.section is None:
+            return node
+        if node.section not in active:
+            command = self._commandGroups(node.section)
+            if command is not None:
+                groups, node.limit = command
+                node.groups = []
+                for group in groups:
+                    if len(group) > 1:
+                        group = self.engine.longestFirst(group, phase)
+                    node.groups.append([
+                        self.walk(part, phase, active + [node.section])
+                        for part in group ])
+        self._estimate(node, phase)
+        return node
+
+    def _estimate(self, node, phase):
+        own = None
+        if self.history is not None:
+            own = self.history.estimate(node.section, phase)
+        if node.groups is None:
+            node.estimate = own
+            return
+        total = 0.0
+        partial = False
+        for group in node.groups:
+            estimates = []
+            for member in group:
+                if member.estimate is None or member.partial:
+                    partial = True
+                if member.estimate is not None:
+                    estimates.append(member.estimate)
+            if len(group) == 1:
+                total += sum(estimates)
+            else:
+                total += Plan.groupTime(
+                    estimates,
+                    self._parallelLimit(node.limit) )
+        if partial and own is not None:
+            node.estimate = own
+        else:
+            node.estimate = total
+            node.partial = partial
+
+    @staticmethod
+    def unknownSteps(node):
+        """Returns how many steps under the node have no estimate"""
+        if node.groups is None:
+            if node.estimate is None:
+                return 1
+            return 0
+        return sum([ Plan.unknownSteps(member)
+                     for group in node.groups
+                     for member in group ])
+
+    @staticmethod
+    def _seconds(node):
+        if node.estimate is None:
+            return '?'
+        if node.partial:
+            return '>=%0.3fs' % node.estimate
+        return '%0.3fs' % node.estimate
+
+    @staticmethod
+    def _lines(node, depth, marker, lines):
+        name = node.section
+        if name is None:
+            name = "%s (section not found)" % node.step
+        lines.append('%14s  %s%s%s' % (
+            Plan._seconds(node),
+            '  ' * depth,
+            marker,
+            name ))
+        if node.groups is None:
+            return
+        for group in node.groups:
+            marker = ''
+            if len(group) > 1:
+                marker = '& '
+            for member in group:
+                Plan._lines(member, depth + 1, marker, lines)
+
+    @staticmethod
+    def report(node, phase):
+        """Returns the plan as lines of text"""
+        lines = ["Plan for phase '%s':" % phase]
+        Plan._lines(node, 0, '', lines)
+        lines.append(
+            "Estimated wall time for phase '%s': %s" % (
+                phase,
+                Plan._seconds(node) ))
+        unknown = Plan.unknownSteps(node)
+        if unknown != 0:
+            lines.append(
+                "    (Steps without timing history: %d)" % unknown )
+        return lines
@@ -0,0 +1,250 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import ctypes
+import ctypes.util
+import errno
+import os
+import os.path
+import signal
+import platform
+import subprocess
+
+class ProcessTable:
+    """Reads the processes on the system from /proc.
+       Each process is identified by (pid, starttime) so a pid that is
+       reused by a new process is never mistaken for the old process.
+       Where there is no /proc, ps is used and starttime is None."""
+
+    PROC = '/proc'
+
+    @staticmethod
+    def _readStat(pid):
+        """Returns (pgid, starttime) for the process or None if it is gone"""
+        try:
+            with open('%s/%d/stat' % (ProcessTable.PROC, pid)) as statfile:
+                stat = statfile.read()
+        except (IOError, OSError):
+            return None
+        #The command name is in parentheses and may have anything in it
+        fields = stat[stat.rfind(')') + 2:].split()
+        try:
+            return (int(fields[2]), int(fields[19]))
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def processes():
+        """Returns {pid : (pgid, starttime)} for every process"""
+        if not os.path.isdir(ProcessTable.PROC):
+            return ProcessTable._psProcesses()
+        result = {}
+        for entry in os.listdir(ProcessTable.PROC):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            stat = ProcessTable._readStat(pid)
+            if stat is not None:
+                result[pid] = stat
+        return result
+
+    @staticmethod
+    def _psProcesses():
+        psproc = subprocess.Popen(
+            ['ps', '-e', '-o', 'pid,pgid'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE )
+        pidlist, err = psproc.communicate()
+        result = {}
+        for line in pidlist.split('\n'):
+            parts = line.split()
+            if len(parts) < 2 or not parts[0].isdigit():
+                continue
+            pid = int(parts[0])
+            if pid != psproc.pid:
+                result[pid] = (int(parts[1]), None)
+        return result
+
+    @staticmethod
+    def starttime(pid):
+        stat = ProcessTable._readStat(pid)
+        if stat is None:
+            return None
+        return stat[1]
+
+    @staticmethod
+    def command(pid):
+        try:
+            with open('%s/%d/cmdline' % (ProcessTable.PROC, pid)) as cmdfile:
+                cmdline = cmdfile.read()
+        except (IOError, OSError):
+            return '<unknown>'
+        if len(cmdline) == 0:
+            try:
+                with open('%s/%d/comm' % (ProcessTable.PROC, pid)) as commfile:
+                    return '[%s]' % commfile.read().strip()
+            except (IOError, OSError):
+                return '<unknown>'
+        return ' '.join(cmdline.rstrip('\0').split('\0'))
+
+class PidSignaller:
+    """Sends signals with a pidfd (Linux 5.3 and later) so the signal
+       can only go to the process that was looked at, even if its pid
+       is reused.  Otherwise os.kill is used after checking that the
+       pid still has the same starttime."""
+
+    #The numbers from the generic syscall table.  Alpha, ia64, mips
+    #  and x32 number their syscalls differently, so pidfds are only
+    #  used on the machines in PIDFD_MACHINES
+    SYS_PIDFD_SEND_SIGNAL = 424
+    SYS_PIDFD_OPEN = 434
+
+    PIDFD_MACHINES = [
+        'x86_64', 'i386', 'i486', 'i586', 'i686',
+        'aarch64', 'arm64', 'armv6l', 'armv7l', 'armv8l',
+        'ppc', 'ppc64', 'ppc64le', 's390x', 'riscv64' ]
+
+    _libc = None
+    _pidfds = None
+
+    @staticmethod
+    def _knownMachine():
+        machine = platform.machine()
+        if machine not in PidSignaller.PIDFD_MACHINES:
+            return False
+        if machine == 'x86_64' and ctypes.sizeof(ctypes.c_void_p) != 8:
+            #An x32 (or i386) process on a 64 bit kernel
+            return False
+        return True
+
+    @staticmethod
+    def _syscall():
+        if PidSignaller._pidfds is None:
+            PidSignaller._pidfds = False
+            if not PidSignaller._knownMachine():
+                return None
+            try:
+                libc = ctypes.CDLL(
+                    ctypes.util.find_library('c'),
+                    use_errno=True )
+                fd = libc.syscall(
+                    PidSignaller.SYS_PIDFD_OPEN,
+                    ctypes.c_int(os.getpid()),
+                    ctypes.c_uint(0) )
+                if fd >= 0:
+                    os.close(fd)
+                    PidSignaller._libc = libc
+                    PidSignaller._pidfds = True
+            except (OSError, AttributeError, TypeError):
+                pass
+        if PidSignaller._pidfds:
+            return PidSignaller._libc.syscall
+        return None
+
+    @staticmethod
+    def send(pid, starttime, signum):
+        """Signals the process (pid, starttime).
+           Returns True if it was signalled or is already gone,
+           raises OSError if the signal is not permitted"""
+        syscall = PidSignaller._syscall()
+        fd = -1
+        if syscall is not None:
+            fd = syscall(
+                PidSignaller.SYS_PIDFD_OPEN,
+                ctypes.c_int(pid),
+                ctypes.c_uint(0) )
+            if fd < 0:
+                return ctypes.get_errno() == errno.ESRCH
+        try:
+            if starttime is not None \
+                and ProcessTable.starttime(pid) != starttime:
+                #The process is gone and the pid was reused
+                return True
+            if fd < 0:
+                try:
+                    os.kill(pid, signum)
+                except OSError as e:
+                    if e.errno == errno.ESRCH:
+                        return True
+                    raise
+                return True
+            if syscall(
+                PidSignaller.SYS_PIDFD_SEND_SIGNAL,
+                ctypes.c_int(fd),
+                ctypes.c_int(signum),
+                None,
+                ctypes.c_uint(0) ) < 0:
+                error = ctypes.get_errno()
+                if error == errno.ESRCH:
+                    return True
+                raise OSError(error, os.strerror(error))
+            return True
+        finally:
+            if fd >= 0:
+                os.close(fd)
+
+class ProcessGroup:
+    """Tracks the processes in csmake's process group so the processes
+       a build leaves running can be killed at the end of the build.
+       Processes that were in the group before the build started
+       (see snapshot) are left alone."""
+
+    def __init__(self, log, pgid=None):
+        self.log = log
+        if pgid is None:
+            pgid = os.getpgrp()
+        self.pgid = pgid
+        self.previous = set()
+
+    def _members(self):
+        """Returns {pid : starttime} of the other processes in the group"""
+        mypid = os.getpid()
+        return dict([
+            (pid, stat[1])
+            for pid, stat in ProcessTable.processes().iteritems()
+            if stat[0] == self.pgid and pid != mypid ])
+
+    def snapshot(self):
+        self.previous = set(self._members().iteritems())
+
+    def stragglers(self):
+        """Returns [(pid, starttime)] for the processes started in the
+           group since the snapshot that are still running"""
+        return sorted([
+            member for member in self._members().iteritems()
+            if member not in self.previous ])
+
+    def terminate(self, signum=signal.SIGKILL):
+        """Kills the stragglers, returns the pids that were signalled"""
+        stragglers = self.stragglers()
+        self.log.debug("csmake pgroup: %d", self.pgid)
+        denied = []
+        for pid, starttime in stragglers:
+            self.log.warning(
+                "Process %d (%s) is being killed - check build to ensure all processes are contained",
+                pid,
+                ProcessTable.command(pid) )
+            try:
+                PidSignaller.send(pid, starttime, signum)
+            except OSError as e:
+                self.log.devdebug("Could not kill %d: %s", pid, str(e))
+                denied.append(pid)
+        if len(denied) != 0:
+            subprocess.call(
+                ['sudo', 'kill', '-%d' % signum] + [ str(x) for x in denied ],
+                stdout=self.log.out(),
+                stderr=self.log.err() )
+        return [ pid for pid, starttime in stragglers ]
@@ -0,0 +1,189 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import json
+import time
+import resource
+import threading
+
+class ProfileSpan:
+    def __init__(self, name, category, thread, parent):
+        self.name = name
+        self.category = category
+        self.thread = thread
+        self.parent = parent
+        self.start = time.time()
+        self.cpuStart = Profiler.cpuSeconds()
+        self.args = {}
+
+class Profiler:
+    """Listens to the engine (see CliDriver.addListener) and writes
+       a Chrome trace-event file (chrome://tracing, Perfetto) with a
+       span for every phase, step, and aspect joinpoint.
+
+       Each span records the wall clock time, the CPU time used by
+       csmake and its finished child processes during the span (this
+       includes other steps running in parallel), and the peak RSS
+       seen so far.  A step launched on a parallel thread is tied to
+       the step that launched it through the thread's parent()
+       (as in the ParallelLaunchStack)."""
+
+    def __init__(self, path, log=None):
+        self.path = path
+        self.log = log
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.epoch = time.time()
+        self.events = []
+        self.threads = {}
+        self.open = {}
+        self.flows = 0
+
+    @staticmethod
+    def cpuSeconds():
+        times = os.times()
+        return times[0] + times[1] + times[2] + times[3]
+
+    @staticmethod
+    def peakRSS():
+        """Peak resident set size of csmake or any finished child in KB"""
+        return max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss )
+
+    def _tid(self, thread):
+        #NOTE: Must be called with the lock held
+        if thread not in self.threads:
+            self.threads[thread] = len(self.threads) + 1
+            self.events.append({
+                'ph' : 'M',
+                'name' : 'thread_name',
+                'pid' : self.pid,
+                'tid' : self.threads[thread],
+                'args' : { 'name' : thread.name } })
+        return self.threads[thread]
+
+    def _micros(self, timestamp):
+        return int((timestamp - self.epoch) * 1000000)
+
+    def _innermost(self, thread):
+        #NOTE: Must be called with the lock held
+        while thread is not None:
+            spans = self.open.get(thread)
+            if spans:
+                return spans[-1]
+            try:
+                thread = thread.parent()
+            except AttributeError:
+                return None
+        return None
+
+    def begin(self, name, category):
+        thread = threading.currentThread()
+        with self.lock:
+            parent = self._innermost(thread)
+            span = ProfileSpan(name, category, thread, parent)
+            self.open.setdefault(thread, []).append(span)
+            return span
+
+    def end(self, span, name=None, **args):
+        end = time.time()
+        cpu = Profiler.cpuSeconds() - span.cpuStart
+        with self.lock:
+            spans = self.open.get(span.thread, [])
+            if span in spans:
+                spans.remove(span)
+            if len(spans) == 0 and span.thread in self.open:
+                del self.open[span.thread]
+            if name is not None:
+                span.name = name
+            span.args.update(args)
+            span.args['cpu_ms'] = round(cpu * 1000, 3)
+            span.args['peak_rss_kb'] = Profiler.peakRSS()
+            tid = self._tid(span.thread)
+            if span.parent is not None:
+                span.args['parent'] = span.parent.name
+            self.events.append({
+                'ph' : 'X',
+                'name' : span.name,
+                'cat' : span.category,
+                'pid' : self.pid,
+                'tid' : tid,
+                'ts' : self._micros(span.start),
+                'dur' : self._micros(end) - self._micros(span.start),
+                'args' : span.args })
+            if span.parent is not None and span.parent.thread is not span.thread:
+                #Draw an arrow from the launching step to this one
+                self.flows += 1
+                self.events.append({
+                    'ph' : 's',
+                    'name' : 'launch',
+                    'cat' : 'flow',
+                    'id' : self.flows,
+                    'pid' : self.pid,
+                    'tid' : self._tid(span.parent.thread),
+                    'ts' : self._micros(span.start) })
+                self.events.append({
+                    'ph' : 'f',
+                    'bp' : 'e',
+                    'name' : 'launch',
+                    'cat' : 'flow',
+                    'id' : self.flows,
+                    'pid' : self.pid,
+                    'tid' : tid,
+                    'ts' : self._micros(span.start) })
+
+    #Engine listener interface
+    def phaseStarted(self, phase):
+        return self.begin(phase, 'phase')
+
+    def phaseEnded(self, token, phase, passed):
+        self.end(token, passed=passed)
+
+    def stepStarted(self, step, phase):
+        return self.begin(step, 'step')
+
+    def stepEnded(self, token, step, section, phase, result):
+        status = None
+        if result is not None:
+            status = result.params['status']
+        self.end(token, section, phase=phase, status=status)
+
+    def joinpointStarted(self, joinpoint, phase, execinstance):
+        return self.begin(joinpoint, 'joinpoint')
+
+    def joinpointEnded(self, token, joinpoint, phase, execinstance):
+        self.end(
+            token,
+            "%s: %s" % (execinstance.calledId, joinpoint),
+            phase=phase )
+
+    def close(self):
+        with self.lock:
+            document = {
+                'traceEvents' : list(self.events),
+                'displayTimeUnit' : 'ms',
+                'otherData' : { 'tool' : 'csmake' } }
+        try:
+            with open(self.path, 'w') as profile:
+                json.dump(document, profile)
+        except (IOError, OSError) as e:
+            if self.log is not None:
+                self.log.error(
+                    "Profile could not be written to '%s': %s",
+                    self.path,
+                    str(e) )
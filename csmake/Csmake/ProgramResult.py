@@ -44,15 +44,45 @@ class ProgramResult(Result):
      {3} csmake - version %s
 """ % version
         self.resultType="csmake"
+        #Set by the engine when parallel output is multiplexed
+        self.multiplexer = None
 
         self.PHASE_BANNER="""       _   _   _   _   _   _   _   _   _   _   _   _   _   _   _   _
     ,-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)-(_)
     `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-' `-'
 """
 
+    def _channel(self):
+        if self.multiplexer is None:
+            return None
+        return self.multiplexer.channel()
+
+    def out(self):
+        channel = self._channel()
+        if channel is None:
+            return Result.out(self)
+        channel.flush()
+        return channel
+
+    def err(self):
+        channel = self._channel()
+        if channel is None:
+            return Result.err(self)
+        channel.flush()
+        return channel
+
+    def write(self, output):
+        channel = self._channel()
+        if channel is None:
+            Result.write(self, output)
+        else:
+            self.outstream.write(output)
+            channel.write(output)
+
     def log(self, level, output, *params):
         #print "XXX Output: %s" % output
         #print "XXX params: %s" % str(params)
+        self._announceRecord(level, output, params)
         try:
             self.write("` %s: %s\n" % (
                 level,
@@ -0,0 +1,95 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import threading
+
+class ReadWriteLock:
+    """A reentrant lock that lets any number of threads read at once,
+       or a single thread write.
+       A thread holding the write lock may also take the read lock.
+       A thread holding only the read lock may not take the write lock
+       (two readers doing that would deadlock), so acquireWrite raises
+       a RuntimeError instead.
+       New readers wait while a writer is waiting so writers don't
+       starve - except readers that already hold the lock.
+       acquire/release are the write lock, so this can stand in
+       for an RLock."""
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = {}
+        self.writer = None
+        self.writerDepth = 0
+        self.waitingWriters = 0
+
+    def acquireRead(self):
+        current = threading.currentThread()
+        with self.condition:
+            if self.writer is not current and current not in self.readers:
+                while self.writer is not None or self.waitingWriters > 0:
+                    self.condition.wait()
+            self.readers[current] = self.readers.get(current, 0) + 1
+
+    def releaseRead(self):
+        current = threading.currentThread()
+        with self.condition:
+            if current not in self.readers:
+                raise RuntimeError("Read lock released without being held")
+            self.readers[current] -= 1
+            if self.readers[current] == 0:
+                del self.readers[current]
+                if len(self.readers) == 0:
+                    self.condition.notifyAll()
+
+    def acquireWrite(self):
+        current = threading.currentThread()
+        with self.condition:
+            if self.writer is current:
+                self.writerDepth += 1
+                return
+            if current in self.readers:
+                raise RuntimeError(
+                    "A read lock can't be upgraded to a write lock" )
+            self.waitingWriters += 1
+            try:
+                while self.writer is not None or len(self.readers) > 0:
+                    self.condition.wait()
+            finally:
+                self.waitingWriters -= 1
+            self.writer = current
+            self.writerDepth = 1
+
+    def releaseWrite(self):
+        with self.condition:
+            if self.writer is not threading.currentThread():
+                raise RuntimeError("Write lock released without being held")
+            self.writerDepth -= 1
+            if self.writerDepth == 0:
+                self.writer = None
+                self.condition.notifyAll()
+
+    def acquire(self):
+        self.acquireWrite()
+
+    def release(self):
+        self.releaseWrite()
+
+    def __enter__(self):
+        self.acquireWrite()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.releaseWrite()
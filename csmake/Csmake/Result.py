@@ -19,6 +19,7 @@ import pickle
 import sys
 import json
 import traceback
+from ResultOutput import ResultOutput
 
 class Result:
 
@@ -48,7 +49,6 @@ class Result:
             self.params['status'] = "Unexecuted"
         if 'exception' not in self.params:
             self.params['exception'] = False
-        self.outstream = StringIO.StringIO()
         if 'Out' not in self.params:
             self.params['Out'] = sys.stdout
         if 'Err' not in self.params:
@@ -57,6 +57,9 @@ class Result:
             self.params['Type'] = '<<Type Unset>>'
         if 'Id' not in self.params:
             self.params['Id'] = '<<Step Id Unset>>'
+        self.outstream = self._createOutputStream()
+        #Called with (result, level, output, params) for each log record
+        self.recordListener = None
 
         self.NESTNOTE='+'
 
@@ -103,6 +106,20 @@ __________________________________________________________________
         self.ONEXIT_BEGIN_SEPARATOR=" %s\n" % ("`" *72)
         self.ONEXIT_END_SEPARATOR="   %s\n" % ("." * 70)
 
+    def _createOutputStream(self):
+        try:
+            retention = self.settings['output-retention']
+        except KeyError:
+            retention = None
+        try:
+            resultsDir = self.env.env.get('RESULTS')
+        except AttributeError:
+            resultsDir = None
+        return ResultOutput.create(
+            retention,
+            resultsDir,
+            "%s@%s" % (self.params['Type'], self.params['Id']) )
+
     def setTargetModule(self, targetModule):
         self.params['targetModule'] = targetModule
 
@@ -311,6 +328,8 @@ __________________________________________________________________
                     self.params['Type'],
                     self.params['Id'],
                     "End" ))
+        #Let go of anything held open for the step's output
+        self.outstream.flush()
 
     def repeatOutput(self, fobj, nesting=0):
         if not self.loglevel:
@@ -320,7 +339,7 @@ __________________________________________________________________
                 self.params['Type'],
                 self.params['Id'] ))
             fobj.write("\n")
-            fobj.write(self.outstream.getvalue())
+            self.outstream.copyTo(fobj)
             fobj.write("\n")
             fobj.write(self.STATUS_SEPARATOR)
             if self.params['status'] == 'Passed':
@@ -338,21 +357,28 @@ __________________________________________________________________
             
             fobj.write(self.OBJECT_FOOTER)
         else:
-            fobj.write(self.outstream.getvalue())
+            self.outstream.copyTo(fobj)
 
-    def picklePrint(self, fobj):
-        parts = fobj.params.clone()
+    def _printableParams(self):
+        parts = self.params.copy()
         parts['Out'] = self.outstream.getvalue()
         del parts['Err']
-        pickle.dump(parts, fobj)
+        if 'targetModule' in parts:
+            parts['targetModule'] = str(parts['targetModule'])
+        return parts
+
+    def picklePrint(self, fobj):
+        pickle.dump(self._printableParams(), fobj)
 
     def jsonPrint(self, fobj):
-        parts = fobj.params.clone()
-        parts['Out'] = self.outstream.getvalue()
-        del parts['Err']
-        json.dump(parts, fobj)
+        json.dump(self._printableParams(), fobj)
+
+    def _announceRecord(self, level, output, params):
+        if self.recordListener is not None:
+            self.recordListener(self, level, output, params)
 
     def log(self, level, output, *params):
+        self._announceRecord(level, output, params)
         try:
             self.write("%s@%s: %s: %s\n" % (
                 self.params['Type'],
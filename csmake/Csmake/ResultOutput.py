@@ -0,0 +1,220 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import StringIO
+import collections
+import itertools
+import os
+import os.path
+
+#Retention of the output kept by a Result (see --output-retention)
+#  The output always goes to the log as it is written, these only
+#  control what is kept for __repr__, repeatOutput, and the like.
+
+def _encoded(output):
+    #Output is kept (and counted) as bytes, unicode is kept as utf-8
+    if isinstance(output, unicode):
+        return output.encode('utf-8')
+    return str(output)
+
+class AllOutput(StringIO.StringIO):
+    """Keeps all of the output in memory"""
+
+    def copyTo(self, fobj):
+        fobj.write(self.getvalue())
+
+    def flush(self):
+        pass
+
+class TailOutput:
+    """Keeps the last 'limit' bytes of the output in memory"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = collections.deque()
+        self.size = 0
+        self.dropped = 0
+
+    def write(self, output):
+        output = _encoded(output)
+        if len(output) == 0:
+            return
+        self.chunks.append(output)
+        self.size += len(output)
+        while self.size - len(self.chunks[0]) >= self.limit:
+            chunk = self.chunks.popleft()
+            self.size -= len(chunk)
+            self.dropped += len(chunk)
+        if self.size > self.limit:
+            excess = self.size - self.limit
+            self.chunks[0] = self.chunks[0][excess:]
+            self.size -= excess
+            self.dropped += excess
+
+    def getvalue(self):
+        value = ''.join(self.chunks)
+        if len(self.chunks) > 1:
+            self.chunks = collections.deque([value])
+        if self.dropped == 0:
+            return value
+        return "[... %d bytes of output not kept ...]\n%s" % (
+            self.dropped,
+            value )
+
+    def copyTo(self, fobj):
+        fobj.write(self.getvalue())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.chunks = collections.deque()
+        self.size = 0
+
+class SpillOutput:
+    """Writes the output to a file, keeping nothing in memory.
+       getvalue() returns the last 'limit' bytes of the file,
+       copyTo() copies all of it.
+       The file is closed on flush() and reopened if there is
+       more output, so finished steps do not hold a descriptor."""
+
+    def __init__(self, path, limit):
+        self.path = path
+        self.limit = limit
+        self.fobj = None
+        self.size = 0
+        self.created = False
+
+    def _open(self):
+        if self.fobj is None:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    if not os.path.isdir(directory):
+                        raise
+            #Replace any file left by an earlier build the first time
+            self.fobj = open(self.path, 'ab' if self.created else 'wb')
+            self.created = True
+        return self.fobj
+
+    def write(self, output):
+        output = _encoded(output)
+        if len(output) == 0:
+            return
+        self._open().write(output)
+        self.size += len(output)
+
+    def getvalue(self):
+        if self.size == 0:
+            return ''
+        if self.fobj is not None:
+            self.fobj.flush()
+        with open(self.path, 'rb') as spill:
+            if self.size > self.limit:
+                spill.seek(self.size - self.limit)
+            value = spill.read()
+        if self.size <= self.limit:
+            return value
+        return "[... %d bytes of output in %s ...]\n%s" % (
+            self.size - self.limit,
+            self.path,
+            value )
+
+    def copyTo(self, fobj):
+        if self.size == 0:
+            return
+        if self.fobj is not None:
+            self.fobj.flush()
+        with open(self.path, 'rb') as spill:
+            while True:
+                chunk = spill.read(65536)
+                if len(chunk) == 0:
+                    break
+                fobj.write(chunk)
+
+    def flush(self):
+        if self.fobj is not None:
+            self.fobj.close()
+            self.fobj = None
+
+    def close(self):
+        self.flush()
+
+class ResultOutput:
+    """Creates the stream a Result keeps its output in from the
+       --output-retention setting:
+           all      - keep everything in memory (the default)
+           tail:<N> - keep the last N KB in memory
+           spill    - write each step's output to a file in the
+                      step-output directory of the results directory
+                      (the last DEFAULT_TAIL_KB are shown in reports)"""
+
+    DEFAULT_TAIL_KB = 64
+    SPILL_DIRECTORY = 'step-output'
+
+    _spillCounter = itertools.count(1)
+
+    @staticmethod
+    def parseRetention(value):
+        """Returns (mode, limit in bytes) or raises ValueError"""
+        if value is None:
+            return ('all', None)
+        parts = value.strip().split(':', 1)
+        mode = parts[0].strip()
+        if mode not in ['all', 'tail', 'spill']:
+            raise ValueError(
+                "output retention must be 'all', 'tail:<KB>' or 'spill', got '%s'" % value)
+        if mode == 'all':
+            if len(parts) > 1:
+                raise ValueError("'all' output retention takes no size")
+            return (mode, None)
+        kb = ResultOutput.DEFAULT_TAIL_KB
+        if len(parts) > 1:
+            try:
+                kb = int(parts[1])
+            except ValueError:
+                raise ValueError(
+                    "output retention size must be a number of KB, got '%s'" % parts[1])
+            if kb < 1:
+                raise ValueError("output retention size must be at least 1 KB")
+        return (mode, kb * 1024)
+
+    @staticmethod
+    def spillPath(resultsDir, name):
+        name = name.replace(os.sep, '_')
+        return os.path.join(
+            os.path.abspath(resultsDir),
+            ResultOutput.SPILL_DIRECTORY,
+            "%05d-%s.log" % (ResultOutput._spillCounter.next(), name) )
+
+    @staticmethod
+    def create(value, resultsDir, name):
+        """resultsDir may be None if there is no results directory yet,
+           in which case spilled output is kept as a tail instead"""
+        try:
+            mode, limit = ResultOutput.parseRetention(value)
+        except ValueError:
+            #Reported at startup (see CliDriver)
+            mode, limit = ('all', None)
+        if mode == 'all':
+            return AllOutput()
+        if mode == 'spill' and resultsDir is not None:
+            return SpillOutput(
+                ResultOutput.spillPath(resultsDir, name),
+                limit )
+        return TailOutput(limit)
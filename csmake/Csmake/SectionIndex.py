@@ -0,0 +1,54 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+
+class SectionIndex:
+    """Maps step ids to the section and the aspect sections for the id.
+       Sections are added in the order they appear in the buildspec,
+       the first section with a given id is the one that is found.
+
+       Readers do not need a lock, each add publishes a new index.
+       Adds must be serialized by the caller (e.g., buildspecLock)"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._index = ({}, {})
+
+    def add(self, sections):
+        """Adds the given section names to the index"""
+        sectionIds, aspectIds = self._index
+        sectionIds = sectionIds.copy()
+        aspectIds = aspectIds.copy()
+        for section in sections:
+            parts = section.split('@')
+            if len(parts) != 2:
+                continue
+            if section[0] == '&':
+                aspectId = parts[1].split(' ')[0]
+                aspectIds[aspectId] = aspectIds.get(aspectId, ()) + (section,)
+            elif parts[1] not in sectionIds:
+                sectionIds[parts[1]] = section
+        self._index = (sectionIds, aspectIds)
+
+    def lookupSection(self, stepId):
+        """Returns the section for the id, or None"""
+        return self._index[0].get(stepId)
+
+    def lookupAspects(self, stepId):
+        """Returns a list of the aspect sections for the id"""
+        return list(self._index[1].get(stepId, ()))
@@ -0,0 +1,420 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import sys
+import stat
+import json
+import time
+import base64
+import hashlib
+import inspect
+import shutil
+import tempfile
+import threading
+import cPickle
+from FileManager import FileManager
+
+class StepCache:
+    """Keeps the declared outputs and return value of steps that passed,
+       keyed by a fingerprint of everything the step was given:
+           - The phase and the section
+           - The step's options, with substitutions done
+           - The csmake environment
+           - The content of the step's **files and **maps inputs
+           - The source of the module (and the classes it derives from)
+       When a step with the same fingerprint is launched again, its
+       outputs are put back in place instead of running the step.
+
+       Only steps that declare what they produce (**maps or
+       **yields-files) are kept, and only when the step has no aspects
+       and doesn't use **no-cache.
+
+       The cache directory has:
+           objects/<sha256> - the content of the outputs
+           entries/<fingerprint>.json - the outputs and return value
+       Entries are evicted least recently used first when the objects
+       take more than the size limit, until they take no more than
+       EVICT_TO of the limit.  The size of the objects is counted once
+       and then kept up to date as objects are added, so the cache is
+       only listed again when it is over the limit."""
+
+    VERSION = 1
+
+    EVICT_TO = 0.9
+
+    NEVER_CACHE = [
+        'command', 'subcommand', 'environment', 'metadata', 'include',
+        'ShellEnv', 'ShellToEnvironment' ]
+
+    NO_CACHE_OPTION = '**no-cache'
+
+    #The source files of each module class
+    _sources = {}
+
+    def __init__(self, directory, maxBytes, log=None):
+        self.directory = directory
+        self.objects = os.path.join(directory, 'objects')
+        self.entries = os.path.join(directory, 'entries')
+        self.maxBytes = maxBytes
+        self.log = log
+        self.lock = threading.RLock()
+        self.hashes = {}
+        self.totalBytes = None
+
+    def _devdebug(self, output, *params):
+        if self.log is not None:
+            self.log.devdebug(output, *params)
+
+    def _hashFile(self, path):
+        info = os.stat(path)
+        key = (path, info.st_mtime, info.st_size, info.st_ino)
+        with self.lock:
+            if key in self.hashes:
+                return self.hashes[key]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as content:
+            for block in iter(lambda: content.read(65536), ''):
+                digest.update(block)
+        result = digest.hexdigest()
+        with self.lock:
+            self.hashes[key] = result
+        return result
+
+    def _hashPath(self, digest, path):
+        digest.update('\0path:%s' % path)
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    filepath = os.path.join(root, name)
+                    digest.update('\0file:%s:%s' % (
+                        os.path.relpath(filepath, path),
+                        self._hashFile(filepath) ))
+        elif os.path.exists(path):
+            digest.update('\0content:%s' % self._hashFile(path))
+        else:
+            digest.update('\0missing')
+
+    @staticmethod
+    def _moduleSources(instance):
+        moduleClass = instance.__class__
+        sources = StepCache._sources.get(moduleClass)
+        if sources is not None:
+            return sources
+        sources = []
+        for cls in inspect.getmro(moduleClass):
+            try:
+                source = inspect.getsourcefile(cls)
+            except TypeError:
+                continue
+            if source is not None and source not in sources:
+                sources.append(source)
+        StepCache._sources[moduleClass] = sources
+        return sources
+
+    @staticmethod
+    def _referencedSections(engine, stepdict):
+        #Shell and its relatives pull more options through env=
+        result = []
+        if 'env' not in stepdict:
+            return result
+        for ref in stepdict['env'].split(','):
+            ref = ref.strip()
+            if len(ref) == 0:
+                continue
+            section = engine.lookupSection(ref)
+            if section is not None:
+                result.append((
+                    section,
+                    sorted(engine.getSectionOptions(section).items()) ))
+        return result
+
+    def fingerprint(self, engine, section, instance, stepdict, phase, aspects):
+        """Returns the fingerprint for the step or None if the step
+           can't be kept in the cache"""
+        sectionType = section.split('@')[0]
+        if sectionType in StepCache.NEVER_CACHE \
+            or StepCache.NO_CACHE_OPTION in stepdict \
+            or len(aspects) != 0:
+            return None
+        if instance.mapping is None and instance.yieldsfiles is None:
+            return None
+        try:
+            return StepCache.digest(
+                'csmake-step-cache:%d' % StepCache.VERSION,
+                engine,
+                section,
+                instance,
+                stepdict,
+                phase,
+                self._hashPath )
+        except Exception as e:
+            self._devdebug("Step '%s' will not be cached: %s", section, str(e))
+            return None
+
+    @staticmethod
+    def digest(salt, engine, section, instance, stepdict, phase, hashPath):
+        """Returns a digest of everything the step was given.
+           hashPath(digest, path) adds an input file or module source"""
+        env = instance.env
+        digest = hashlib.sha256()
+        digest.update('%s\0' % salt)
+        digest.update('phase:%s\0section:%s\0' % (phase, section))
+        for key in sorted(stepdict.keys()):
+            value = stepdict[key]
+            if key.startswith('**'):
+                value = env.doSubstitutions(value)
+            digest.update('option:%s=%s\0' % (key, value))
+        for key in sorted(env.env.keys()):
+            value = env.env[key]
+            if isinstance(value, basestring):
+                digest.update('env:%s=%s\0' % (key, value))
+        digest.update('refs:%s\0' % repr(
+            StepCache._referencedSections(engine, stepdict) ))
+        inputs = []
+        if instance.newfiles is not None:
+            inputs.extend(instance.newfiles)
+        if instance.mapping is not None:
+            for fromInstances, toSpecs in instance.mapping.itermappings():
+                inputs.extend(fromInstances)
+        for inputInstance in inputs:
+            hashPath(digest, inputInstance.index['location'])
+        for source in StepCache._moduleSources(instance):
+            hashPath(digest, source)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _yieldsLocations(instance):
+        result = []
+        for filematch in instance.yieldsfiles:
+            spec = dict(filematch)
+            FileManager.fixupLocationWithBase(
+                instance.env.env['RESULTS'],
+                spec['location'],
+                spec )
+            if spec.get('useRE'):
+                result.extend(FileManager.findDiskFilesMatchingRegex(
+                    spec['location'] ))
+            else:
+                result.extend(FileManager.findDiskFilesMatchingStarred(
+                    spec['location'] ))
+        return result
+
+    @staticmethod
+    def outputs(instance):
+        """Returns the locations of the files the step declared it made
+           The files the file manager found for **yields-files when the
+           step passed are used, the disk is only searched again if
+           they haven't been found yet"""
+        result = []
+        if instance.mapping is not None:
+            for fromInstances, toSpecs in instance.mapping.itermappings():
+                for spec in toSpecs:
+                    if 'location' not in spec:
+                        raise ValueError("Mapped output has no location")
+                    result.append(spec['location'])
+        if instance.yieldedfiles is not None:
+            result.extend([ x.index['location'] for x in instance.yieldedfiles ])
+        elif instance.yieldsfiles is not None:
+            result.extend(StepCache._yieldsLocations(instance))
+        return sorted(set([ os.path.abspath(x) for x in result ]))
+
+    def _entryPath(self, fingerprint):
+        return os.path.join(self.entries, '%s.json' % fingerprint)
+
+    def _objectPath(self, digest):
+        return os.path.join(self.objects, digest)
+
+    def _ensureDirectories(self):
+        for path in (self.objects, self.entries):
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path):
+                        raise
+
+    def _writeAtomically(self, target, writer):
+        fd, tempname = tempfile.mkstemp(
+            prefix='.tmp.',
+            dir=os.path.dirname(target) )
+        try:
+            with os.fdopen(fd, 'wb') as tempfileobj:
+                writer(tempfileobj)
+            os.rename(tempname, target)
+        except:
+            if os.path.exists(tempname):
+                os.remove(tempname)
+            raise
+
+    def store(self, fingerprint, instance, phase):
+        """Keeps the outputs and return value of a step that passed
+           Returns True if the step was stored"""
+        if instance.deletingFiles:
+            return False
+        try:
+            returnValue = base64.b64encode(cPickle.dumps(
+                instance.log.getReturnValue(phase),
+                2 ))
+            self._ensureDirectories()
+            outputs = []
+            added = 0
+            for location in StepCache.outputs(instance):
+                if not os.path.isfile(location):
+                    #Directories and other special outputs aren't kept
+                    self._devdebug(
+                        "Step output '%s' is not a file, not caching",
+                        location )
+                    return False
+                digest = self._hashFile(location)
+                objectPath = self._objectPath(digest)
+                if not os.path.exists(objectPath):
+                    def copyObject(fileobj):
+                        with open(location, 'rb') as source:
+                            shutil.copyfileobj(source, fileobj)
+                    self._writeAtomically(objectPath, copyObject)
+                    added += os.stat(objectPath).st_size
+                outputs.append([
+                    location,
+                    digest,
+                    stat.S_IMODE(os.stat(location).st_mode) ])
+            entry = {
+                'version' : StepCache.VERSION,
+                'section' : instance.calledId,
+                'outputs' : outputs,
+                'return' : returnValue }
+            self._writeAtomically(
+                self._entryPath(fingerprint),
+                lambda fileobj: json.dump(entry, fileobj) )
+            if self._grow(added):
+                self._evict()
+            return True
+        except Exception as e:
+            self._devdebug(
+                "Step '%s' could not be cached: %s",
+                instance.calledId,
+                str(e) )
+            return False
+
+    def restore(self, fingerprint, instance, phase):
+        """Puts back the outputs and return value of a step kept in the
+           cache.  Returns True if the step was restored"""
+        entryPath = self._entryPath(fingerprint)
+        try:
+            with open(entryPath) as entryfile:
+                entry = json.load(entryfile)
+            if entry.get('version') != StepCache.VERSION:
+                return False
+            returnValue = cPickle.loads(base64.b64decode(entry['return']))
+            for location, digest, mode in entry['outputs']:
+                if not os.path.exists(self._objectPath(digest)):
+                    return False
+            for location, digest, mode in entry['outputs']:
+                if os.path.isfile(location) \
+                    and self._hashFile(location) == digest:
+                    continue
+                directory = os.path.dirname(location)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                def copyObject(fileobj):
+                    with open(self._objectPath(digest), 'rb') as source:
+                        shutil.copyfileobj(source, fileobj)
+                self._writeAtomically(location, copyObject)
+                os.chmod(location, mode)
+            #Mark the entry as recently used
+            os.utime(entryPath, None)
+        except (IOError, OSError, ValueError, KeyError, cPickle.PickleError) as e:
+            self._devdebug(
+                "Step '%s' not restored from cache: %s",
+                instance.calledId,
+                str(e) )
+            return False
+        instance.log.setReturnValue(returnValue, phase)
+        instance.log.passed()
+        return True
+
+    def _objectSizes(self):
+        sizes = {}
+        for name in os.listdir(self.objects):
+            if name.startswith('.'):
+                continue
+            try:
+                sizes[name] = os.stat(self._objectPath(name)).st_size
+            except OSError:
+                pass
+        return sizes
+
+    def _grow(self, added):
+        """Adds the bytes of new objects to the size of the cache.
+           Returns True if the cache is over the size limit"""
+        with self.lock:
+            if self.totalBytes is None:
+                #The first count already has the new objects
+                self.totalBytes = sum(self._objectSizes().values())
+            else:
+                self.totalBytes += added
+            return self.totalBytes > self.maxBytes
+
+    def _evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.entries):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.entries, name)
+                try:
+                    with open(path) as entryfile:
+                        digests = [ x[1] for x in json.load(entryfile)['outputs'] ]
+                    entries.append((os.stat(path).st_mtime, path, digests))
+                except (IOError, OSError, ValueError, KeyError):
+                    continue
+            sizes = self._objectSizes()
+            total = sum(sizes.values())
+            self.totalBytes = total
+            if total <= self.maxBytes:
+                return
+            target = int(self.maxBytes * StepCache.EVICT_TO)
+            entries.sort()
+            referenced = {}
+            for _, _, digests in entries:
+                for digest in digests:
+                    referenced[digest] = referenced.get(digest, 0) + 1
+            #Objects nothing refers to go first
+            for digest in sizes.keys():
+                if digest not in referenced:
+                    total -= self._removeObject(digest, sizes)
+            for mtime, path, digests in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._devdebug("Evicted step cache entry: %s", path)
+                for digest in digests:
+                    referenced[digest] -= 1
+                    if referenced[digest] == 0:
+                        total -= self._removeObject(digest, sizes)
+            self.totalBytes = total
+
+    def _removeObject(self, digest, sizes):
+        try:
+            os.remove(self._objectPath(digest))
+            return sizes.get(digest, 0)
+        except OSError:
+            return 0
@@ -0,0 +1,441 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import fnmatch
+import re
+from FileManager import FileManager
+
+class StepNode:
+    """A single step in a command as seen by the scheduler.
+       reads and writes are sets of resources (see StepDependencyGraph)"""
+
+    def __init__(self, stepname, index, group):
+        self.stepname = stepname
+        self.index = index
+        self.group = group
+        self.sectionType = None
+        self.reads = set()
+        self.writes = set()
+        self.barrier = False
+        self.deps = set()
+        self.dependents = set()
+
+    def __repr__(self):
+        return "<StepNode %d: %s%s>" % (
+            self.index,
+            self.stepname,
+            " (barrier)" if self.barrier else "" )
+
+    def __str__(self):
+        return self.__repr__()
+
+class StepDependencyGraph:
+    """Infers the ordering requirements between the steps of a command
+       from the file tracking declarations (**files, **maps, **yields-files)
+       and the env= references of each step.
+
+       Resources a step reads or writes are tuples:
+           ('id', <file id>)   - a tracked file id
+           ('anyid',)          - any tracked file (a reference without an id)
+           ('loc', <prefix>, <location>, <useRE>)
+                               - a location on disk, with the literal
+                                 prefix of the (substituted) location
+           ('step', <step id>) - the result of another step (env=)
+
+       Steps that do not declare anything, or that change the state
+       of the build (environment, metadata, ...) are barriers:
+       everything before a barrier completes before it starts and
+       nothing after it starts until it completes."""
+
+    #Section types that change the state shared by all steps
+    BARRIER_TYPES = [
+        'command',
+        'subcommand',
+        'environment',
+        'metadata',
+        'include',
+        'ShellToEnvironment' ]
+
+    def __init__(self, lookup, substitute=None, log=None):
+        """lookup - callable that takes a step name and returns
+                    (section type, options dictionary) or None
+           substitute - callable to do environment substitutions on
+                        locations (optional)"""
+        self.lookup = lookup
+        self.substitute = substitute
+        self.log = log
+        self.fileManager = FileManager()
+
+    @staticmethod
+    def forEngine(engine, log=None):
+        """Returns a graph that looks steps up in the engine's buildspec"""
+        def lookupStep(stepname):
+            section = engine.lookupSection(stepname)
+            if section is None:
+                return None
+            sectionType = section.split('@')[0]
+            return (sectionType, engine.getSectionOptions(section))
+        return StepDependencyGraph(
+            lookupStep,
+            engine.environment.doSubstitutions,
+            log )
+
+    @staticmethod
+    def flattenCommand(groups):
+        """Takes the structure from command._prepareCommand and yields
+           (stepname, group number) for every step in order"""
+        for groupnum, group in enumerate(groups):
+            for stepname in group:
+                stepname = stepname.strip()
+                if len(stepname) == 0:
+                    continue
+                yield (stepname, groupnum)
+
+    def _substitute(self, value):
+        if self.substitute is None:
+            return value
+        try:
+            return self.substitute(value)
+        except Exception:
+            #The location cannot be known yet - any location may overlap
+            return ''
+
+    @staticmethod
+    def literalPrefix(location, useRE=False):
+        """Returns the portion of the location that is fixed text"""
+        if useRE:
+            specials = '.^$*+?{}[]\\|()'
+        else:
+            specials = '*?['
+        for i, c in enumerate(location):
+            if c in specials:
+                return location[:i]
+        return location
+
+    def _locationResource(self, spec):
+        location = spec.get('location')
+        if location is None or len(location.strip()) == 0:
+            return None
+        location = self._substitute(location.strip())
+        useRE = spec.get('useRE') is not None
+        return ('loc', StepDependencyGraph.literalPrefix(
+            location,
+            useRE ), location, useRE )
+
+    def _parseDeclaration(self, declaration):
+        match = FileManager.FILEDECL_RE.match(declaration.strip())
+        if match is None:
+            return {}
+        spec = match.groupdict()
+        return dict([ (k, v) for k, v in spec.iteritems()
+                      if v is not None and len(v.strip()) > 0 ])
+
+    def _addFileDeclarations(self, node, statement, yields):
+        declarations = self.fileManager._getFileDeclarationList(statement)
+        for declaration in declarations:
+            spec = self._parseDeclaration(declaration)
+            location = self._locationResource(spec)
+            if 'id' in spec:
+                node.writes.add(('id', spec['id']))
+            if location is not None:
+                if yields:
+                    node.writes.add(location)
+                else:
+                    node.reads.add(location)
+
+    def _addMaps(self, node, statement):
+        statement = ' '.join(statement.split('\n'))
+        for mapstatement in statement.split('&&'):
+            match = FileManager.MAP_RE.match(mapstatement.strip())
+            if match is None:
+                #Let the step itself report the problem, but
+                #  keep its place in the build
+                node.barrier = True
+                return
+            mapdict = match.groupdict()
+            sourceIds = []
+            for source in mapdict['source'].split(','):
+                spec = self._parseDeclaration(source)
+                location = self._locationResource(spec)
+                if 'id' in spec:
+                    sourceIds.append(spec['id'])
+                    node.reads.add(('id', spec['id']))
+                else:
+                    node.reads.add(('anyid',))
+                if location is not None:
+                    node.reads.add(location)
+            for result in mapdict['result'].split(','):
+                spec = self._parseDeclaration(result)
+                location = self._locationResource(spec)
+                if 'id' in spec:
+                    node.writes.add(('id', spec['id']))
+                else:
+                    #Results without an id are added to the source records
+                    for sourceId in sourceIds:
+                        node.writes.add(('id', sourceId))
+                if location is not None:
+                    node.writes.add(location)
+
+    def _parseStep(self, node):
+        info = self.lookup(node.stepname)
+        if info is None:
+            node.barrier = True
+            return node
+        node.sectionType, options = info
+        node.writes.add(('step', node.stepname.split('@')[-1]))
+        if node.sectionType in StepDependencyGraph.BARRIER_TYPES:
+            node.barrier = True
+            return node
+        declared = False
+        if '**files' in options:
+            declared = True
+            self._addFileDeclarations(node, options['**files'], False)
+        if '**yields-files' in options:
+            declared = True
+            self._addFileDeclarations(node, options['**yields-files'], True)
+        if '**maps' in options:
+            declared = True
+            self._addMaps(node, options['**maps'])
+        if 'env' in options:
+            refs = ','.join(options['env'].split('\n')).split(',')
+            for ref in refs:
+                ref = self._substitute(ref).strip()
+                if len(ref) > 0:
+                    node.reads.add(('step', ref.split('@')[-1]))
+        if not declared:
+            #Nothing is known about what the step touches
+            node.barrier = True
+        return node
+
+    @staticmethod
+    def _pathContains(directory, path):
+        return path.startswith(directory.rstrip('/') + '/')
+
+    @staticmethod
+    def _literalInPattern(literal, pattern):
+        _, prefix, location, useRE = pattern
+        if StepDependencyGraph._pathContains(literal, prefix):
+            #The literal is a directory the pattern's files are under
+            return True
+        if useRE:
+            matcher = re.compile('(?:%s)$' % location)
+        else:
+            matcher = re.compile(fnmatch.translate(location))
+        return matcher.match(literal) is not None
+
+    @staticmethod
+    def locationsOverlap(a, b):
+        aprefix, alocation = a[1:3]
+        bprefix, blocation = b[1:3]
+        if len(alocation) == 0 or len(blocation) == 0:
+            #The location could not be determined
+            return True
+        if not (aprefix.startswith(bprefix) or bprefix.startswith(aprefix)):
+            return False
+        aliteral = aprefix == alocation
+        bliteral = bprefix == blocation
+        if aliteral and bliteral:
+            return alocation == blocation \
+                or StepDependencyGraph._pathContains(alocation, blocation) \
+                or StepDependencyGraph._pathContains(blocation, alocation)
+        try:
+            if aliteral:
+                return StepDependencyGraph._literalInPattern(alocation, b)
+            if bliteral:
+                return StepDependencyGraph._literalInPattern(blocation, a)
+        except re.error:
+            pass
+        return True
+
+    @staticmethod
+    def resourcesOverlap(left, right):
+        for a in left:
+            for b in right:
+                if a[0] == 'anyid' and b[0] in ('id', 'anyid') \
+                   or b[0] == 'anyid' and a[0] in ('id', 'anyid'):
+                    return True
+                if a[0] != b[0]:
+                    continue
+                if a[0] == 'loc':
+                    if StepDependencyGraph.locationsOverlap(a, b):
+                        return True
+                elif a[1] == b[1]:
+                    return True
+        return False
+
+    @staticmethod
+    def dependsOn(later, earlier):
+        if later.group == earlier.group:
+            #Steps joined with '&' are declared independent
+            return False
+        return StepDependencyGraph.resourcesOverlap(earlier.writes, later.reads) \
+            or StepDependencyGraph.resourcesOverlap(earlier.writes, later.writes) \
+            or StepDependencyGraph.resourcesOverlap(earlier.reads, later.writes)
+
+    def createNodes(self, steps):
+        """steps - iterable of (stepname, group) in command order"""
+        return [ StepNode(stepname, index, group)
+                 for index, (stepname, group) in enumerate(steps) ]
+
+    def segments(self, nodes):
+        """Yields lists of consecutive nodes that are separated by barriers
+           A barrier is yielded as a segment of its own"""
+        current = []
+        for node in nodes:
+            if node.barrier:
+                if len(current) > 0:
+                    yield current
+                current = []
+                yield [node]
+            else:
+                current.append(node)
+        if len(current) > 0:
+            yield current
+
+    def analyze(self, nodes):
+        """Determines the reads/writes of the nodes and links the nodes
+           within the given list.  Should be called with the members
+           of a segment just before the segment executes so that
+           substitutions see the environment set by earlier barriers"""
+        for node in nodes:
+            node.reads = set()
+            node.writes = set()
+            node.deps = set()
+            node.dependents = set()
+            self._parseStep(node)
+        self.link(nodes)
+        return nodes
+
+    def link(self, nodes):
+        for i, later in enumerate(nodes):
+            for earlier in nodes[:i]:
+                if StepDependencyGraph.dependsOn(later, earlier):
+                    later.deps.add(earlier)
+                    earlier.dependents.add(later)
+        if self.log is not None:
+            for node in nodes:
+                self.log.devdebug(
+                    "Step '%s' depends on: %s",
+                    node.stepname,
+                    ', '.join([ x.stepname for x in sorted(
+                        node.deps,
+                        key=lambda x: x.index) ]) )
+
+class StepScheduler:
+    """Runs the steps of a command as soon as the steps they depend on
+       have completed, with no more than 'jobs' steps at once and,
+       if maxParallel is given, no more than maxParallel steps from
+       the same '&' group at once."""
+
+    def __init__(self, engine, groups, jobs, log, maxParallel=0):
+        self.engine = engine
+        self.groups = groups
+        self.jobs = max(1, jobs)
+        self.maxParallel = maxParallel
+        self.log = log
+        self.graph = StepDependencyGraph.forEngine(engine, log)
+
+    def _launch(self, stepname):
+        result = self.engine.launchStep(
+            stepname,
+            self.engine.getPhase())
+        return result is not None and result._didPass()
+
+    def _launchParallel(self, stepname):
+        result = self.engine.launchParallelStep(
+            stepname,
+            self.engine.getPhase())
+        return result is not None and result._didPass()
+
+    def _stepFailed(self, stepname):
+        self.log.error("XXXXXX Step '%s' FAILED XXXXXX" % stepname)
+        self.log.failed()
+
+    def _nextReady(self, ready, running):
+        """Returns the first ready node that may start or None if
+           the groups of all the ready nodes are at maxParallel"""
+        ready.sort(key=lambda x: x.index)
+        if self.maxParallel == 0:
+            return ready[0]
+        inGroup = {}
+        for node in running.values():
+            inGroup[node.group] = inGroup.get(node.group, 0) + 1
+        for node in ready:
+            if inGroup.get(node.group, 0) < self.maxParallel:
+                return node
+        return None
+
+    def _runSegment(self, nodes):
+        """Returns True if any step in the segment failed"""
+        self.graph.analyze(nodes)
+        remaining = dict([ (node, set(node.deps)) for node in nodes ])
+        ready = [ node for node in nodes if len(node.deps) == 0 ]
+        batch = self.engine.getParallelExecutor().batch()
+        running = {}
+        failure = False
+        stopping = False
+        while len(ready) > 0 or len(running) > 0:
+            while not stopping and len(ready) > 0 and len(running) < self.jobs:
+                node = self._nextReady(ready, running)
+                if node is None:
+                    break
+                ready.remove(node)
+                del remaining[node]
+                task = batch.submit(
+                    node.stepname,
+                    lambda stepname=node.stepname: self._launchParallel(stepname) )
+                running[task] = node
+            if len(running) == 0:
+                break
+            task = batch.wait()
+            node = running.pop(task)
+            if task.failed():
+                self.log.error(
+                    "Step '%s' raised: %s",
+                    node.stepname,
+                    str(task.excinfo[1]) )
+            if task.failed() or not task.result:
+                self._stepFailed(node.stepname)
+                failure = True
+                if not self.engine.settings['keep-going']:
+                    stopping = True
+            for dependent in node.dependents:
+                if dependent in remaining:
+                    remaining[dependent].discard(node)
+                    if len(remaining[dependent]) == 0:
+                        ready.append(dependent)
+        return failure
+
+    def run(self):
+        """Returns True if all steps passed"""
+        nodes = self.graph.createNodes(
+            StepDependencyGraph.flattenCommand(self.groups) )
+        failure = False
+        #Barriers are known up front, the dependencies within a segment
+        #  are worked out when the segment runs so that the environment
+        #  set up by the steps before it is used.
+        for node in nodes:
+            self.graph._parseStep(node)
+        for segment in list(self.graph.segments(nodes)):
+            if len(segment) == 1 and segment[0].barrier:
+                if not self._launch(segment[0].stepname):
+                    self._stepFailed(segment[0].stepname)
+                    failure = True
+            else:
+                failure = self._runSegment(segment) or failure
+            if failure and not self.engine.settings['keep-going']:
+                return False
+        return not failure
@@ -0,0 +1,189 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import re
+import threading
+import itertools
+
+class SubstitutionTemplate:
+    """A string with %(name)s references to the csmake environment,
+       parsed once.  Strings that only use %(name)s and %% are rendered
+       from a positional form of the string; anything else python's
+       '%' operator supports is rendered with the '%' operator."""
+
+    REFERENCE_RE = re.compile(
+        r'%(?:\((?P<name>[^)]*)\))?(?P<spec>[#0 +\-]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?)(?P<conversion>[diouxXeEfFgGcrs%])' )
+
+    def __init__(self, text):
+        self.text = text
+        self.references = []
+        self.positional = None
+        if '%' not in text:
+            self.positional = text
+            return
+        simple = True
+        parts = []
+        position = 0
+        for match in SubstitutionTemplate.REFERENCE_RE.finditer(text):
+            literal = text[position:match.start()]
+            if '%' in literal:
+                simple = False
+            parts.append(literal)
+            position = match.end()
+            name = match.group('name')
+            if name is not None:
+                self.references.append(name)
+            if match.group('conversion') == '%':
+                if name is not None or len(match.group('spec')) > 0:
+                    simple = False
+                parts.append('%%')
+            elif name is None or len(match.group('spec')) > 0 \
+                or match.group('conversion') != 's':
+                simple = False
+            else:
+                parts.append('%s')
+        if '%' in text[position:]:
+            simple = False
+        parts.append(text[position:])
+        if simple:
+            self.positional = ''.join(parts)
+
+    def render(self, env):
+        if self.positional is None:
+            return self.text % env
+        if len(self.references) == 0:
+            if self.positional is self.text:
+                return self.text
+            return self.positional % ()
+        return self.positional % tuple([ env[x] for x in self.references ])
+
+class SubstitutionDict(dict):
+    """The dictionary of the csmake environment.
+       generation changes every time the dictionary is changed so
+       that substitutions done against it can be cached.  Generations
+       are not reused by any SubstitutionDict."""
+
+    _generations = itertools.count(1)
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._changed()
+
+    def _changed(self):
+        self.generation = SubstitutionDict._generations.next()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, value=None):
+        self._changed()
+        return dict.setdefault(self, key, value)
+
+    def pop(self, *args):
+        self._changed()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._changed()
+        return dict.popitem(self)
+
+    def clear(self):
+        dict.clear(self)
+        self._changed()
+
+class Substitutions:
+    """Does substitutions of the csmake environment (a SubstitutionDict)
+       into strings, keeping the parsed templates and the results
+       until the environment changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.rendered = {}
+        self.renderedGeneration = None
+
+    def template(self, text):
+        template = self.templates.get(text)
+        if template is None:
+            template = SubstitutionTemplate(text)
+            self.templates[text] = template
+        return template
+
+    def substitute(self, text, env):
+        if '%' not in text:
+            return text
+        generation = getattr(env, 'generation', None)
+        if generation is None:
+            return self.template(text).render(env)
+        with self.lock:
+            if self.renderedGeneration != generation:
+                self.rendered = {}
+                self.renderedGeneration = generation
+            rendered = self.rendered
+        if text in rendered:
+            return rendered[text]
+        result = self.template(text).render(env)
+        if env.generation == generation:
+            rendered[text] = result
+        return result
+
+    def order(self, values):
+        """Returns the keys of 'values' ordered so that every key comes
+           after the keys it references.  A key referencing itself
+           refers to the value it had before.
+           Raises ValueError if the keys reference each other in a cycle"""
+        references = {}
+        for key, value in values.iteritems():
+            references[key] = sorted(set([
+                x for x in self.template(value).references
+                if x in values and x != key ]))
+        result = []
+        done = set()
+        visiting = []
+        for key in sorted(values.keys()):
+            if key in done:
+                continue
+            #Depth first without recursion: (key, references left)
+            stack = [(key, list(references[key]))]
+            visiting.append(key)
+            while len(stack) > 0:
+                current, remaining = stack[-1]
+                if len(remaining) == 0:
+                    stack.pop()
+                    visiting.pop()
+                    done.add(current)
+                    result.append(current)
+                    continue
+                reference = remaining.pop(0)
+                if reference in done:
+                    continue
+                if reference in visiting:
+                    cycle = visiting[visiting.index(reference):] + [reference]
+                    raise ValueError(
+                        "Environment references form a cycle: %s" % (
+                            ' -> '.join(cycle) ))
+                visiting.append(reference)
+                stack.append((reference, list(references[reference])))
+        return result
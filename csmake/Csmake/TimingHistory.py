@@ -0,0 +1,204 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import json
+import hashlib
+import time
+import tempfile
+import threading
+
+class TimingHistory:
+    """Remembers how long each step (section and phase) took in past
+       builds.  Listens to the engine (see CliDriver.addListener) and
+       appends the seconds each step that passed took to a file of
+       json lines when csmake exits:
+           {"section" : ..., "phase" : ..., "seconds" : ..., "ts" : ...}
+
+       The estimate for a step is the median of its last HISTORY runs.
+       When the file gets bigger than COMPACT_BYTES, it is rewritten
+       with only the last HISTORY runs of each step.
+
+       Section ids like command@default are common to many projects,
+       so each project keeps its own history (see projectPath)."""
+
+    HISTORY = 5
+    COMPACT_BYTES = 2 * 1024 * 1024
+
+    def __init__(self, path, log=None):
+        self.path = path
+        self.log = log
+        self.lock = threading.Lock()
+        self.pending = []
+        self.history = None
+
+    def _devdebug(self, output, *params):
+        if self.log is not None:
+            self.log.devdebug(output, *params)
+
+    @staticmethod
+    def projectPath(directory, makefiles):
+        """Returns the history file under directory for the project
+           built from the given makefiles"""
+        digest = hashlib.sha1()
+        for makefile in makefiles:
+            digest.update(os.path.abspath(makefile) + '\0')
+        return os.path.join(
+            directory,
+            'timings',
+            '%s.jsonl' % digest.hexdigest() )
+
+    @staticmethod
+    def _key(section, phase):
+        return '%s\t%s' % (phase, section)
+
+    def _load(self):
+        #NOTE: Must be called with the lock held
+        if self.history is not None:
+            return self.history
+        self.history = {}
+        try:
+            with open(self.path) as timings:
+                for line in timings:
+                    try:
+                        entry = json.loads(line)
+                        key = TimingHistory._key(
+                            entry['section'].encode('utf-8'),
+                            entry['phase'].encode('utf-8') )
+                        seconds = float(entry['seconds'])
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue
+                    self._remember(key, seconds)
+        except (IOError, OSError) as e:
+            self._devdebug("No timing history '%s': %s", self.path, str(e))
+        for entry in self.pending:
+            self._remember(
+                TimingHistory._key(entry['section'], entry['phase']),
+                entry['seconds'] )
+        return self.history
+
+    def _remember(self, key, seconds):
+        #NOTE: Must be called with the lock held
+        runs = self.history.setdefault(key, [])
+        runs.append(seconds)
+        if len(runs) > TimingHistory.HISTORY:
+            del runs[0]
+
+    def estimate(self, section, phase):
+        """Returns the expected seconds for the step or None if
+           the step has no history"""
+        with self.lock:
+            runs = self._load().get(TimingHistory._key(section, phase))
+        if runs is None or len(runs) == 0:
+            return None
+        runs = sorted(runs)
+        middle = len(runs) // 2
+        if len(runs) % 2 == 1:
+            return runs[middle]
+        return (runs[middle - 1] + runs[middle]) / 2.0
+
+    def longestFirst(self, steps, phase, lookupSection):
+        """Orders the steps by their estimates, longest first.
+           Steps without history go first, as they may be the longest.
+           lookupSection(step) gives the section of a step"""
+        def order(step):
+            section = lookupSection(step)
+            if section is None:
+                return None
+            estimate = self.estimate(section, phase)
+            if estimate is None:
+                return None
+            return -estimate
+        #sorted is stable, so steps with the same estimate stay in order
+        return sorted(steps, key=order)
+
+    def add(self, section, phase, seconds):
+        entry = {
+            'section' : section,
+            'phase' : phase,
+            'seconds' : round(seconds, 3),
+            'ts' : round(time.time(), 3) }
+        with self.lock:
+            self.pending.append(entry)
+            if self.history is not None:
+                self._remember(
+                    TimingHistory._key(section, phase),
+                    entry['seconds'] )
+
+    def save(self):
+        """Appends the steps run since the last save to the history"""
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+        if len(pending) == 0:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            data = ''.join([ json.dumps(x) + '\n' for x in pending ])
+            fd = os.open(
+                self.path,
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0644 )
+            try:
+                while len(data) > 0:
+                    data = data[os.write(fd, data):]
+            finally:
+                os.close(fd)
+            compact = os.stat(self.path).st_size > TimingHistory.COMPACT_BYTES
+        except (IOError, OSError, TypeError, ValueError) as e:
+            self._devdebug("Timing history not saved: %s", str(e))
+            return
+        if compact:
+            with self.lock:
+                self.history = None
+                self._load()
+                self._compact()
+
+    def _compact(self):
+        #NOTE: Must be called with the lock held
+        tempname = None
+        try:
+            fd, tempname = tempfile.mkstemp(
+                prefix='.%s.' % os.path.basename(self.path),
+                dir=os.path.dirname(self.path) )
+            with os.fdopen(fd, 'w') as timings:
+                for key, runs in self.history.iteritems():
+                    phase, section = key.split('\t', 1)
+                    for seconds in runs:
+                        timings.write(json.dumps({
+                            'section' : section,
+                            'phase' : phase,
+                            'seconds' : seconds }) + '\n')
+            os.rename(tempname, self.path)
+        except (IOError, OSError) as e:
+            self._devdebug("Timing history not compacted: %s", str(e))
+            if tempname is not None and os.path.exists(tempname):
+                os.remove(tempname)
+
+    #Engine listener interface
+    def stepStarted(self, step, phase):
+        return time.time()
+
+    def stepEnded(self, started, step, section, phase, result):
+        if result is None or section is None or not result.didPass():
+            return
+        self.add(section, phase, time.time() - started)
+
+    def close(self):
+        self.save()
@@ -0,0 +1,77 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import os
+import os.path
+import json
+import tempfile
+
+class UserCache:
+    """A JSON document kept in the user's cache directory
+       ($XDG_CACHE_HOME/csmake or ~/.cache/csmake).
+       The cache is only an optimization: failing to read or write it
+       is never an error."""
+
+    @staticmethod
+    def cacheDirectory():
+        base = os.environ.get('XDG_CACHE_HOME')
+        if base is None or len(base) == 0:
+            base = os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(base, 'csmake')
+
+    def __init__(self, name, log=None, directory=None):
+        if directory is None:
+            directory = UserCache.cacheDirectory()
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self.log = log
+
+    def load(self):
+        """Returns the cached document or None"""
+        try:
+            with open(self.path) as cachefile:
+                return json.load(cachefile)
+        except (IOError, OSError, ValueError) as e:
+            if self.log is not None:
+                self.log.devdebug(
+                    "Cache '%s' not used: %s", self.path, str(e) )
+            return None
+
+    def save(self, document):
+        """Replaces the cached document, returns True if it was written"""
+        tempname = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, tempname = tempfile.mkstemp(
+                prefix='.%s.' % os.path.basename(self.path),
+                dir=self.directory )
+            with os.fdopen(fd, 'w') as cachefile:
+                json.dump(document, cachefile)
+            os.rename(tempname, self.path)
+            return True
+        except (IOError, OSError, TypeError, ValueError) as e:
+            if self.log is not None:
+                self.log.devdebug(
+                    "Cache '%s' could not be written: %s",
+                    self.path,
+                    str(e) )
+            if tempname is not None and os.path.exists(tempname):
+                try:
+                    os.remove(tempname)
+                except OSError:
+                    pass
+            return False
@@ -0,0 +1,187 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+import ConfigParser
+from BuildspecCache import BuildspecCache
+from OutBuildspec import OutBuildspec
+from UserCache import UserCache
+
+class testBuildspecCache_basic(unittest.TestCase):
+
+    SPEC = """
+[command@default]
+description=The default
+00=a, b
+# a comment
+[Shell@a]
+command=
+    echo one
+    echo two
+value = %(RESULTS)s/x ; comment
+"""
+
+    MORE = """
+[Shell@a]
+extra=1
+[Shell@c]
+command=true
+"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.spec = self._write('csmakefile', testBuildspecCache_basic.SPEC)
+        self.more = self._write('more.csmake', testBuildspecCache_basic.MORE)
+        self.cache = UserCache(
+            'buildspecs.json',
+            directory=os.path.join(self.root, 'cache') )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, name, contents, age=100):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as spec:
+            spec.write(contents)
+        mtime = int(os.stat(path).st_mtime) - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _read(self, paths):
+        parser = ConfigParser.RawConfigParser()
+        parser.optionxform = str
+        parser.read(paths)
+        return parser
+
+    def _parser(self):
+        parser = ConfigParser.RawConfigParser()
+        parser.optionxform = str
+        return parser
+
+    def test_mergeMatchesConfigParser(self):
+        cut = BuildspecCache()
+        parser = self._parser()
+        BuildspecCache.merge(parser, cut.parse(self.spec))
+        self.assertEqual(
+            BuildspecCache.merge(parser, cut.parse(self.more)),
+            ['Shell@a', 'Shell@c'] )
+        expected = self._read([self.spec, self.more])
+        self.assertEqual(parser._sections, expected._sections)
+        self.assertEqual(parser.sections(), expected.sections())
+        self.assertEqual(parser.get('Shell@a', 'command'), '\necho one\necho two')
+
+    def test_savedSpecsAreUsed(self):
+        cut = BuildspecCache(self.cache)
+        cut.parse(self.spec)
+        cut.save()
+        cut = BuildspecCache(self.cache)
+        self.assertTrue(os.path.abspath(self.spec) in cut.specs)
+        cut.specs[os.path.abspath(self.spec)][2]['sections'][0][1] = [['from', 'cache']]
+        parsed = cut.parse(self.spec)
+        self.assertEqual(parsed['sections'][0][1], [['from', 'cache']])
+        self.assertTrue(isinstance(parsed['sections'][0][0], str))
+
+    def test_changedSpecIsParsedAgain(self):
+        cut = BuildspecCache(self.cache)
+        cut.parse(self.spec)
+        self._write('csmakefile', "[Shell@new]\nx=1\n", 50)
+        parsed = cut.parse(self.spec)
+        self.assertEqual(parsed['sections'], [['Shell@new', [['x', '1']]]])
+
+    def test_recentSpecIsNotCached(self):
+        cut = BuildspecCache(self.cache)
+        recent = self._write('recent.csmake', "[Shell@r]\nx=1\n", 0)
+        cut.parse(recent)
+        self.assertTrue(os.path.abspath(recent) not in cut.specs)
+
+    def test_saveDropsGoneChangedAndOldSpecs(self):
+        cut = BuildspecCache(self.cache)
+        cut.parse(self.spec)
+        cut.parse(self.more)
+        gone = self._write('gone.csmake', "[Shell@g]\nx=1\n")
+        cut.parse(gone)
+        old = self._write('old.csmake', "[Shell@o]\nx=1\n")
+        cut.parse(old)
+        cut.specs[os.path.abspath(old)][3] -= BuildspecCache.MAX_AGE_SECONDS + 1
+        os.remove(gone)
+        self._write('more.csmake', "[Shell@changed]\nx=1\n", 50)
+        cut.save()
+        self.assertEqual(
+            BuildspecCache(self.cache).specs.keys(),
+            [os.path.abspath(self.spec)] )
+
+    def test_saveKeepsMostRecentlyUsed(self):
+        maxSpecs = BuildspecCache.MAX_SPECS
+        BuildspecCache.MAX_SPECS = 2
+        try:
+            cut = BuildspecCache(self.cache)
+            for used, path in enumerate([self.spec, self.more]):
+                cut.parse(path)
+                cut.specs[os.path.abspath(path)][3] -= 100 - used
+            cut.parse(self._write('new.csmake', "[Shell@n]\nx=1\n"))
+            cut.save()
+        finally:
+            BuildspecCache.MAX_SPECS = maxSpecs
+        self.assertEqual(
+            sorted(BuildspecCache(self.cache).specs.keys()),
+            [ os.path.join(self.root, x) for x in ['more.csmake', 'new.csmake'] ] )
+
+    def test_usingTheCacheDoesntRewriteIt(self):
+        cut = BuildspecCache(self.cache)
+        cut.parse(self.spec)
+        cut.save()
+        cut = BuildspecCache(self.cache)
+        cut.parse(self.spec)
+        self.assertFalse(cut.dirty)
+        cut.specs[os.path.abspath(self.spec)][3] -= BuildspecCache.USED_SECONDS + 1
+        cut.parse(self.spec)
+        self.assertTrue(cut.dirty)
+
+    def test_badSpecRaises(self):
+        bad = self._write('bad.csmake', "no section\n")
+        self.assertRaises(
+            ConfigParser.MissingSectionHeaderError,
+            BuildspecCache().parse,
+            bad )
+
+    def test_outBuildspecSharesUntilWritten(self):
+        cut = BuildspecCache()
+        base = self._parser()
+        out = OutBuildspec(base)
+        parsed = cut.parse(self.spec)
+        BuildspecCache.merge(base, parsed)
+        out.include(parsed)
+        self.assertTrue(out._sections['Shell@a'] is base._sections['Shell@a'])
+        section = out.writableSection('Shell@a')
+        section['value'] = '/results/x'
+        self.assertTrue(out.writableSection('Shell@a') is section)
+        self.assertEqual(base.get('Shell@a', 'value'), '%(RESULTS)s/x')
+        self.assertEqual(out.get('Shell@a', 'value'), '/results/x')
+        parsed = cut.parse(self.more)
+        BuildspecCache.merge(base, parsed)
+        out.include(parsed)
+        self.assertEqual(out.get('Shell@a', 'extra'), '1')
+        self.assertEqual(base.get('Shell@a', 'extra'), '1')
+        self.assertEqual(out.get('Shell@c', 'command'), 'true')
+        out.add_section('command@~~multicommand~~')
+        out.set('command@~~multicommand~~', '0', 'a')
+        out.set('command@default', '00', 'b')
+        self.assertFalse(base.has_section('command@~~multicommand~~'))
+        self.assertEqual(base.get('command@default', '00'), 'a, b')
@@ -0,0 +1,196 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+from Checkpoint import Checkpoint
+from FileManager import FileMapping
+from Substitutions import SubstitutionDict
+
+class FakeEnv:
+    def __init__(self, env):
+        self.env = SubstitutionDict(env)
+        self.transPhase = {}
+
+    def addTransPhase(self, key, value):
+        self.transPhase[key] = value
+        self.env[key] = value
+
+    def doSubstitutions(self, target):
+        return target % self.env
+
+class FakeLog:
+    def __init__(self):
+        self.values = {}
+        self.status = 'Unexecuted'
+
+    def getReturnValue(self, key):
+        return self.values.get(key)
+
+    def setReturnValue(self, value, key):
+        self.values[key] = value
+
+    def passed(self):
+        self.status = 'Passed'
+
+class FakeInstance:
+    def __init__(self, env):
+        self.env = env
+        self.log = FakeLog()
+        self.newfiles = None
+        self.yieldsfiles = None
+        self.yieldedfiles = None
+        self.calledId = 'Fake@step'
+        self.mapping = FileMapping()
+
+class FakeFileInstance:
+    def __init__(self, location):
+        self.index = {'location' : location}
+
+class FakeEngine:
+    def lookupSection(self, step):
+        return None
+
+class testCheckpoint_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, Checkpoint.FILENAME)
+        self.source = os.path.join(self.root, 'source.txt')
+        self.output = os.path.join(self.root, 'output.txt')
+        self._write(self.source, 'source', 100)
+        self.stepdict = {
+            '**maps' : '<src> -(1-1)-> %(RESULTS)s/output.txt',
+            'command' : 'make it' }
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, path, content, age=0):
+        with open(path, 'w') as fileobj:
+            fileobj.write(content)
+        if age:
+            mtime = int(os.stat(path).st_mtime) - age
+            os.utime(path, (mtime, mtime))
+
+    def _instance(self):
+        instance = FakeInstance(FakeEnv({'RESULTS' : self.root}))
+        instance.mapping.addMapping(
+            [FakeFileInstance(self.source)],
+            [{'location' : self.output}] )
+        return instance
+
+    def _fingerprint(self, cut, instance, section='Fake@step', aspects=[]):
+        return cut.fingerprint(
+            FakeEngine(), section, instance, self.stepdict, 'build', aspects )
+
+    def _pass(self, cut, instance, change=None):
+        fingerprint = self._fingerprint(cut, instance)
+        begun = cut.begin(instance)
+        self._write(self.output, 'made')
+        if change is not None:
+            change(instance.env)
+        instance.log.setReturnValue({'made' : 1}, 'build')
+        cut.record(fingerprint, instance, 'build', begun)
+        return fingerprint
+
+    def test_yieldedFilesAreNotSearchedAgain(self):
+        cut = Checkpoint(self.path, False)
+        instance = self._instance()
+        instance.mapping = None
+        #The spec would match nothing on disk, the yielded files are used
+        instance.yieldsfiles = [{'location' : 'missing/*.txt'}]
+        instance.yieldedfiles = [FakeFileInstance(self.output)]
+        self._pass(cut, instance)
+        cut.finish(False)
+        entry = Checkpoint.load(self.path).values()[0]
+        self.assertEqual(
+            [ x[0] for x in entry['outputs'] ],
+            [self.output] )
+
+    def test_resumeSkipsStepThatPassed(self):
+        cut = Checkpoint(self.path, False)
+        fingerprint = self._pass(cut, self._instance())
+        cut.finish(False)
+        self.assertTrue(os.path.exists(self.path))
+
+        resumed = Checkpoint(self.path, True)
+        instance = self._instance()
+        self.assertEqual(self._fingerprint(resumed, instance), fingerprint)
+        self.assertTrue(resumed.restore(fingerprint, instance, 'build'))
+        self.assertEqual(instance.log.status, 'Passed')
+        self.assertEqual(instance.log.getReturnValue('build'), {'made' : 1})
+        resumed.finish(True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_withoutResumeNothingIsSkipped(self):
+        cut = Checkpoint(self.path, False)
+        fingerprint = self._pass(cut, self._instance())
+        cut.finish(False)
+        again = Checkpoint(self.path, False)
+        self.assertFalse(again.restore(fingerprint, self._instance(), 'build'))
+        again.finish(False)
+        self.assertEqual(Checkpoint.load(self.path), {})
+
+    def test_changedInputOrOutputIsNotSkipped(self):
+        cut = Checkpoint(self.path, False)
+        fingerprint = self._pass(cut, self._instance())
+        cut.finish(False)
+        self._write(self.output, 'changed!')
+        resumed = Checkpoint(self.path, True)
+        self.assertFalse(resumed.restore(fingerprint, self._instance(), 'build'))
+        self._write(self.source, 'new source')
+        self.assertNotEqual(
+            self._fingerprint(resumed, self._instance()),
+            fingerprint )
+
+    def test_environmentChangesAreRestored(self):
+        def change(env):
+            env.addTransPhase('VERSION', '1.2')
+            env.env['LOCAL'] = 'x'
+        cut = Checkpoint(self.path, False)
+        fingerprint = self._pass(cut, self._instance(), change)
+        cut.finish(False)
+        resumed = Checkpoint(self.path, True)
+        instance = self._instance()
+        self.assertTrue(resumed.restore(fingerprint, instance, 'build'))
+        self.assertEqual(instance.env.transPhase, {'VERSION' : '1.2'})
+        self.assertEqual(instance.env.env['LOCAL'], 'x')
+        self.assertTrue(isinstance(instance.env.env['LOCAL'], str))
+
+    def test_containersAndAspectsAreNeverSkipped(self):
+        cut = Checkpoint(self.path, False)
+        instance = self._instance()
+        self.assertEqual(
+            self._fingerprint(cut, instance, 'command@default'),
+            None )
+        self.assertEqual(
+            self._fingerprint(cut, instance, 'ShellEnv@env'),
+            None )
+        self.assertEqual(
+            self._fingerprint(cut, instance, aspects=[('aspect', {})]),
+            None )
+
+    def test_truncatedCheckpointLoads(self):
+        cut = Checkpoint(self.path, False)
+        fingerprint = self._pass(cut, self._instance())
+        cut.finish(False)
+        with open(self.path, 'a') as checkpoint:
+            checkpoint.write('{"version" : 1, "finger')
+        self.assertEqual(Checkpoint.load(self.path).keys(), [fingerprint])
@@ -0,0 +1,170 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import threading
+import tempfile
+import shutil
+import os.path
+import json
+from CriticalPath import CriticalPath
+from CriticalPath import StepTiming
+from StepScheduler import StepDependencyGraph
+
+class ChildThread(threading.Thread):
+    def __init__(self, work):
+        threading.Thread.__init__(self)
+        self.work = work
+        self._parent = threading.currentThread()
+
+    def parent(self):
+        return self._parent
+
+    def run(self):
+        self.work()
+
+class testCriticalPath_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.cut = CriticalPath()
+
+    def _timing(self, step, seconds, parent=None):
+        timing = StepTiming(step, 'build', None, parent)
+        timing.start = 0.0
+        timing.end = seconds
+        timing.section = "Shell@%s" % step
+        if parent is not None:
+            #Children are matched to members in the order they started
+            timing.start = parent.start + len(parent.children) * 0.001
+            timing.end = timing.start + seconds
+            parent.children.append(timing)
+        return timing
+
+    def _command(self, step, groups, seconds, parent=None):
+        timing = self._timing(step, seconds, parent)
+        timing.section = "command@%s" % step
+        timing.groups = groups
+        return timing
+
+    def _nodes(self, timing, barriers=[], deps={}):
+        nodes = StepDependencyGraph(lambda x: None).createNodes(
+            StepDependencyGraph.flattenCommand(timing.groups) )
+        byname = dict([ (x.stepname, x) for x in nodes ])
+        for node in nodes:
+            node.barrier = node.stepname in barriers
+            node.deps = set([ byname[x] for x in deps.get(node.stepname, []) ])
+        timing.nodes = nodes
+
+    def test_criticalPathFollowsLongestMembers(self):
+        root = self._command('top', [['a', 'inner'], ['d']], 10)
+        self._timing('a', 2, root)
+        inner = self._command('inner', [['b'], ['c']], 5, root)
+        self._timing('b', 1, inner)
+        self._timing('c', 3, inner)
+        self._timing('d', 4, root)
+        self.assertEqual(
+            [ x.step for x in CriticalPath.criticalPath(root) ],
+            ['b', 'c', 'd'] )
+        self.assertAlmostEqual(CriticalPath.barrierTime(root), 8)
+
+    def test_repeatedStepsMatchInOrder(self):
+        root = self._command('top', [['a'], ['b'], ['a']], 10)
+        self._timing('a', 1, root)
+        self._timing('b', 1, root)
+        self._timing('a', 5, root)
+        members = root.members()
+        self.assertAlmostEqual(members[0][0].duration(), 1)
+        self.assertAlmostEqual(members[2][0].duration(), 5)
+
+    def test_missingStepsDidNotRun(self):
+        root = self._command('top', [['a'], ['b']], 10)
+        self._timing('a', 1, root)
+        self.assertEqual(root.members()[1], [None])
+        self.assertAlmostEqual(CriticalPath.barrierTime(root), 1)
+        self.assertAlmostEqual(CriticalPath.dependencyTime(root), 1)
+
+    def test_dependencyTime(self):
+        root = self._command('top', [['a'], ['b'], ['c'], ['d']], 10)
+        self._timing('a', 2, root)
+        self._timing('b', 3, root)
+        self._timing('c', 1, root)
+        self._timing('d', 4, root)
+        self._nodes(root, deps={'c' : ['a']})
+        #a->c and b and d are independent
+        self.assertAlmostEqual(CriticalPath.dependencyTime(root), 4)
+        self.assertAlmostEqual(CriticalPath.barrierTime(root), 10)
+
+    def test_barriersWaitForEverything(self):
+        root = self._command('top', [['a'], ['env', 'b'], ['c']], 10)
+        self._timing('a', 2, root)
+        self._timing('env', 1, root)
+        self._timing('b', 3, root)
+        self._timing('c', 1, root)
+        self._nodes(root, barriers=['env'])
+        #env waits for a and c waits for env, b is free to start at 0
+        self.assertAlmostEqual(CriticalPath.dependencyTime(root), 4)
+
+    def test_unbalancedGroups(self):
+        root = self._command('top', [['a', 'b', 'c'], ['d', 'e']], 10)
+        self._timing('a', 6, root)
+        self._timing('b', 1, root)
+        self._timing('c', 1, root)
+        self._timing('d', 2, root)
+        self._timing('e', 2.5, root)
+        unbalanced = CriticalPath.unbalancedGroups(root)
+        self.assertEqual(len(unbalanced), 1)
+        command, groupnum, ran = unbalanced[0]
+        self.assertEqual(groupnum, 0)
+        self.assertEqual([ x.step for x in ran ], ['a', 'b', 'c'])
+
+    def test_listenerBuildsTreeAcrossThreads(self):
+        root = self.cut.stepStarted('command@top', 'build')
+        self.cut.commandGroups('top', 'build', [['a ', ' b'], ['c']])
+        def work(step):
+            token = self.cut.stepStarted(step, 'build')
+            self.cut.stepEnded(token, step, 'Shell@%s' % step, 'build', None)
+        threads = [ ChildThread(lambda x=x: work(x)) for x in ['a', 'b'] ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        work('c')
+        self.cut.stepEnded(root, 'top', 'command@top', 'build', None)
+        self.assertEqual(root.groups, [['a', 'b'], ['c']])
+        self.assertEqual(
+            sorted([ x.step for x in root.children ]),
+            ['a', 'b', 'c'] )
+        analysis = self.cut.analyze()
+        self.assertEqual(len(analysis), 1)
+        self.assertEqual(analysis[0]['phase'], 'build')
+        self.assertEqual(len(analysis[0]['criticalPath']), 2)
+        self.assertEqual(analysis[0]['criticalPath'][1]['step'], 'c')
+        self.assertTrue(len(self.cut.report(analysis)) > 0)
+
+    def test_write(self):
+        root = tempfile.mkdtemp()
+        try:
+            token = self.cut.stepStarted('only', 'build')
+            self.cut.stepEnded(token, 'only', 'Shell@only', 'build', None)
+            path = os.path.join(root, 'critical.json')
+            self.cut.write(path)
+            with open(path) as report:
+                result = json.load(report)
+            self.assertEqual(
+                result['phases'][0]['criticalPath'][0]['section'],
+                'Shell@only' )
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,155 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import StringIO
+from Environment import Environment
+from Result import Result
+from CsmakeAspect import CsmakeAspect
+from CliDriver import CliDriver
+
+class FakeEngine:
+    def __init__(self):
+        self.settings = {'dev-output':False, 'debug':False,'verbose':False,'quiet':False, 'no-chatter':False}
+        self.log = None
+
+class AdvisingAspect(CsmakeAspect):
+    def start(self, phase, options, step, stepoptions):
+        return 'start'
+
+    def passed__build(self, phase, options, step, stepoptions):
+        return 'passed__build'
+
+    def end(self, phase, options, step, stepoptions):
+        return 'end'
+
+    def end__build(self, phase, options, step, stepoptions):
+        return 'end__build'
+
+class DynamicAspect(CsmakeAspect):
+    def __getattr__(self, name):
+        if name.startswith('_') or name.startswith('failed'):
+            raise AttributeError(name)
+        return lambda phase, options, step, stepoptions: name
+
+class RenamingAspect(AdvisingAspect):
+    def _getDispatchString(self, joinpoint, phase):
+        return 'end__%s' % phase
+
+class FakeLog:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append(name)
+        return record
+
+class FakeAspect:
+    def __init__(self, advised):
+        self.advised = advised
+        self.calls = []
+        self.log = FakeLog(self.calls)
+
+    def _joinPointLookup(self, joinpoint, phase, options):
+        if joinpoint not in self.advised:
+            return None
+        return lambda phase, options, step, stepoptions: joinpoint
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        def record(*args):
+            self.calls.append(name)
+        return record
+
+class FakeStep:
+    def __init__(self):
+        self.calls = []
+        self.log = FakeLog(self.calls)
+
+class FakeDriver:
+    def __init__(self):
+        self.events = []
+        self.log = FakeLog([])
+
+    def _fireListeners(self, event, tokens, *args):
+        self.events.append(event)
+        return 'token'
+
+class testCsmakeAspect_basic(unittest.TestCase):
+
+    def _createaCUT(self, cls):
+        env = Environment(FakeEngine())
+        return cls(env, Result(env, {'Out' : StringIO.StringIO()}))
+
+    def _call(self, cut, joinpoint, phase='build'):
+        method = cut._joinPointLookup(joinpoint, phase, {})
+        if method is None:
+            return None
+        return method(phase, {}, None, {})
+
+    def test_joinPointTable(self):
+        table = AdvisingAspect._joinPointTable('build')
+        self.assertEqual(table['start'], (None, 'start'))
+        self.assertEqual(table['passed'], ('passed__build', None))
+        self.assertEqual(table['end'], ('end__build', 'end'))
+        self.assertFalse('failed' in table)
+        self.assertTrue(AdvisingAspect._joinPointTable('build') is table)
+        self.assertFalse('passed' in AdvisingAspect._joinPointTable('clean'))
+
+    def test_lookupWithTable(self):
+        cut = self._createaCUT(AdvisingAspect)
+        self.assertEqual(self._call(cut, 'start'), 'start')
+        self.assertEqual(self._call(cut, 'passed'), 'passed__build')
+        self.assertEqual(self._call(cut, 'passed', 'clean'), None)
+        self.assertEqual(self._call(cut, 'end'), ('end__build', 'end'))
+        self.assertEqual(self._call(cut, 'failed'), None)
+        self.assertEqual(self._call(cut, 'begin_map'), None)
+
+    def test_dynamicLookup(self):
+        self.assertEqual(DynamicAspect._joinPointTable('build'), None)
+        self.assertEqual(RenamingAspect._joinPointTable('build'), None)
+        cut = self._createaCUT(DynamicAspect)
+        self.assertEqual(
+            self._call(cut, 'begin_map'),
+            ('begin_map__build', 'begin_map') )
+        self.assertEqual(self._call(cut, 'failed'), None)
+        cut = self._createaCUT(RenamingAspect)
+        self.assertEqual(self._call(cut, 'start'), ('end__build', 'start'))
+
+    def test_dispatchSkipsAspectsWithoutAdvice(self):
+        driver = FakeDriver()
+        step = FakeStep()
+        quiet = FakeAspect([])
+        advising = FakeAspect(['start'])
+        aspects = [(quiet, {}), (advising, {})]
+        dispatch = CliDriver._dispatchAspects.im_func
+        self.assertFalse(
+            dispatch(driver, aspects, 'end', 'build', step, {}, {}) )
+        self.assertEqual(driver.events, [])
+        self.assertFalse('chatStartJoinPoint' in step.calls)
+        self.assertEqual(quiet.calls, ['skipped', '_dontValidateFiles'])
+
+        self.assertTrue(
+            dispatch(driver, aspects, 'start', 'build', step, {}, {}) )
+        self.assertEqual(
+            driver.events,
+            ['joinpointStarted', 'joinpointEnded'] )
+        self.assertTrue('chatStartJoinPoint' in step.calls)
+        self.assertTrue('chatEndJoinPoint' in step.calls)
+        self.assertTrue('executing' in advising.calls)
+        self.assertFalse('executing' in quiet.calls)
@@ -0,0 +1,150 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+import socket
+import threading
+import StringIO
+import sys
+from CsmakeServer import CsmakeFrames
+from CsmakeServer import CsmakeClient
+
+class testCsmakeServer_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'csmake.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_framesRoundTrip(self):
+        left, right = socket.socketpair()
+        try:
+            CsmakeFrames.send(left, 'o', 'some output\n')
+            CsmakeFrames.send(left, 'k')
+            CsmakeFrames.send(left, 'e', 'x' * 100000)
+            left.close()
+            self.assertEqual(
+                CsmakeFrames.receive(right),
+                ('o', 'some output\n') )
+            self.assertEqual(CsmakeFrames.receive(right), ('k', ''))
+            self.assertEqual(
+                CsmakeFrames.receive(right),
+                ('e', 'x' * 100000) )
+            self.assertEqual(CsmakeFrames.receive(right), (None, None))
+        finally:
+            right.close()
+
+    def test_requestKeepsEveryByte(self):
+        argv = ['csmake', '--phase=build', 'caf\xc3\xa9', '\xff\xfe']
+        env = {'PATH' : '/bin', 'ODD' : '\x80\x81'}
+        result = CsmakeFrames.decodeRequest(
+            CsmakeFrames.encodeRequest(argv, '/tmp/\xe9', env) )
+        self.assertEqual(result, (argv, '/tmp/\xe9', env))
+        for value in result[0]:
+            self.assertTrue(isinstance(value, str))
+
+    def test_requestedServer(self):
+        self.assertEqual(
+            CsmakeClient.requestedServer(['build'], {}),
+            (None, False) )
+        self.assertEqual(
+            CsmakeClient.requestedServer(['build'], {'CSMAKE_SERVER' : '/s'}),
+            ('/s', False) )
+        self.assertEqual(
+            CsmakeClient.requestedServer(['build'], {'CSMAKE_SERVER' : ''}),
+            (None, False) )
+        self.assertEqual(
+            CsmakeClient.requestedServer(['--server=/a', 'build'], {}),
+            ('/a', True) )
+        self.assertEqual(
+            CsmakeClient.requestedServer(
+                ['--server', '/b', 'build'],
+                {'CSMAKE_SERVER' : '/s'} ),
+            ('/b', True) )
+        #The server itself never forwards its command
+        self.assertEqual(
+            CsmakeClient.requestedServer(
+                ['--serve=/c'],
+                {'CSMAKE_SERVER' : '/c'} ),
+            (None, False) )
+
+    def test_forwardRunsHereWithoutServer(self):
+        self.assertEqual(
+            CsmakeClient.forward(
+                ['csmake', 'build'],
+                {'CSMAKE_SERVER' : self.path} ),
+            None )
+
+    def _serveOnce(self, listener, frames, requests):
+        connection, address = listener.accept()
+        try:
+            requests.append(CsmakeFrames.receive(connection))
+            for kind, payload in frames:
+                CsmakeFrames.send(connection, kind, payload)
+        finally:
+            connection.close()
+
+    def _run(self, frames):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(1)
+        requests = []
+        server = threading.Thread(
+            target=self._serveOnce,
+            args=(listener, frames, requests) )
+        server.start()
+        oldout, olderr = sys.stdout, sys.stderr
+        sys.stdout = StringIO.StringIO()
+        sys.stderr = StringIO.StringIO()
+        try:
+            returncode = CsmakeClient(self.path).run(
+                ['csmake', 'build'],
+                '/work',
+                {'HOME' : '/home'} )
+            out = sys.stdout.getvalue()
+            err = sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = oldout, olderr
+            server.join()
+            listener.close()
+        return (returncode, out, err, requests)
+
+    def test_clientStreamsOutput(self):
+        returncode, out, err, requests = self._run([
+            ('o', 'one\n'),
+            ('e', 'oops\n'),
+            ('o', 'two\n'),
+            ('x', '5') ])
+        self.assertEqual(returncode, 5)
+        self.assertEqual(out, 'one\ntwo\n')
+        self.assertEqual(err, 'oops\n')
+        kind, payload = requests[0]
+        self.assertEqual(kind, 'r')
+        self.assertEqual(
+            CsmakeFrames.decodeRequest(payload),
+            (['csmake', 'build'], '/work', {'HOME' : '/home'}) )
+
+    def test_clientFailsWhenServerGoesAway(self):
+        returncode, out, err, requests = self._run([('o', 'partial')])
+        self.assertEqual(returncode, 1)
+        self.assertEqual(out, 'partial')
+        self.assertTrue('unexpectedly' in err)
@@ -0,0 +1,86 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import glob
+import time
+import os
+import os.path
+from DirectorySnapshot import DirectorySnapshot
+
+class testDirectorySnapshot_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in ['a.c', 'b.c', 'c.h', '.hidden.c', 'sub/d.c', 'sub/deep/e.c']:
+            self._touch(path)
+        self.cut = DirectorySnapshot()
+        self.reads = []
+        self.original = DirectorySnapshot.readDirectory
+        def readDirectory(path):
+            self.reads.append(path)
+            return self.original(path)
+        DirectorySnapshot.readDirectory = staticmethod(readDirectory)
+
+    def tearDown(self):
+        DirectorySnapshot.readDirectory = staticmethod(self.original)
+        shutil.rmtree(self.root)
+
+    def _touch(self, path):
+        path = os.path.join(self.root, path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+
+    def _age(self, path='', seconds=100):
+        then = time.time() - seconds
+        os.utime(os.path.join(self.root, path), (then, then))
+
+    def test_globMatchesGlob(self):
+        for pattern in ['*.c', '.*', '*/*.c', 's*/d*/*', 'sub/', '*/', 'b.c', 'x/*']:
+            pattern = os.path.join(self.root, pattern)
+            self.assertEqual(
+                sorted(self.cut.glob(pattern)),
+                sorted(glob.glob(pattern)) )
+
+    def test_listingIsKeptWhileUnchanged(self):
+        self._age()
+        pattern = os.path.join(self.root, '*.c')
+        self.assertEqual(len(self.cut.glob(pattern)), 2)
+        self.assertEqual(len(self.cut.glob(pattern)), 2)
+        self.assertEqual(len(self.cut.listDirectory(self.root)), 5)
+        self.assertEqual(self.reads, [self.root])
+        self._touch('f.c')
+        self._age(seconds=50)
+        self.assertEqual(len(self.cut.glob(pattern)), 3)
+        self.assertEqual(self.reads, [self.root, self.root])
+
+    def test_recentlyChangedIsNotKept(self):
+        self.cut.listDirectory(self.root)
+        self.cut.listDirectory(self.root)
+        self.assertEqual(self.reads, [self.root, self.root])
+
+    def test_invalidate(self):
+        for path in ['', 'sub', 'sub/deep']:
+            self._age(path)
+            self.cut.listDirectory(os.path.join(self.root, path))
+        self.cut.invalidate(os.path.join(self.root, 'sub'))
+        self.assertEqual(self.cut.listings.keys(), [])
+        self.cut.listDirectory(self.root)
+        self.cut.invalidate(os.path.join(self.root, 'other'))
+        self.assertEqual(self.cut.listings.keys(), [])
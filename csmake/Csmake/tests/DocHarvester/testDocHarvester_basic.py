@@ -0,0 +1,123 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+import sys
+from DocHarvester import DocHarvester
+from UserCache import UserCache
+
+MODULE_SOURCE = '''
+import some_module_that_is_not_installed
+
+class Documented(object):
+    """Purpose: Be documented
+       Options: none
+    """
+    pass
+
+class Undocumented(object):
+    pass
+'''
+
+class testDocHarvester_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.modulePath = os.path.join(self.root, 'Documented.py')
+        with open(self.modulePath, 'w') as module:
+            module.write(MODULE_SOURCE)
+        self._age(self.modulePath)
+        self.cache = UserCache(
+            'module-docs.json',
+            directory=os.path.join(self.root, 'cache') )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _age(self, path, seconds=100):
+        mtime = int(os.stat(path).st_mtime) - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_docstringWithoutImport(self):
+        cut = DocHarvester()
+        found, doc = cut.docstring(self.modulePath, 'Documented')
+        self.assertTrue(found)
+        self.assertEqual(
+            doc,
+            "Purpose: Be documented\n       Options: none\n    " )
+        self.assertFalse('some_module_that_is_not_installed' in sys.modules)
+
+    def test_undocumentedAndMissingClasses(self):
+        cut = DocHarvester()
+        self.assertEqual(
+            cut.docstring(self.modulePath, 'Undocumented'),
+            (True, None) )
+        self.assertEqual(
+            cut.docstring(self.modulePath, 'NotHere'),
+            (False, None) )
+
+    def test_syntaxErrorIsNotFound(self):
+        with open(self.modulePath, 'a') as module:
+            module.write("\nclass Broken(:\n")
+        cut = DocHarvester()
+        self.assertEqual(
+            cut.docstring(self.modulePath, 'Documented'),
+            (False, None) )
+
+    def test_cachedUntilFileChanges(self):
+        cut = DocHarvester(self.cache)
+        cut.docstring(self.modulePath, 'Documented')
+        cut.save()
+        cut = DocHarvester(self.cache)
+        self.assertTrue(os.path.abspath(self.modulePath) in cut.entries)
+        self.assertTrue(cut.docstring(self.modulePath, 'Documented')[0])
+        self.assertFalse(cut.dirty)
+        with open(self.modulePath, 'w') as module:
+            module.write('class Documented:\n    "Changed"\n')
+        stat = os.stat(self.modulePath)
+        os.utime(self.modulePath, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(
+            cut.docstring(self.modulePath, 'Documented'),
+            (True, "Changed") )
+
+    def test_recentFileIsNotRemembered(self):
+        cut = DocHarvester(self.cache)
+        os.utime(self.modulePath, None)
+        self.assertTrue(cut.docstring(self.modulePath, 'Documented')[0])
+        self.assertEqual(cut.entries, {})
+
+    def test_cachedDocstringsAreBytes(self):
+        with open(self.modulePath, 'w') as module:
+            module.write(
+                '# -*- coding: latin-1 -*-\n'
+                'class Documented:\n    "Caf\xe9"\n' )
+        self._age(self.modulePath)
+        cut = DocHarvester(self.cache)
+        found, doc = cut.docstring(self.modulePath, 'Documented')
+        cut.save()
+        cut = DocHarvester(self.cache)
+        self.assertEqual(
+            cut.docstring(self.modulePath, 'Documented'),
+            (True, doc) )
+        self.assertFalse(cut.dirty)
+        self.assertTrue(isinstance(
+            cut.docstring(self.modulePath, 'Documented')[1],
+            str ))
+        self.assertTrue(isinstance(cut.entries.keys()[0], str))
@@ -0,0 +1,117 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os.path
+import json
+import threading
+from EventStream import EventStream
+
+class ChildThread(threading.Thread):
+    def __init__(self, work):
+        threading.Thread.__init__(self)
+        self.work = work
+        self._parent = threading.currentThread()
+
+    def parent(self):
+        return self._parent
+
+    def run(self):
+        self.work()
+
+class FakeResult:
+    def __init__(self, sectionType, sectionId, status='Passed'):
+        self.params = {
+            'Type' : sectionType,
+            'Id' : sectionId,
+            'status' : status }
+
+class FakeModule:
+    def __init__(self, calledId):
+        self.calledId = calledId
+        self.log = FakeResult('Shell', calledId, 'Skipped')
+
+class testEventStream_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'events.jsonl')
+        self.programLog = FakeResult('', '')
+        self.cut = EventStream(
+            EventStream.openStream(self.path),
+            self.programLog )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _events(self):
+        self.cut.close()
+        with open(self.path) as events:
+            return [ json.loads(line) for line in events ]
+
+    def test_stepsAndPhases(self):
+        self.cut.phaseStarted('build')
+        outer = self.cut.stepStarted('outer', 'build')
+        def work():
+            inner = self.cut.stepStarted('inner', 'build')
+            self.cut.logRecord(FakeResult('Shell', 'inner'), 'INFO', 'hi')
+            self.cut.stepEnded(
+                inner, 'inner', 'Shell@inner', 'build', FakeResult('Shell', 'inner') )
+        child = ChildThread(work)
+        child.start()
+        child.join()
+        self.cut.logRecord(self.programLog, 'WARNING', 'from csmake')
+        self.cut.stepEnded(outer, 'outer', 'command@outer', 'build', None)
+        self.cut.phaseEnded(None, 'build', True)
+        events = self._events()
+        self.assertEqual(
+            [ x['event'] for x in events ],
+            [ 'phaseStarted', 'stepStarted', 'stepStarted', 'log',
+              'stepEnded', 'log', 'stepEnded', 'phaseEnded' ] )
+        self.assertEqual(
+            [ x['nesting'] for x in events ],
+            [ 0, 0, 1, 2, 1, 1, 0, 0 ] )
+        self.assertEqual(events[3]['section'], 'Shell@inner')
+        self.assertEqual(events[3]['message'], 'hi')
+        self.assertEqual(events[3]['thread'], child.name)
+        self.assertEqual(events[4]['status'], 'Passed')
+        self.assertTrue(events[4]['seconds'] >= 0)
+        self.assertTrue(events[5]['section'] is None)
+        self.assertTrue(events[6]['status'] is None)
+        self.assertTrue(events[7]['passed'])
+        for event in events:
+            self.assertTrue(event['ts'] > 0)
+
+    def test_joinpoints(self):
+        module = FakeModule('Shell@x')
+        token = self.cut.joinpointStarted('start', 'build', module)
+        self.cut.joinpointEnded(token, 'start', 'build', module)
+        events = self._events()
+        self.assertEqual(events[0]['event'], 'joinpointStarted')
+        self.assertEqual(events[1]['joinpoint'], 'start')
+        self.assertEqual(events[1]['section'], 'Shell@x')
+        self.assertEqual(events[1]['status'], 'Skipped')
+
+    def test_fileDescriptor(self):
+        self.cut.close()
+        readfd, writefd = os.pipe()
+        cut = EventStream(EventStream.openStream(str(writefd)))
+        cut.phaseStarted('build')
+        cut.close()
+        with os.fdopen(readfd) as pipe:
+            self.assertEqual(json.loads(pipe.readline())['phase'], 'build')
@@ -16,10 +16,13 @@
 # </copyright>
 import re
 import unittest
+import threading
 import os.path
 import FileManager
 reload(FileManager)
 from FileManager import FileManager, MetadataFileTracker, FileSpec
+from FileManager import PathPrefixIndex
+from DirectorySnapshot import DirectorySnapshot
 
 class testFileManager_basic(unittest.TestCase):
 
@@ -417,3 +420,213 @@ class testFileManager_basic(unittest.TestCase):
     def test_translateStarsToResultRegex(self):
         result = FileManager.translateStarsToResultRegex('file{~~file~~}.mine')
         self.assertEqual(result, r'file\g<file>.mine')
+
+    def test_regexLiteralPrefix(self):
+        prefix = FileManager.regexLiteralPrefix
+        self.assertEqual(
+            prefix(FileManager.translateStarsToSourceRegex('/a/b/*.ext')),
+            ('/a/b/', False) )
+        self.assertEqual(prefix('^src/(.*)\.c'), ('src/', True))
+        self.assertEqual(prefix('/a/b.c'), ('/a/b', False))
+        self.assertEqual(prefix('/a/(x)?/b'), ('/a/', False))
+        self.assertEqual(prefix('/a/(?:b/c)/d'), ('/a/b/c/d', False))
+        self.assertEqual(prefix('/ab?c'), ('/a', False))
+        self.assertEqual(prefix('/a|/b'), ('', False))
+        self.assertEqual(prefix('(?i)/a'), ('', False))
+
+    def test_pathPrefixIndex(self):
+        cut = PathPrefixIndex(['/a/b/c.c', '/a/bc/d.c', '/a/x.c', 'rel/a'])
+        cut.add('/a/b/e.c')
+        self.assertEqual(
+            sorted(cut.pathsWithPrefix('/a/b')),
+            ['/a/b/c.c', '/a/b/e.c', '/a/bc/d.c'] )
+        self.assertEqual(
+            sorted(cut.pathsWithPrefix('/a/b/')),
+            ['/a/b/c.c', '/a/b/e.c'] )
+        self.assertEqual(cut.pathsWithPrefix('/q/'), [])
+        self.assertEqual(len(cut.pathsWithPrefix('')), 5)
+
+    def test_locationLookupUsesPrefixIndex(self):
+        cut = self._createaCUT()
+        cut.parseFileDeclaration("<myid(test:testing)> test_*.ext")
+        cut.parseFileDeclaration("<sub(test:testing)> other-fakeworking/*")
+        spec = FileSpec(location=os.path.join(self.working, 'test_*.ext'))
+        relspec = FileSpec(relLocation='*_1.ext')
+        expected = sorted([ x.recordId() for x in cut.findRecords(spec) ])
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(cut.prefixIndexes, None)
+        minimum = FileManager.PREFIX_INDEX_MIN_KEYS
+        FileManager.PREFIX_INDEX_MIN_KEYS = 0
+        try:
+            self.assertEqual(
+                sorted([ x.recordId() for x in cut.findRecords(spec) ]),
+                expected )
+            self.assertEqual(cut.prefixIndexes.keys(), ['location'])
+            cut.parseFileDeclaration("<late(test:testing)> other_*.ext")
+            late = FileSpec(location=os.path.join(self.working, 'other_*.ext'))
+            self.assertEqual(len(cut.findRecords(late)), 3)
+            self.assertEqual(
+                sorted([ x.recordId() for x in cut.findRecords(relspec) ]),
+                ['late', 'myid'] )
+        finally:
+            FileManager.PREFIX_INDEX_MIN_KEYS = minimum
+
+    def test_splitRegexPath(self):
+        self.assertEqual(
+            FileManager.splitRegexPath(r'/a/(b/c|d)/[/x]\/e'),
+            ['', 'a', '(b/c|d)', '[/x]', 'e'] )
+        self.assertEqual(
+            FileManager.classifyRegexPathPart(r'my\.file'),
+            ('literal', 'my.file') )
+        self.assertEqual(
+            FileManager.classifyRegexPathPart(r'my_\d+[.]other'),
+            ('name', r'my_\d+[.]other') )
+        for part in ['.*', r'[^.]', r'\W', '(?=x)', 'a|b', '(b/c|d)']:
+            self.assertEqual(
+                FileManager.classifyRegexPathPart(part)[0],
+                'any' )
+
+    def test_walkDiskMatchingRegexPrunes(self):
+        listed = []
+        original = FileManager._listDirectory
+        def _listDirectory(path):
+            listed.append(path)
+            return original(path)
+        FileManager._listDirectory = staticmethod(_listDirectory)
+        try:
+            walker = FileManager.walkDiskMatchingRegex(
+                os.path.join(self.working, r'oth[e]r-\w+/my_[12]\.other') )
+            self.assertEqual(listed, [])
+            results = sorted(walker)
+        finally:
+            FileManager._listDirectory = staticmethod(original)
+        other = os.path.join(self.working, 'other-fakeworking')
+        self.assertEqual(results, [
+            os.path.join(other, 'my_1.other'),
+            os.path.join(other, 'my_2.other') ])
+        self.assertEqual(listed, [self.working, other])
+
+    def test_findDiskFilesMatchingLiteralRegex(self):
+        results = FileManager.findDiskFilesMatchingRegex(
+            os.path.join(self.working, r'other_1\.ext') )
+        self.assertEqual(results, [os.path.join(self.working, 'other_1.ext')])
+
+    def test_compiledSourceRegexIsKept(self):
+        spec = FileSpec(location='/a/*.ext', relLocation='*.ext')
+        compiled = spec.getSourceLocationCompiledRE()
+        self.assertEqual(compiled.pattern, spec.getSourceLocationRE())
+        self.assertTrue(compiled is spec.getSourceLocationCompiledRE())
+        self.assertTrue(compiled.match('/a/test_1.ext') is not None)
+        self.assertEqual(
+            spec.getSourceRelLocationCompiledRE().pattern,
+            spec.getSourceRelLocationRE() )
+        self.assertTrue(
+            FileSpec(id='myid').getSourceLocationCompiledRE() is None)
+
+    def test_compactFileRecords(self):
+        cut = self._createaCUT()
+        instances = cut.parseFileDeclaration('<myid(test:testing)> ~~test_.*')
+        self.assertEqual(len(instances), 5)
+        for instance in instances:
+            record = instance.getRecord()
+            self.assertFalse(hasattr(instance, '__dict__'))
+            self.assertFalse(hasattr(record, '__dict__'))
+            self.assertFalse('useRE' in instance.index)
+            self.assertFalse('useRE' in record.index)
+            self.assertTrue(instance.index['id'] is intern('myid'))
+            self.assertTrue(record.parents is instances[0].getRecord().parents)
+        self.assertFalse('useRE' in cut.index)
+        self.assertEqual(
+            len(cut.findInstances(FileSpec(id='myid', type='test'))), 5)
+
+    def test_lookupsShareTheLock(self):
+        cut = self._createaCUT()
+        cut.parseFileDeclaration('<myid(test:testing)> test_*.ext')
+        found = []
+        def lookup():
+            found.extend(cut.findInstances(FileSpec(location='*/test_1.ext')))
+        cut.lock.acquireRead()
+        try:
+            thread = threading.Thread(target=lookup)
+            thread.start()
+            thread.join(5)
+        finally:
+            cut.lock.releaseRead()
+        self.assertEqual(len(found), 1)
+
+    def test_literalDirectory(self):
+        self.assertEqual(
+            FileManager.literalDirectory({'location' : '/a/b/*.c'}),
+            '/a/b' )
+        self.assertEqual(
+            FileManager.literalDirectory(
+                {'location' : r'/a/b/(.*)\.c', 'useRE' : '~~'}),
+            '/a/b' )
+        self.assertEqual(
+            FileManager.literalDirectory({'location' : '/a/b/c.txt'}),
+            '/a/b' )
+
+    def test_producedFilesSkipTheSnapshot(self):
+        class FakeEnv:
+            pass
+        cut = self._createaCUT()
+        cut.env = FakeEnv()
+        cut.env.directorySnapshot = DirectorySnapshot()
+        #A listing of the working directory from before the files existed
+        cut.env.directorySnapshot.listings[self.working] = (
+            os.stat(self.working).st_mtime, [], {} )
+        result = cut.addFileIndexes(
+            cut.parseFileDeclarationForIndexes('<myid(test:testing)> *.ext'))
+        self.assertEqual(len(result), 0)
+        result = cut.addFileIndexes(
+            cut.parseFileDeclarationForIndexes('<myid(test:testing)> *.ext'),
+            produced=True )
+        self.assertEqual(len(result), 8)
+
+    def test_walkDiskMatchingRegexSlashInGroup(self):
+        other = os.path.join(self.working, 'other-fakeworking')
+        self.assertEqual(
+            FileManager.classifyRegexPathPart('(?:other-fakeworking/)?my_1'),
+            ('any', '(?:other-fakeworking/)?my_1') )
+        self.assertEqual(
+            FileManager.classifyRegexPathPart(r'(a\/b)')[0],
+            'any' )
+        self.assertEqual(
+            sorted(FileManager.findDiskFilesMatchingRegex(
+                self.working + r'/(?:other-fakeworking/)?(?:my_1\.other|other_1\.ext)' )),
+            [os.path.join(other, 'my_1.other'),
+             os.path.join(self.working, 'other_1.ext')] )
+        self.assertEqual(
+            FileManager.findDiskFilesMatchingRegex(
+                self.working + r'/(?:other-fakeworking/)my_1\.other' ),
+            [os.path.join(other, 'my_1.other')] )
+
+    def test_addFileIndexesPublishesInOneShortWrite(self):
+        cut = self._createaCUT()
+        events = []
+        realLock = cut.lock
+        class WatchedLock:
+            depth = 0
+            def acquireWrite(self):
+                realLock.acquireWrite()
+                if self.depth == 0:
+                    events.append('locked')
+                self.depth += 1
+            def releaseWrite(self):
+                self.depth -= 1
+                realLock.releaseWrite()
+        cut.lock = WatchedLock()
+        realExists = os.path.exists
+        def exists(path):
+            events.append('disk')
+            return realExists(path)
+        os.path.exists = exists
+        try:
+            result = cut.parseFileDeclaration('<myid(test:testing)> test_*.ext')
+        finally:
+            os.path.exists = realExists
+        self.assertEqual(len(result), 5)
+        self.assertEqual(events.count('locked'), 1)
+        self.assertEqual(events[-1], 'locked')
+        cut.lock = realLock
+        self.assertEqual(len(cut.findInstances(FileSpec(id='myid'))), 5)
@@ -0,0 +1,146 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+from ModuleIndex import ModuleIndex
+from UserCache import UserCache
+
+class testModuleIndex_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.syspath = os.path.join(self.root, 'site-packages')
+        os.makedirs(os.path.join(self.syspath, 'withmodules', 'CsmakeModules'))
+        os.makedirs(os.path.join(self.syspath, 'without'))
+        self.package = os.path.join(
+            self.syspath, 'withmodules', 'CsmakeModules')
+        for name in ['Shell.py', 'command.py', 'notes.txt']:
+            open(os.path.join(self.package, name), 'w').close()
+        self._age(os.path.join(self.syspath, 'without'))
+        self._age(os.path.join(self.syspath, 'withmodules'))
+        self._age(self.syspath)
+        self._age(self.package)
+        self.cache = UserCache(
+            'module-index.json',
+            directory=os.path.join(self.root, 'cache') )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _age(self, path, seconds=100):
+        mtime = int(os.stat(path).st_mtime) - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_findsSubdirectoriesAndModules(self):
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(
+            cut.csmakeSubdirectories(self.syspath),
+            [os.path.join(self.syspath, 'withmodules')] )
+        self.assertEqual(
+            sorted(cut.moduleNames(self.package)),
+            ['Shell', 'command'] )
+        self.assertTrue(cut.moduleNames(
+            os.path.join(self.syspath, 'without', 'CsmakeModules')) is None)
+
+    def test_savedIndexIsUsed(self):
+        cut = ModuleIndex(self.cache)
+        cut.moduleNames(self.package)
+        cut.save()
+        #Change the file without changing the mtime of the directory
+        stat = os.stat(self.package)
+        open(os.path.join(self.package, 'Hidden.py'), 'w').close()
+        os.utime(self.package, (stat.st_atime, stat.st_mtime))
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(
+            sorted(cut.moduleNames(self.package)),
+            ['Shell', 'command'] )
+        self.assertFalse(cut.dirty)
+
+    def test_changedDirectoryIsRescanned(self):
+        cut = ModuleIndex(self.cache)
+        cut.moduleNames(self.package)
+        cut.save()
+        open(os.path.join(self.package, 'New.py'), 'w').close()
+        self._age(self.package, 50)
+        cut = ModuleIndex(self.cache)
+        self.assertTrue('New' in cut.moduleNames(self.package))
+
+    def test_installedCsmakeModulesDirectoryIsFound(self):
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(len(cut.csmakeSubdirectories(self.syspath)), 1)
+        cut.save()
+        installed = os.path.join(self.syspath, 'installed')
+        os.makedirs(os.path.join(installed, 'CsmakeModules'))
+        self._age(installed, 50)
+        self._age(self.syspath, 50)
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(
+            sorted(cut.csmakeSubdirectories(self.syspath)),
+            [installed, os.path.join(self.syspath, 'withmodules')] )
+
+    def test_removedCsmakeModulesDirectoryIsNoticed(self):
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(len(cut.csmakeSubdirectories(self.syspath)), 1)
+        cut.save()
+        #Removing <package>/CsmakeModules doesn't change the sys.path mtime
+        syspathStat = os.stat(self.syspath)
+        shutil.rmtree(self.package)
+        self.assertEqual(os.stat(self.syspath).st_mtime, syspathStat.st_mtime)
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(cut.csmakeSubdirectories(self.syspath), [])
+
+    def test_validatingDoesntStatEveryPackage(self):
+        for index in range(20):
+            os.makedirs(os.path.join(self.syspath, 'package%d' % index))
+        self._age(self.syspath)
+        cut = ModuleIndex(self.cache)
+        cut.csmakeSubdirectories(self.syspath)
+        cut.save()
+        stats = []
+        realStat = os.stat
+        def countingStat(path):
+            stats.append(path)
+            return realStat(path)
+        os.stat = countingStat
+        try:
+            cut = ModuleIndex(self.cache)
+            self.assertEqual(
+                cut.csmakeSubdirectories(self.syspath),
+                [os.path.join(self.syspath, 'withmodules')] )
+        finally:
+            os.stat = realStat
+        self.assertEqual(sorted(stats), [self.syspath, self.package])
+
+    def test_recentDirectoryIsNotRemembered(self):
+        cut = ModuleIndex(self.cache)
+        os.utime(self.package, None)
+        self.assertEqual(len(cut.moduleNames(self.package)), 2)
+        self.assertEqual(cut.packages, {})
+
+    def test_badCacheIsIgnored(self):
+        os.makedirs(self.cache.directory)
+        with open(self.cache.path, 'w') as cachefile:
+            cachefile.write('{not json')
+        cut = ModuleIndex(self.cache)
+        self.assertEqual(len(cut.moduleNames(self.package)), 2)
+        cut.save()
+        self.assertEqual(
+            self.cache.load()['version'],
+            ModuleIndex.VERSION )
@@ -0,0 +1,141 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os.path
+import subprocess
+import threading
+import time
+from OutputMultiplexer import OutputMultiplexer
+
+class ChildThread(threading.Thread):
+    def __init__(self, work):
+        threading.Thread.__init__(self)
+        self.work = work
+        self._parent = threading.currentThread()
+
+    def parent(self):
+        return self._parent
+
+    def run(self):
+        self.work()
+
+class testOutputMultiplexer_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'log.txt')
+        self.target = open(self.path, 'w')
+
+    def tearDown(self):
+        self.target.close()
+        shutil.rmtree(self.root)
+
+    def _output(self, cut):
+        cut.shutdown()
+        self.target.flush()
+        with open(self.path) as log:
+            return log.read()
+
+    def _step(self, cut, name, count, barrier=None):
+        channel = cut.open(name)
+        try:
+            self.assertTrue(cut.channel() is channel)
+            for i in range(count):
+                channel.write("%s %d\n" % (name, i))
+                if i == 0 and barrier is not None:
+                    barrier.wait(5)
+            channel.write("%s " % name)
+            subprocess.check_call(
+                ['echo', 'from-subprocess'],
+                stdout=channel )
+        finally:
+            channel.close()
+
+    def _runSteps(self, cut, names):
+        barrier = threading.Event()
+        threads = [
+            ChildThread(lambda x=x: self._step(cut, x, 50, barrier))
+            for x in names ]
+        for thread in threads:
+            thread.start()
+        barrier.set()
+        for thread in threads:
+            thread.join()
+
+    def test_stepModeKeepsStepsTogether(self):
+        cut = OutputMultiplexer(self.target, 'step')
+        self.assertTrue(cut.channel() is None)
+        self._runSteps(cut, ['a', 'b', 'c'])
+        lines = self._output(cut).splitlines()
+        self.assertEqual(len(lines), 153)
+        names = [ x.split(' ')[0] for x in lines ]
+        switches = [ x for x, y in zip(names, names[1:]) if x != y ]
+        self.assertEqual(len(switches), 2)
+        self.assertTrue('a from-subprocess' in lines)
+
+    def test_lineModePrefixesLines(self):
+        cut = OutputMultiplexer(self.target, 'line')
+        self._runSteps(cut, ['a', 'b'])
+        lines = self._output(cut).splitlines()
+        self.assertEqual(len(lines), 102)
+        for line in lines:
+            name = line[1]
+            self.assertTrue(line.startswith("[%s] %s " % (name, name)))
+
+    def test_nestedChannelsWriteThroughParent(self):
+        cut = OutputMultiplexer(self.target, 'line')
+        outer = cut.open('outer')
+        outer.write('before\n')
+        inner = ChildThread(lambda: self._step(cut, 'inner', 1))
+        inner.start()
+        inner.join()
+        outer.write('after\n')
+        outer.close()
+        lines = self._output(cut).splitlines()
+        self.assertEqual(lines, [
+            '[outer] before',
+            '[outer] [inner] inner 0',
+            '[outer] [inner] inner from-subprocess',
+            '[outer] after' ])
+
+    def test_writesAfterCloseGoToTarget(self):
+        cut = OutputMultiplexer(self.target, 'step')
+        channel = cut.open('late')
+        channel.write('during\n')
+        channel.close()
+        channel.write('after\n')
+        self.assertEqual(self._output(cut), 'during\nafter\n')
+
+    def test_badMode(self):
+        self.assertRaises(ValueError, OutputMultiplexer, self.target, 'direct')
+
+    def test_otherSubprocessesDontHoldChannels(self):
+        cut = OutputMultiplexer(self.target, 'step')
+        channel = cut.open('a')
+        channel.write('during\n')
+        #A step running in parallel starts a process that outlives 'a'
+        sibling = subprocess.Popen(['sleep', '3'])
+        try:
+            started = time.time()
+            channel.close()
+            self.assertTrue(time.time() - started < 1.0)
+        finally:
+            sibling.kill()
+            sibling.wait()
+        self.assertEqual(self._output(cut), 'during\n')
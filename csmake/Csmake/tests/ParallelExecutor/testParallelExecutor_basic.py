@@ -0,0 +1,100 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import threading
+import time
+from ParallelExecutor import ParallelExecutor
+
+class testParallelExecutor_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.highwater = 0
+
+    def tearDown(self):
+        if hasattr(self, 'cut'):
+            self.cut.shutdown()
+
+    def _tracked(self, value=True):
+        def work():
+            with self.lock:
+                self.running += 1
+                self.highwater = max(self.highwater, self.running)
+            time.sleep(0.02)
+            with self.lock:
+                self.running -= 1
+            return value
+        return work
+
+    def test_unlimited(self):
+        self.cut = ParallelExecutor(0)
+        batch = self.cut.batch()
+        tasks = [ batch.submit(str(x), self._tracked(x)) for x in range(6) ]
+        done = batch.join()
+        self.assertEqual(len(done), 6)
+        self.assertEqual([ x.result for x in tasks ], range(6))
+        self.assertEqual(self.highwater, 6)
+        self.assertTrue(batch.wait() is None)
+
+    def test_globalLimit(self):
+        self.cut = ParallelExecutor(2)
+        batch = self.cut.batch()
+        for x in range(6):
+            batch.submit(str(x), self._tracked())
+        batch.join()
+        self.assertEqual(self.highwater, 2)
+        self.assertTrue(len(self.cut.workers) <= 2)
+
+    def test_batchLimit(self):
+        self.cut = ParallelExecutor(0)
+        batch = self.cut.batch(3)
+        tasks = [ batch.submit(str(x), self._tracked()) for x in range(7) ]
+        batch.join()
+        self.assertEqual(self.highwater, 3)
+        self.assertTrue(max([ x.waited() for x in tasks ]) >= 0.02)
+
+    def test_nestedBatchesDoNotStarve(self):
+        self.cut = ParallelExecutor(1)
+        def nested():
+            inner = self.cut.batch()
+            for x in range(3):
+                inner.submit(str(x), self._tracked())
+            return len(inner.join())
+        batch = self.cut.batch()
+        tasks = [ batch.submit('outer%d' % x, nested) for x in range(2) ]
+        batch.join()
+        self.assertEqual([ x.result for x in tasks ], [3, 3])
+
+    def test_exceptionIsCaptured(self):
+        self.cut = ParallelExecutor(0)
+        def broken():
+            raise RuntimeError("broken")
+        batch = self.cut.batch()
+        task = batch.submit('broken', broken)
+        batch.join()
+        self.assertTrue(task.failed())
+        self.assertEqual(str(task.excinfo[1]), "broken")
+
+    def test_workerParentIsSubmitter(self):
+        self.cut = ParallelExecutor(0)
+        batch = self.cut.batch()
+        task = batch.submit(
+            'parent',
+            lambda: threading.currentThread().parent() )
+        batch.join()
+        self.assertTrue(task.result is threading.currentThread())
@@ -0,0 +1,121 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import os
+import signal
+import platform
+import subprocess
+import time
+from ProcessGroup import ProcessTable
+from ProcessGroup import PidSignaller
+from ProcessGroup import ProcessGroup
+
+class testProcessGroup_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.children = []
+
+    def tearDown(self):
+        for child in self.children:
+            if child.poll() is None:
+                child.kill()
+                child.wait()
+
+    def _start(self, newGroup=False):
+        preexec = None
+        if newGroup:
+            preexec = os.setpgrp
+        child = subprocess.Popen(['sleep', '60'], preexec_fn=preexec)
+        self.children.append(child)
+        return child
+
+    def _group(self):
+        return ProcessGroup(self.csmake_test.log)
+
+    def test_processesHasThisProcess(self):
+        processes = ProcessTable.processes()
+        self.assertTrue(os.getpid() in processes)
+        self.assertEqual(processes[os.getpid()][0], os.getpgrp())
+
+    def test_processesAgreesWithPs(self):
+        child = self._start()
+        processes = ProcessTable.processes()
+        self.assertEqual(
+            processes[child.pid][0],
+            ProcessTable._psProcesses()[child.pid][0] )
+        self.assertEqual(ProcessTable.command(child.pid), 'sleep 60')
+
+    def test_strayProcessesAreKilled(self):
+        before = self._start()
+        group = self._group()
+        group.snapshot()
+        stray = self._start()
+        other = self._start(newGroup=True)
+        self.assertEqual(
+            [ pid for pid, starttime in group.stragglers() ],
+            [stray.pid] )
+        self.assertEqual(group.terminate(), [stray.pid])
+        self.assertEqual(stray.wait(), -signal.SIGKILL)
+        self.assertEqual(before.poll(), None)
+        self.assertEqual(other.poll(), None)
+
+    def test_reusedPidIsNotSignalled(self):
+        child = self._start()
+        starttime = ProcessTable.starttime(child.pid)
+        self.assertTrue(PidSignaller.send(child.pid, starttime + 1, 0))
+        time.sleep(0.1)
+        self.assertEqual(child.poll(), None)
+        self.assertTrue(
+            PidSignaller.send(child.pid, starttime, signal.SIGTERM) )
+        self.assertEqual(child.wait(), -signal.SIGTERM)
+
+    def test_goneProcessIsSignalled(self):
+        child = self._start()
+        starttime = ProcessTable.starttime(child.pid)
+        child.kill()
+        child.wait()
+        self.assertTrue(
+            PidSignaller.send(child.pid, starttime, signal.SIGKILL) )
+
+    def test_signalWithoutPidfds(self):
+        pidfds = PidSignaller._pidfds
+        PidSignaller._pidfds = False
+        try:
+            child = self._start()
+            starttime = ProcessTable.starttime(child.pid)
+            self.assertTrue(PidSignaller.send(child.pid, starttime + 1, 0))
+            self.assertTrue(
+                PidSignaller.send(child.pid, starttime, signal.SIGTERM) )
+            self.assertEqual(child.wait(), -signal.SIGTERM)
+        finally:
+            PidSignaller._pidfds = pidfds
+
+    def test_noPidfdsOnUnknownMachines(self):
+        pidfds = PidSignaller._pidfds
+        machine = platform.machine
+        PidSignaller._pidfds = None
+        platform.machine = lambda: 'mips64'
+        try:
+            self.assertTrue(PidSignaller._syscall() is None)
+            child = self._start()
+            starttime = ProcessTable.starttime(child.pid)
+            self.assertTrue(
+                PidSignaller.send(child.pid, starttime, signal.SIGTERM) )
+            self.assertEqual(child.wait(), -signal.SIGTERM)
+        finally:
+            platform.machine = machine
+            PidSignaller._pidfds = pidfds
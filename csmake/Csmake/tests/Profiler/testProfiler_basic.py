@@ -0,0 +1,90 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os.path
+import json
+import threading
+from Profiler import Profiler
+
+class ChildThread(threading.Thread):
+    def __init__(self, work):
+        threading.Thread.__init__(self)
+        self.work = work
+        self._parent = threading.currentThread()
+
+    def parent(self):
+        return self._parent
+
+    def run(self):
+        self.work()
+
+class testProfiler_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'profile.json')
+        self.cut = Profiler(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _events(self, phase='X'):
+        self.cut.close()
+        with open(self.path) as profile:
+            events = json.load(profile)['traceEvents']
+        return dict([ (x['name'], x) for x in events if x['ph'] == phase ])
+
+    def test_nestedSpans(self):
+        phase = self.cut.phaseStarted('build')
+        step = self.cut.stepStarted('outer', 'build')
+        inner = self.cut.stepStarted('inner', 'build')
+        self.cut.stepEnded(inner, 'inner', 'Shell@inner', 'build', None)
+        self.cut.stepEnded(step, 'outer', 'command@outer', 'build', None)
+        self.cut.phaseEnded(phase, 'build', True)
+        events = self._events()
+        self.assertEqual(events['Shell@inner']['args']['parent'], 'outer')
+        self.assertEqual(events['command@outer']['args']['parent'], 'build')
+        self.assertTrue('parent' not in events['build']['args'])
+        self.assertTrue(events['build']['args']['passed'])
+        for event in events.values():
+            self.assertTrue('cpu_ms' in event['args'])
+            self.assertTrue(event['args']['peak_rss_kb'] > 0)
+        self.assertTrue(
+            events['Shell@inner']['ts'] >= events['command@outer']['ts'] )
+        self.assertTrue(
+            events['Shell@inner']['dur'] <= events['command@outer']['dur'] )
+
+    def test_parallelSpansFollowParentThread(self):
+        step = self.cut.stepStarted('parallel', 'build')
+        def work():
+            token = self.cut.stepStarted('child', 'build')
+            self.cut.stepEnded(token, 'child', 'Shell@child', 'build', None)
+        child = ChildThread(work)
+        child.start()
+        child.join()
+        self.cut.stepEnded(step, 'parallel', 'command@parallel', 'build', None)
+        events = self._events()
+        self.assertEqual(events['Shell@child']['args']['parent'], 'parallel')
+        self.assertNotEqual(
+            events['Shell@child']['tid'],
+            events['command@parallel']['tid'] )
+        flows = self._events('s')
+        self.assertEqual(
+            flows['launch']['tid'],
+            events['command@parallel']['tid'] )
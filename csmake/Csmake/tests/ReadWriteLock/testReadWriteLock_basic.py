@@ -0,0 +1,97 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import threading
+import time
+from ReadWriteLock import ReadWriteLock
+
+class testReadWriteLock_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.cut = ReadWriteLock()
+        self.events = []
+
+    def _inThread(self, function):
+        thread = threading.Thread(target=function)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_readersShare(self):
+        inside = threading.Event()
+        def read():
+            self.cut.acquireRead()
+            inside.set()
+            self.cut.releaseRead()
+        self.cut.acquireRead()
+        thread = self._inThread(read)
+        self.assertTrue(inside.wait(5))
+        thread.join(5)
+        self.cut.releaseRead()
+
+    def test_writerIsExclusive(self):
+        def read():
+            self.cut.acquireRead()
+            self.events.append('read')
+            self.cut.releaseRead()
+        self.cut.acquireWrite()
+        thread = self._inThread(read)
+        time.sleep(0.05)
+        self.events.append('write')
+        self.cut.releaseWrite()
+        thread.join(5)
+        self.assertEqual(self.events, ['write', 'read'])
+
+    def test_waitingWriterBlocksNewReaders(self):
+        def write():
+            self.cut.acquireWrite()
+            self.events.append('write')
+            self.cut.releaseWrite()
+        def read():
+            self.cut.acquireRead()
+            self.events.append('read')
+            self.cut.releaseRead()
+        self.cut.acquireRead()
+        writer = self._inThread(write)
+        time.sleep(0.05)
+        reader = self._inThread(read)
+        time.sleep(0.05)
+        self.assertEqual(self.events, [])
+        #A reader already holding the lock isn't held up
+        self.cut.acquireRead()
+        self.cut.releaseRead()
+        self.cut.releaseRead()
+        writer.join(5)
+        reader.join(5)
+        self.assertEqual(self.events, ['write', 'read'])
+
+    def test_reentrant(self):
+        self.cut.acquireWrite()
+        self.cut.acquire()
+        self.cut.acquireRead()
+        self.cut.releaseRead()
+        self.cut.release()
+        self.cut.releaseWrite()
+        self.assertTrue(self.cut.writer is None)
+        self.assertEqual(self.cut.readers, {})
+
+    def test_upgradeRaises(self):
+        self.cut.acquireRead()
+        self.assertRaises(RuntimeError, self.cut.acquireWrite)
+        self.cut.releaseRead()
+        self.assertRaises(RuntimeError, self.cut.releaseRead)
+        self.assertRaises(RuntimeError, self.cut.releaseWrite)
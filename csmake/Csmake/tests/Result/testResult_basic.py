@@ -0,0 +1,69 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import StringIO
+import pickle
+import json
+from Environment import Environment
+from Result import Result
+
+class testResult_basic(unittest.TestCase):
+
+    class FakeEngine:
+        def __init__(self):
+            self.settings = {'dev-output':False, 'debug':False,'verbose':False,'quiet':False, 'no-chatter':False}
+            self.log = None
+
+    def _createaCUT(self):
+        env = Environment(testResult_basic.FakeEngine())
+        cut = Result(env, {
+            'Out' : StringIO.StringIO(),
+            'Type' : 'Shell',
+            'Id' : 'step' })
+        cut.setTargetModule(object())
+        cut.passed()
+        cut.warning("Careful %s", 'now')
+        return cut
+
+    def test_jsonPrint(self):
+        cut = self._createaCUT()
+        fobj = StringIO.StringIO()
+        cut.jsonPrint(fobj)
+        parts = json.loads(fobj.getvalue())
+        self.assertEqual(parts['status'], 'Passed')
+        self.assertEqual(parts['Id'], 'step')
+        self.assertTrue('Careful now' in parts['Out'])
+        self.assertTrue('Err' not in parts)
+
+    def test_picklePrint(self):
+        cut = self._createaCUT()
+        fobj = StringIO.StringIO()
+        cut.picklePrint(fobj)
+        parts = pickle.loads(fobj.getvalue())
+        self.assertEqual(parts['Type'], 'Shell')
+        self.assertTrue('Careful now' in parts['Out'])
+
+    def test_recordListener(self):
+        cut = self._createaCUT()
+        records = []
+        cut.recordListener = lambda *args: records.append(args)
+        cut.error("Failed %d times", 2)
+        self.assertEqual(len(records), 1)
+        result, level, output, params = records[0]
+        self.assertTrue(result is cut)
+        self.assertEqual(level.strip(), 'ERROR')
+        self.assertEqual(output % params, 'Failed 2 times')
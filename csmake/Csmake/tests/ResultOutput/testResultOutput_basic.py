@@ -0,0 +1,111 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os.path
+import StringIO
+from ResultOutput import ResultOutput
+from ResultOutput import AllOutput
+from ResultOutput import TailOutput
+from ResultOutput import SpillOutput
+
+class testResultOutput_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_parseRetention(self):
+        self.assertEqual(ResultOutput.parseRetention(None), ('all', None))
+        self.assertEqual(ResultOutput.parseRetention('all'), ('all', None))
+        self.assertEqual(ResultOutput.parseRetention('tail:2'), ('tail', 2048))
+        self.assertEqual(
+            ResultOutput.parseRetention('spill'),
+            ('spill', ResultOutput.DEFAULT_TAIL_KB * 1024) )
+        for bad in ['some', 'tail:x', 'tail:0', 'all:3']:
+            self.assertRaises(ValueError, ResultOutput.parseRetention, bad)
+
+    def test_create(self):
+        self.assertTrue(isinstance(
+            ResultOutput.create('all', self.root, 'a'), AllOutput ))
+        self.assertTrue(isinstance(
+            ResultOutput.create('bogus', self.root, 'a'), AllOutput ))
+        self.assertTrue(isinstance(
+            ResultOutput.create('tail:1', self.root, 'a'), TailOutput ))
+        self.assertTrue(isinstance(
+            ResultOutput.create('spill', self.root, 'a'), SpillOutput ))
+        self.assertTrue(isinstance(
+            ResultOutput.create('spill', None, 'a'), TailOutput ))
+
+    def test_tailKeepsLastBytes(self):
+        cut = TailOutput(10)
+        cut.write('0123456789')
+        self.assertEqual(cut.getvalue(), '0123456789')
+        cut.write('abc')
+        cut.write('')
+        cut.write('defghijklmnop')
+        self.assertEqual(cut.size, 10)
+        value = cut.getvalue()
+        self.assertTrue(value.endswith('\nghijklmnop'))
+        self.assertTrue('16 bytes' in value)
+        fobj = StringIO.StringIO()
+        cut.copyTo(fobj)
+        self.assertEqual(fobj.getvalue(), value)
+
+    def test_spillWritesFile(self):
+        path = ResultOutput.spillPath(self.root, 'Shell@a/b')
+        self.assertEqual(
+            os.path.dirname(path),
+            os.path.join(self.root, ResultOutput.SPILL_DIRECTORY) )
+        self.assertTrue(os.path.basename(path).endswith('Shell@a_b.log'))
+        cut = SpillOutput(path, 4)
+        self.assertEqual(cut.getvalue(), '')
+        cut.write('hello ')
+        cut.flush()
+        self.assertTrue(cut.fobj is None)
+        cut.write('world')
+        value = cut.getvalue()
+        self.assertTrue(value.endswith('\norld'))
+        self.assertTrue(path in value)
+        fobj = StringIO.StringIO()
+        cut.copyTo(fobj)
+        self.assertEqual(fobj.getvalue(), 'hello world')
+        cut.close()
+        with open(path) as spill:
+            self.assertEqual(spill.read(), 'hello world')
+
+    def test_spillReplacesEarlierFile(self):
+        path = os.path.join(self.root, 'out', 'step.log')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as old:
+            old.write('from an earlier build')
+        cut = SpillOutput(path, 1024)
+        cut.write('new')
+        self.assertEqual(cut.getvalue(), 'new')
+        cut.close()
+
+    def test_unicodeOutputIsKept(self):
+        tail = TailOutput(1024)
+        spill = SpillOutput(os.path.join(self.root, 'out', 'step.log'), 1024)
+        for cut in [tail, spill]:
+            cut.write(u'caf\xe9 ')
+            cut.write('done')
+            self.assertEqual(cut.getvalue(), 'caf\xc3\xa9 done')
+        spill.close()
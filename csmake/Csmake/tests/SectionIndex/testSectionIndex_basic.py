@@ -0,0 +1,56 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+from SectionIndex import SectionIndex
+
+class testSectionIndex_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.cut = SectionIndex()
+        self.cut.add([
+            '~~phases~~',
+            'command@build',
+            'Shell@compile',
+            '&ShellAspect@compile tolerate',
+            'Shell@build',
+            '&Aspect@compile' ])
+
+    def test_lookupSection(self):
+        self.assertEqual(self.cut.lookupSection('compile'), 'Shell@compile')
+        self.assertEqual(self.cut.lookupSection('build'), 'command@build')
+        self.assertTrue(self.cut.lookupSection('~~phases~~') is None)
+        self.assertTrue(self.cut.lookupSection('nothere') is None)
+
+    def test_lookupAspects(self):
+        self.assertEqual(
+            self.cut.lookupAspects('compile'),
+            ['&ShellAspect@compile tolerate', '&Aspect@compile'] )
+        self.assertEqual(self.cut.lookupAspects('build'), [])
+
+    def test_addIsIncremental(self):
+        self.cut.add(['Shell@link', 'Shell@compile', '&Aspect@link'])
+        self.assertEqual(self.cut.lookupSection('link'), 'Shell@link')
+        self.assertEqual(self.cut.lookupSection('compile'), 'Shell@compile')
+        self.assertEqual(self.cut.lookupAspects('link'), ['&Aspect@link'])
+
+    def test_returnedAspectsAreCopies(self):
+        self.cut.lookupAspects('compile').append('&Bad@compile')
+        self.assertEqual(len(self.cut.lookupAspects('compile')), 2)
+
+    def test_clear(self):
+        self.cut.clear()
+        self.assertTrue(self.cut.lookupSection('compile') is None)
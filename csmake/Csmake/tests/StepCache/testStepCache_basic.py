@@ -0,0 +1,179 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import os
+import os.path
+from StepCache import StepCache
+from FileManager import FileMapping
+
+class FakeEnv:
+    def __init__(self, env):
+        self.env = env
+
+    def doSubstitutions(self, target):
+        return target % self.env
+
+class FakeLog:
+    def __init__(self):
+        self.values = {}
+        self.status = 'Unexecuted'
+
+    def getReturnValue(self, key):
+        return self.values.get(key)
+
+    def setReturnValue(self, value, key):
+        self.values[key] = value
+
+    def passed(self):
+        self.status = 'Passed'
+
+class FakeInstance:
+    def __init__(self, root, env):
+        self.env = env
+        self.log = FakeLog()
+        self.newfiles = None
+        self.yieldsfiles = None
+        self.yieldedfiles = None
+        self.deletingFiles = False
+        self.calledId = 'Fake@step'
+        self.mapping = FileMapping()
+
+class FakeFileInstance:
+    def __init__(self, location):
+        self.index = {'location' : location}
+
+class FakeEngine:
+    def lookupSection(self, step):
+        return None
+
+class testStepCache_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'source.txt')
+        self.output = os.path.join(self.root, 'results', 'output.txt')
+        os.makedirs(os.path.dirname(self.output))
+        self._write(self.source, 'source')
+        self.env = FakeEnv({'RESULTS' : os.path.join(self.root, 'results')})
+        self.cut = StepCache(os.path.join(self.root, 'cache'), 1024*1024)
+        self.stepdict = {
+            '**maps' : '<src> -(1-1)-> %(RESULTS)s/output.txt',
+            'command' : 'make it' }
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, path, content):
+        with open(path, 'w') as fileobj:
+            fileobj.write(content)
+
+    def _read(self, path):
+        with open(path) as fileobj:
+            return fileobj.read()
+
+    def _instance(self):
+        instance = FakeInstance(self.root, self.env)
+        instance.mapping.addMapping(
+            [FakeFileInstance(self.source)],
+            [{'location' : self.output}] )
+        return instance
+
+    def _fingerprint(self, instance, section='Fake@step', phase='build'):
+        return self.cut.fingerprint(
+            FakeEngine(), section, instance, self.stepdict, phase, [] )
+
+    def test_storeAndRestore(self):
+        instance = self._instance()
+        fingerprint = self._fingerprint(instance)
+        self._write(self.output, 'made')
+        instance.log.setReturnValue(['a', 1], 'build')
+        self.assertTrue(self.cut.store(fingerprint, instance, 'build'))
+        os.remove(self.output)
+        restored = self._instance()
+        self.assertEqual(self._fingerprint(restored), fingerprint)
+        self.assertTrue(self.cut.restore(fingerprint, restored, 'build'))
+        self.assertEqual(self._read(self.output), 'made')
+        self.assertEqual(restored.log.getReturnValue('build'), ['a', 1])
+        self.assertEqual(restored.log.status, 'Passed')
+
+    def test_fingerprintChanges(self):
+        fingerprint = self._fingerprint(self._instance())
+        self.assertNotEqual(
+            fingerprint,
+            self._fingerprint(self._instance(), phase='package') )
+        self.stepdict['command'] = 'make it differently'
+        changed = self._fingerprint(self._instance())
+        self.assertNotEqual(fingerprint, changed)
+        self._write(self.source, 'changed source')
+        self.assertNotEqual(changed, self._fingerprint(self._instance()))
+        self.env.env['RESULTS'] = os.path.join(self.root, 'other')
+        self.assertNotEqual(changed, self._fingerprint(self._instance()))
+
+    def test_notCached(self):
+        self.assertTrue(self._fingerprint(
+            self._instance(), section='command@build') is None)
+        instance = self._instance()
+        instance.mapping = None
+        self.assertTrue(self._fingerprint(instance) is None)
+        self.stepdict['**no-cache'] = 'True'
+        self.assertTrue(self._fingerprint(self._instance()) is None)
+
+    def test_missingEntryIsNotRestored(self):
+        instance = self._instance()
+        self.assertFalse(self.cut.restore('0'*64, instance, 'build'))
+        self.assertEqual(instance.log.status, 'Unexecuted')
+
+    def test_leastRecentlyUsedEvicted(self):
+        self.cut.maxBytes = 10
+        fingerprints = []
+        for content in ['123456', 'abcdef']:
+            self._write(self.source, content)
+            instance = self._instance()
+            fingerprint = self._fingerprint(instance)
+            self._write(self.output, content)
+            self.assertTrue(self.cut.store(fingerprint, instance, 'build'))
+            fingerprints.append(fingerprint)
+            entryPath = self.cut._entryPath(fingerprint)
+            mtime = os.stat(entryPath).st_mtime
+            os.utime(entryPath, (mtime - 100, mtime - 100))
+        self.assertFalse(os.path.exists(self.cut._entryPath(fingerprints[0])))
+        self.assertTrue(os.path.exists(self.cut._entryPath(fingerprints[1])))
+        self.assertEqual(len(os.listdir(self.cut.objects)), 1)
+
+    def test_cacheIsOnlyListedWhenOverTheLimit(self):
+        listed = []
+        realEvict = self.cut._evict
+        def countingEvict():
+            listed.append(True)
+            realEvict()
+        self.cut._evict = countingEvict
+        self.cut.maxBytes = 15
+        for age, content in enumerate(['12345', 'abcde', 'ABCDE', 'vwxyz']):
+            self._write(self.source, content)
+            instance = self._instance()
+            fingerprint = self._fingerprint(instance)
+            self._write(self.output, content)
+            self.assertTrue(self.cut.store(fingerprint, instance, 'build'))
+            entryPath = self.cut._entryPath(fingerprint)
+            mtime = os.stat(entryPath).st_mtime - 100 + age
+            os.utime(entryPath, (mtime, mtime))
+        #Only the fourth object takes the cache over the limit
+        self.assertEqual(len(listed), 1)
+        self.assertEqual(self.cut.totalBytes, 10)
+        self.assertEqual(len(os.listdir(self.cut.objects)), 2)
@@ -0,0 +1,222 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import threading
+import time
+from StepScheduler import StepDependencyGraph, StepScheduler
+from ParallelExecutor import ParallelExecutor
+
+class FakeEnvironment:
+    def doSubstitutions(self, value):
+        return value % {'RESULTS' : '/results'}
+
+class FakeLog:
+    def devdebug(self, output, *params):
+        pass
+
+    def error(self, output, *params):
+        pass
+
+    def failed(self):
+        pass
+
+class FakeResult:
+    def _didPass(self):
+        return True
+
+class FakeEngine:
+    """Runs every step as a short sleep and counts the steps
+       of each '&' group running at once"""
+
+    def __init__(self, sections, groupOf):
+        self.sections = sections
+        self.groupOf = groupOf
+        self.settings = {'keep-going' : False}
+        self.environment = FakeEnvironment()
+        self.executor = ParallelExecutor()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.highwater = {}
+
+    def lookupSection(self, stepname):
+        if stepname not in self.sections:
+            return None
+        return '%s@%s' % (self.sections[stepname][0], stepname)
+
+    def getSectionOptions(self, section):
+        return dict(self.sections[section.split('@')[-1]][1])
+
+    def getPhase(self):
+        return 'build'
+
+    def getParallelExecutor(self):
+        return self.executor
+
+    def launchParallelStep(self, stepname, phase):
+        group = self.groupOf[stepname]
+        with self.lock:
+            self.running[group] = self.running.get(group, 0) + 1
+            self.highwater[group] = max(
+                self.highwater.get(group, 0),
+                self.running[group] )
+        time.sleep(0.02)
+        with self.lock:
+            self.running[group] -= 1
+        return FakeResult()
+
+class testStepScheduler_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.sections = {
+            'sources' : ('Shell', {
+                '**files' : '<src(c:source)> src/*.c' }),
+            'compile' : ('Shell', {
+                '**maps' : '<src> -(1-1)-> <objs(o:object)> %(RESULTS)s/*.o' }),
+            'docs' : ('Shell', {
+                '**files' : '<docs(md:doc)> docs/*.md' }),
+            'link' : ('Shell', {
+                '**maps' : '<objs> -(*-1)-> <lib(so:library)> %(RESULTS)s/lib.so' }),
+            'strip' : ('Shell', {
+                '**maps' : '<lib> -(1-1)-> %(RESULTS)s/stripped.so' }),
+            'package-lib' : ('Shell', {
+                '**maps' : '<lib> -(*-1)-> <pkg(deb:package)> %(RESULTS)s/pkg.deb' }),
+            'myenv' : ('ShellEnv', {
+                'A' : 'b' }),
+            'usesenv' : ('Shell', {
+                'env' : 'myenv',
+                '**yields-files' : '<out(txt:out)> %(RESULTS)s/out.txt' }),
+            'opaque' : ('Shell', {
+                'command' : 'make' }),
+            'setenv' : ('environment', {
+                'x' : 'y' }) }
+
+    def _lookup(self, stepname):
+        return self.sections.get(stepname)
+
+    def _substitute(self, value):
+        return value % {'RESULTS' : '/results'}
+
+    def _graph(self, groups):
+        cut = StepDependencyGraph(self._lookup, self._substitute)
+        nodes = cut.createNodes(StepDependencyGraph.flattenCommand(groups))
+        for node in nodes:
+            cut._parseStep(node)
+        segments = list(cut.segments(nodes))
+        for segment in segments:
+            cut.analyze(segment)
+        return (nodes, segments)
+
+    def _deps(self, node):
+        return sorted([ x.stepname for x in node.deps ])
+
+    def test_trackedIdsOrderSteps(self):
+        nodes, segments = self._graph(
+            [['sources'], ['compile'], ['docs'], ['link']] )
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(self._deps(nodes[0]), [])
+        self.assertEqual(self._deps(nodes[1]), ['sources'])
+        self.assertEqual(self._deps(nodes[2]), [])
+        self.assertEqual(self._deps(nodes[3]), ['compile'])
+
+    def test_independentReadersOfSameId(self):
+        nodes, segments = self._graph(
+            [['sources'], ['compile'], ['link'], ['package-lib'], ['docs']] )
+        self.assertEqual(self._deps(nodes[3]), ['link'])
+        self.assertEqual(self._deps(nodes[4]), [])
+
+    def test_mapWithoutResultIdWritesSourceId(self):
+        nodes, segments = self._graph(
+            [['link'], ['strip'], ['package-lib']] )
+        self.assertTrue(('id', 'lib') in nodes[1].writes)
+        self.assertEqual(self._deps(nodes[2]), ['link', 'strip'])
+
+    def test_parallelGroupIsIndependent(self):
+        nodes, segments = self._graph(
+            [['sources', 'compile']] )
+        self.assertEqual(self._deps(nodes[1]), [])
+
+    def test_envReferenceOrdersSteps(self):
+        nodes, segments = self._graph(
+            [['usesenv'], ['myenv'], ['usesenv']] )
+        #myenv doesn't declare any files, so it is a barrier
+        self.assertEqual(len(segments), 3)
+        self.assertTrue(nodes[1].barrier)
+        self.assertTrue(('step', 'myenv') in nodes[2].reads)
+
+    def test_barriers(self):
+        nodes, segments = self._graph(
+            [['sources'], ['opaque'], ['docs', 'compile'], ['setenv'], ['link']] )
+        self.assertEqual(
+            [ [ x.stepname for x in segment ] for segment in segments ],
+            [['sources'], ['opaque'], ['docs', 'compile'], ['setenv'], ['link']] )
+        self.assertTrue(nodes[1].barrier)
+        self.assertTrue(nodes[4].barrier)
+        self.assertFalse(nodes[2].barrier)
+
+    def test_missingSectionIsBarrier(self):
+        nodes, segments = self._graph([['sources'], ['nothere'], ['docs']])
+        self.assertTrue(nodes[1].barrier)
+        self.assertEqual(len(segments), 3)
+
+    def _loc(self, location, useRE=False):
+        return ('loc', StepDependencyGraph.literalPrefix(location, useRE),
+                location, useRE)
+
+    def test_locationOverlap(self):
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results/*.o')], [self._loc('/results/a.o')] ))
+        self.assertFalse(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results/*.o')], [self._loc('/results/a.deb')] ))
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results')], [self._loc('/results/*/x.o')] ))
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results/*.o')], [self._loc('/results/*.deb')] ))
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results/(.*)\.o', True)], [self._loc('/results/a.o')] ))
+        self.assertFalse(StepDependencyGraph.resourcesOverlap(
+            [self._loc('/results/a')], [self._loc('/working/a')] ))
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [self._loc('')], [self._loc('/working/a')] ))
+        self.assertTrue(StepDependencyGraph.resourcesOverlap(
+            [('id', 'x')], [('anyid',)] ))
+        self.assertEqual(
+            StepDependencyGraph.literalPrefix('/a/b/*.c'), '/a/b/')
+        self.assertEqual(
+            StepDependencyGraph.literalPrefix('/a/b/(.*)\.c', True), '/a/b/')
+
+    def test_maxParallelHoldsWithJobs(self):
+        names = [ 'member%d' % x for x in range(6) ]
+        sections = dict([
+            (name, ('Shell', {
+                '**yields-files' : '<%s(txt:out)> %%(RESULTS)s/%s' % (
+                    name,
+                    name ) }))
+            for name in names ])
+        groupOf = dict([ (name, 'first') for name in names[:4] ])
+        groupOf.update([ (name, 'second') for name in names[4:] ])
+        engine = FakeEngine(sections, groupOf)
+        try:
+            cut = StepScheduler(
+                engine,
+                [names[:4], names[4:]],
+                6,
+                FakeLog(),
+                2 )
+            self.assertTrue(cut.run())
+        finally:
+            engine.executor.shutdown()
+        self.assertEqual(engine.highwater, {'first' : 2, 'second' : 2})
@@ -0,0 +1,94 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+from Substitutions import Substitutions
+from Substitutions import SubstitutionDict
+from Substitutions import SubstitutionTemplate
+from Environment import Environment
+
+class testSubstitutions_basic(unittest.TestCase):
+
+    class FakeEngine:
+        def __init__(self):
+            self.settings = {'dev-output':False, 'debug':False,'verbose':False,'quiet':False, 'no-chatter':False}
+            self.log = None
+
+    def test_templatesMatchPercentOperator(self):
+        env = SubstitutionDict(a='x', b=3, c=u'\xe9')
+        for text in [
+            'plain', '%(a)s/%(b)s', '100%% %(a)s', '%(b)d', '%(b)05d %(a)s',
+            '%s', '%(c)s-%(a)s', '%%' ]:
+            self.assertEqual(SubstitutionTemplate(text).render(env), text % env)
+        self.assertRaises(ValueError, SubstitutionTemplate('50%').render, env)
+        self.assertRaises(KeyError, SubstitutionTemplate('%(nope)s').render, env)
+
+    def test_templateReferences(self):
+        template = SubstitutionTemplate('%(a)s %%(b)s %(c)d')
+        self.assertEqual(template.references, ['a', 'c'])
+        self.assertTrue(template.positional is None)
+        self.assertEqual(
+            SubstitutionTemplate('%(a)s%%').positional, '%s%%' )
+
+    def test_resultsCachedUntilChanged(self):
+        cut = Substitutions()
+        env = SubstitutionDict(a='x')
+        self.assertEqual(cut.substitute('%(a)s!', env), 'x!')
+        self.assertEqual(cut.rendered['%(a)s!'], 'x!')
+        env['a'] = 'y'
+        self.assertEqual(cut.substitute('%(a)s!', env), 'y!')
+        del env['a']
+        self.assertRaises(KeyError, cut.substitute, '%(a)s!', env)
+        other = SubstitutionDict(a='z')
+        self.assertEqual(cut.substitute('%(a)s!', other), 'z!')
+        self.assertEqual(cut.substitute('%(a)s!', {'a' : 'plain'}), 'plain!')
+
+    def test_order(self):
+        cut = Substitutions()
+        order = cut.order({
+            'a' : '%(b)s',
+            'b' : '%(c)s/%(outside)s',
+            'c' : '%(c)s!',
+            'd' : 'd' })
+        self.assertTrue(order.index('c') < order.index('b') < order.index('a'))
+        self.assertEqual(sorted(order), ['a', 'b', 'c', 'd'])
+
+    def test_orderReportsCycles(self):
+        cut = Substitutions()
+        try:
+            cut.order({'a' : '%(b)s', 'b' : '%(c)s', 'c' : '%(a)s', 'd' : ''})
+            self.fail("Cycle was not reported")
+        except ValueError as e:
+            self.assertTrue('a -> b -> c -> a' in str(e))
+
+    def test_environmentUpdateResolvesDeepReferences(self):
+        env = Environment(testSubstitutions_basic.FakeEngine())
+        env.addTransPhase('RESULTS', '/results')
+        env.env['PATH'] = '/bin'
+        env.update({
+            'one' : ' %(two)s/1 ',
+            'two' : '%(three)s/2',
+            'three' : '%(four)s/3',
+            'four' : '%(RESULTS)s',
+            'PATH' : '%(PATH)s:/usr/bin',
+            '**ignored' : '%(undefined)s' })
+        self.assertEqual(env.env['one'], '/results/3/2/1')
+        self.assertEqual(env.env['PATH'], '/bin:/usr/bin')
+        self.assertTrue('**ignored' not in env.env)
+        self.assertEqual(env.doSubstitutions('%(two)s'), '/results/3/2')
+        env.flushAll()
+        self.assertEqual(env.env, {'RESULTS' : '/results'})
+        self.assertRaises(KeyError, env.doSubstitutions, '%(two)s')
@@ -0,0 +1,207 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+import unittest
+import tempfile
+import shutil
+import json
+import os.path
+from TimingHistory import TimingHistory
+from Plan import Plan, PlanStep
+
+class FakeResult:
+    def __init__(self, passed):
+        self.passed = passed
+
+    def didPass(self):
+        return self.passed
+
+class testTimingHistory_basic(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'csmake', 'timings.jsonl')
+        self.compactBytes = TimingHistory.COMPACT_BYTES
+
+    def tearDown(self):
+        TimingHistory.COMPACT_BYTES = self.compactBytes
+        shutil.rmtree(self.root)
+
+    def _lines(self):
+        with open(self.path) as timings:
+            return [ json.loads(x) for x in timings ]
+
+    def test_medianOfLastRuns(self):
+        history = TimingHistory(self.path)
+        self.assertEqual(history.estimate('Shell@a', 'build'), None)
+        for seconds in [100.0, 1.0, 3.0, 2.0, 5.0, 4.0]:
+            history.add('Shell@a', 'build', seconds)
+        history.save()
+        history = TimingHistory(self.path)
+        #The 100 second run has dropped out of the history
+        self.assertEqual(history.estimate('Shell@a', 'build'), 3.0)
+        self.assertEqual(history.estimate('Shell@a', 'clean'), None)
+        history.add('Shell@a', 'build', 6.0)
+        self.assertEqual(history.estimate('Shell@a', 'build'), 4.0)
+
+    def test_saveAppends(self):
+        history = TimingHistory(self.path)
+        history.add('Shell@a', 'build', 1.0)
+        history.save()
+        history.save()
+        history.add('Shell@b', 'build', 2.0)
+        history.save()
+        self.assertEqual(
+            [ (x['section'], x['seconds']) for x in self._lines() ],
+            [ ('Shell@a', 1.0), ('Shell@b', 2.0) ] )
+
+    def test_compact(self):
+        TimingHistory.COMPACT_BYTES = 0
+        history = TimingHistory(self.path)
+        for seconds in range(8):
+            history.add('Shell@a', 'build', float(seconds))
+        history.add('Shell@b', 'build', 9.0)
+        history.save()
+        lines = self._lines()
+        self.assertEqual(len(lines), TimingHistory.HISTORY + 1)
+        self.assertEqual(
+            sorted([ x['seconds'] for x in lines
+                     if x['section'] == 'Shell@a' ]),
+            [3.0, 4.0, 5.0, 6.0, 7.0] )
+
+    def test_listenerRecordsPassedSteps(self):
+        history = TimingHistory(self.path)
+        started = history.stepStarted('a', 'build')
+        history.stepEnded(started, 'a', 'Shell@a', 'build', FakeResult(True))
+        started = history.stepStarted('b', 'build')
+        history.stepEnded(started, 'b', 'Shell@b', 'build', FakeResult(False))
+        history.close()
+        self.assertEqual(
+            [ x['section'] for x in self._lines() ],
+            [ 'Shell@a' ] )
+
+    def test_projectsKeepSeparateHistories(self):
+        directory = os.path.join(self.root, 'csmake')
+        thisPath = TimingHistory.projectPath(directory, ['this/csmakefile'])
+        otherPath = TimingHistory.projectPath(directory, ['other/csmakefile'])
+        self.assertNotEqual(thisPath, otherPath)
+        self.assertEqual(
+            thisPath,
+            TimingHistory.projectPath(
+                directory,
+                [os.path.abspath('this/csmakefile')] ) )
+        history = TimingHistory(thisPath)
+        history.add('command@default', 'build', 100.0)
+        history.save()
+        history = TimingHistory(otherPath)
+        history.add('command@default', 'build', 1.0)
+        history.save()
+        self.assertEqual(
+            TimingHistory(thisPath).estimate('command@default', 'build'),
+            100.0 )
+        self.assertEqual(
+            TimingHistory(otherPath).estimate('command@default', 'build'),
+            1.0 )
+
+    def test_longestFirst(self):
+        history = TimingHistory(self.path)
+        history.add('Shell@short', 'build', 1.0)
+        history.add('Shell@long', 'build', 10.0)
+        history.add('Shell@also-short', 'build', 1.0)
+        sections = {
+            'short' : 'Shell@short',
+            'long' : 'Shell@long',
+            'also-short' : 'Shell@also-short',
+            'new' : 'Shell@new' }
+        self.assertEqual(
+            history.longestFirst(
+                ['short', 'long', 'missing', 'also-short', 'new'],
+                'build',
+                sections.get ),
+            ['missing', 'new', 'long', 'short', 'also-short'] )
+
+class FakeHistory:
+    def __init__(self, estimates):
+        self.estimates = estimates
+
+    def estimate(self, section, phase):
+        return self.estimates.get(section)
+
+class FakeEngine:
+    def __init__(self, limit=0):
+        self.settings = {'parallel-limit' : limit}
+
+class testPlan_basic(unittest.TestCase):
+
+    def _step(self, section, estimate=None, groups=None):
+        node = PlanStep(section.split('@')[-1], section)
+        node.estimate = estimate
+        node.groups = groups
+        return node
+
+    def test_groupTime(self):
+        self.assertEqual(Plan.groupTime([]), 0.0)
+        self.assertEqual(Plan.groupTime([3.0, 1.0, 2.0]), 3.0)
+        self.assertEqual(Plan.groupTime([3.0, 1.0, 2.0], 5), 3.0)
+        self.assertEqual(Plan.groupTime([3.0, 1.0, 2.0], 1), 6.0)
+        #Longest first on two lanes: [4, 1, 1] and [3, 2, 1]
+        self.assertEqual(Plan.groupTime([1.0, 2.0, 3.0, 4.0, 1.0, 1.0], 2), 6.0)
+
+    def test_estimateCommand(self):
+        plan = Plan(FakeEngine(), FakeHistory({'command@' : 30.0}), None)
+        a = self._step('Shell@a', 2.0)
+        b = self._step('Shell@b', 5.0)
+        c = self._step('Shell@c', 1.0)
+        command = self._step('command@', groups=[[a, b], [c]])
+        plan._estimate(command, 'build')
+        self.assertEqual(command.estimate, 6.0)
+        self.assertFalse(command.partial)
+
+        #A step without history makes the estimate a lower bound
+        #unless the command itself has history
+        c.estimate = None
+        plan._estimate(command, 'build')
+        self.assertEqual(command.estimate, 30.0)
+        plan = Plan(FakeEngine(), FakeHistory({}), None)
+        plan._estimate(command, 'build')
+        self.assertEqual(command.estimate, 5.0)
+        self.assertTrue(command.partial)
+        self.assertEqual(Plan.unknownSteps(command), 1)
+
+        #--parallel-limit holds back the '&' group
+        c.estimate = 1.0
+        plan = Plan(FakeEngine(1), FakeHistory({}), None)
+        plan._estimate(command, 'build')
+        self.assertEqual(command.estimate, 8.0)
+
+    def test_report(self):
+        a = self._step('Shell@a', 2.0)
+        b = self._step('Shell@b')
+        command = self._step('command@', 2.0, [[a, b]])
+        command.partial = True
+        missing = PlanStep('gone', None)
+        lines = Plan.report(command, 'build')
+        self.assertEqual(lines[0], "Plan for phase 'build':")
+        self.assertEqual(lines[1], '      >=2.000s  command@')
+        self.assertEqual(lines[2], '        2.000s    & Shell@a')
+        self.assertEqual(lines[3], '             ?    & Shell@b')
+        self.assertEqual(
+            lines[4],
+            "Estimated wall time for phase 'build': >=2.000s" )
+        self.assertEqual(lines[5], "    (Steps without timing history: 1)")
+        self.assertEqual(
+            Plan.report(missing, 'build')[1],
+            '             ?  gone (section not found)' )
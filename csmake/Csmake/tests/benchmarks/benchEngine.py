@@ -0,0 +1,407 @@
+# <copyright>
+# (c) Copyright 2017 Hewlett Packard Enterprise Development LP
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# </copyright>
+"""Measures the overhead the csmake engine adds to a build.
+
+   Builds of generated csmakefiles that only use no-op modules
+   (see CsmakeModules here) are timed end to end with the csmake
+   script, so everything measured is csmake itself:
+       steps - sequential steps: the cost of launchStep
+       aspects - steps with aspects: the cost of launchAspects
+       nested - subcommands inside subcommands
+       wide - one '&' group
+   Each is compared to a build of a single step to take out the
+   startup time, and reported as seconds per step, aspect,
+   nesting level, or parallel member.
+   The builds use csmake's defaults (checkpoints and timing history
+   are on, kept in a cache directory under the benchmark's
+   directory).  The sequential build is also run with those turned
+   off and reported as launchStep-per-step-features-off.
+
+   Parts of the hot path are also timed in this process: creating
+   a Result, option substitution, and FileManager declarations,
+   maps and lookups.
+
+   Every time reported is the best of --repeat runs.  Results can be
+   saved with --out and compared to an earlier run (e.g., on another
+   commit) with --compare, which exits 1 if anything got slower than
+   --threshold percent.
+
+   This is not a unit test and isn't run by 'csmake test':
+       python Csmake/tests/benchmarks/benchEngine.py --compare=before.json
+"""
+import os
+import os.path
+import sys
+import imp
+import json
+import time
+import shutil
+import timeit
+import optparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CSMAKE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(BENCH_DIR)))
+CSMAKE_SCRIPT = os.path.join(CSMAKE_ROOT, 'csmake')
+sys.path.insert(0, os.path.join(CSMAKE_ROOT, 'Csmake'))
+sys.path.insert(0, CSMAKE_ROOT)
+
+from Csmake.Settings import Settings
+from Environment import Environment
+from Result import Result
+from FileManager import FileManager, FileSpec
+from CsmakeModule import CsmakeModule
+
+class SpecGenerator:
+    """Writes the synthetic csmakefiles for the engine benchmarks.
+       Every step is a BenchNoOp with a few options to substitute"""
+
+    def __init__(self):
+        self.lines = []
+
+    def _step(self, name):
+        self.lines.extend([
+            '[BenchNoOp@%s]' % name,
+            'description=No-op step %s' % name,
+            'source=%(WORKING)s/' + name,
+            'target=%(RESULTS)s/' + name,
+            '' ])
+
+    def _aspects(self, name, count):
+        for aspect in range(count):
+            self.lines.extend([
+                '[&BenchNoOpAspect@%s a%d]' % (name, aspect),
+                'description=No-op aspect %d' % aspect,
+                '' ])
+
+    def _command(self, module, name, groups):
+        self.lines.append('[%s@%s]' % (module, name))
+        self.lines.append('description=Benchmark %s' % name)
+        for index, group in enumerate(groups):
+            self.lines.append('%04d=%s' % (index, group))
+        self.lines.append('')
+
+    def steps(self, count, aspects=0):
+        names = [ 'step%d' % x for x in range(count) ]
+        for name in names:
+            self._step(name)
+            self._aspects(name, aspects)
+        self._command('command', 'bench', names)
+        return self
+
+    def nested(self, depth):
+        self._step('leaf')
+        child = 'leaf'
+        for level in range(depth):
+            name = 'level%d' % level
+            self._command('subcommand', name, [child])
+            child = name
+        self._command('command', 'bench', [child])
+        return self
+
+    def wide(self, width):
+        names = [ 'member%d' % x for x in range(width) ]
+        for name in names:
+            self._step(name)
+        self._command('command', 'bench', [' & '.join(names)])
+        return self
+
+    def write(self, path):
+        with open(path, 'w') as spec:
+            spec.write('\n'.join(self.lines))
+
+class EngineBench:
+    """Times whole csmake builds of generated csmakefiles"""
+
+    FEATURES_OFF = ['--no-checkpoint', '--no-timing-history']
+
+    def __init__(self, root, repeat):
+        self.root = root
+        self.repeat = repeat
+
+    def time(self, name, generator, flags=[]):
+        spec = os.path.join(self.root, '%s.csmake' % name)
+        generator.write(spec)
+        command = [
+            sys.executable,
+            CSMAKE_SCRIPT,
+            '--makefile=%s' % spec,
+            '--modules-path=:%s' % BENCH_DIR,
+            '--working-dir=%s' % self.root,
+            '--results-dir=%s' % os.path.join(self.root, 'target-%s' % name),
+            '--command=bench',
+            '--quiet',
+            '--no-chatter' ] + flags + [ 'build' ]
+        #csmake takes its current directory from PWD
+        env = dict(os.environ)
+        env['PWD'] = self.root
+        env['XDG_CACHE_HOME'] = os.path.join(self.root, 'cache')
+        best = None
+        with open(os.devnull, 'w') as devnull:
+            for _ in range(self.repeat):
+                started = time.time()
+                returncode = subprocess.call(
+                    command,
+                    stdout=devnull,
+                    stderr=devnull,
+                    cwd=self.root,
+                    env=env )
+                elapsed = time.time() - started
+                if returncode != 0:
+                    raise RuntimeError(
+                        "The '%s' benchmark build failed: %s" % (
+                            name,
+                            ' '.join(command) ) )
+                if best is None or elapsed < best:
+                    best = elapsed
+        return best
+
+    def run(self, params):
+        steps = params['steps']
+        aspects = params['aspects']
+        depth = params['depth']
+        width = params['width']
+        base = self.time('base', SpecGenerator().steps(1))
+        results = {'engine-startup' : base}
+        results['launchStep-per-step'] = (
+            self.time('steps', SpecGenerator().steps(steps)) - base
+        ) / (steps - 1)
+        baseOff = self.time(
+            'base-off',
+            SpecGenerator().steps(1),
+            EngineBench.FEATURES_OFF )
+        results['launchStep-per-step-features-off'] = (
+            self.time(
+                'steps-off',
+                SpecGenerator().steps(steps),
+                EngineBench.FEATURES_OFF ) - baseOff
+        ) / (steps - 1)
+        withAspects = self.time(
+            'aspects',
+            SpecGenerator().steps(steps, aspects) )
+        results['launchAspects-per-aspect'] = (
+            withAspects - base
+            - results['launchStep-per-step'] * (steps - 1)
+        ) / (steps * aspects)
+        results['subcommand-per-level'] = (
+            self.time('nested', SpecGenerator().nested(depth)) - base
+        ) / depth
+        results['parallel-per-member'] = (
+            self.time('wide', SpecGenerator().wide(width)) - base
+        ) / (width - 1)
+        return results
+
+class FakeEngine:
+    def __init__(self):
+        script = imp.load_source('csmakeScript', CSMAKE_SCRIPT)
+        self.settings = Settings(script.CSMAKE_SETTINGS)
+        self.settings['quiet'] = True
+        self.settings['no-chatter'] = True
+        self.log = None
+
+class HotPathBench:
+    """Times parts of the engine's hot path in this process"""
+
+    def __init__(self, root, repeat):
+        self.root = root
+        self.repeat = repeat
+        self.devnull = open(os.devnull, 'w')
+        self.env = Environment(FakeEngine())
+        self.env.update({
+            'WORKING' : os.path.join(root, 'working'),
+            'RESULTS' : os.path.join(root, 'results'),
+            'NAME' : 'bench',
+            'VERSION' : '%(NAME)s-1.0' })
+        self.log = Result(self.env, {'Out' : self.devnull})
+        self.working = self.env.env['WORKING']
+        self.results = self.env.env['RESULTS']
+        os.makedirs(os.path.join(self.working, 'src'))
+        os.makedirs(self.results)
+
+    def close(self):
+        self.devnull.close()
+
+    def time(self, function, number, setup=None):
+        """Returns the best seconds per call of function"""
+        if setup is None:
+            setup = lambda: None
+        timer = timeit.Timer(function, setup)
+        return min(timer.repeat(self.repeat, number)) / number
+
+    def _fileManager(self):
+        fileManager = FileManager()
+        fileManager.working = self.working
+        fileManager.results = self.results
+        fileManager.log = self.log
+        return fileManager
+
+    def run(self, params):
+        files = params['files']
+        for index in range(files):
+            with open(os.path.join(
+                self.working, 'src', 'f%d.c' % index), 'w') as source:
+                source.write('int f%d;\n' % index)
+        results = {}
+
+        info = {'Out' : self.devnull, 'Type' : 'BenchNoOp', 'Id' : 'x'}
+        results['Result-create'] = self.time(
+            lambda: Result(self.env, info),
+            1000 )
+
+        module = CsmakeModule(self.env, self.log)
+        module._initCallInfo({}, 'BenchNoOp@x')
+        options = dict([
+            ('option%d' % x, '%(WORKING)s/%(VERSION)s/' + str(x))
+            for x in range(10) ])
+        results['option-substitution'] = self.time(
+            lambda: module._doOptionSubstitutions(dict(options)),
+            1000 )
+
+        declaration = '<src(c:source)> src/*.c'
+        results['FileManager-declare'] = self.time(
+            lambda: self._fileManager().parseFileDeclaration(declaration),
+            10 )
+
+        mapping = '<src> -(1-1)-> <objs(o:object)> %s/{~~file~~}.o' % (
+            self.results )
+        #Each map is parsed by a new manager, so the maps don't pile up
+        managers = {}
+        def newManager():
+            managers['map'] = self._fileManager()
+            managers['map'].parseFileDeclaration(declaration)
+        results['FileManager-map'] = self.time(
+            lambda: managers['map'].parseFileMap(mapping),
+            1,
+            newManager )
+        fileManager = self._fileManager()
+        fileManager.parseFileDeclaration(declaration)
+        fileManager.parseFileMap(mapping)
+        spec = FileSpec(id='src', type='c')
+        results['FileManager-findRecords'] = self.time(
+            lambda: fileManager.findRecords(spec),
+            100 )
+        location = FileSpec(
+            location=os.path.join(self.working, 'src', 'f0.c') )
+        results['FileManager-findInstances-location'] = self.time(
+            lambda: fileManager.findInstances(location),
+            100 )
+        return results
+
+def commit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'describe', '--always', '--dirty'],
+                cwd=CSMAKE_ROOT,
+                stderr=devnull ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(before, after, threshold):
+    """Prints the change in each result and returns the names of
+       the results that got slower than threshold percent"""
+    regressions = []
+    if before['params'] != after['params']:
+        print "WARNING: The benchmarks were run with different parameters"
+        print "    before: %s" % json.dumps(before['params'], sort_keys=True)
+        print "    after:  %s" % json.dumps(after['params'], sort_keys=True)
+    print
+    print "Compared to %s:" % before.get('commit')
+    for name in sorted(after['results']):
+        if name not in before['results']:
+            continue
+        old = before['results'][name]
+        new = after['results'][name]
+        if old <= 0:
+            continue
+        change = (new - old) / old * 100.0
+        flag = ''
+        if change > threshold:
+            flag = '  <-- SLOWER'
+            regressions.append(name)
+        print "    %-40s %+8.1f%%%s" % (name, change, flag)
+    return regressions
+
+def main(argv):
+    parser = optparse.OptionParser(
+        usage="%prog [options]",
+        description=__doc__.split('\n')[0] )
+    parser.add_option('--steps', type='int', default=200,
+        help="Steps in the sequential and aspect builds [%default]")
+    parser.add_option('--aspects', type='int', default=3,
+        help="Aspects on each step of the aspect build [%default]")
+    parser.add_option('--depth', type='int', default=50,
+        help="Subcommand nesting of the nested build [%default]")
+    parser.add_option('--width', type='int', default=100,
+        help="Members of the '&' group in the wide build [%default]")
+    parser.add_option('--files', type='int', default=500,
+        help="Files for the FileManager benchmarks [%default]")
+    parser.add_option('--repeat', type='int', default=5,
+        help="Runs of each benchmark, the best is kept [%default]")
+    parser.add_option('--skip-engine', action='store_true', default=False,
+        help="Only run the in-process benchmarks")
+    parser.add_option('--out', default=None,
+        help="Write the results as json to this file")
+    parser.add_option('--compare', default=None,
+        help="Compare to results from an earlier --out")
+    parser.add_option('--threshold', type='float', default=15.0,
+        help="Percent slower that is a regression [%default]")
+    options, args = parser.parse_args(argv)
+    if options.steps < 2 or options.aspects < 1 \
+        or options.depth < 1 or options.width < 2 or options.repeat < 1:
+        parser.error("--steps and --width must be at least 2, "
+                     "--aspects, --depth, and --repeat at least 1")
+    params = {
+        'steps' : options.steps,
+        'aspects' : options.aspects,
+        'depth' : options.depth,
+        'width' : options.width,
+        'files' : options.files }
+
+    root = tempfile.mkdtemp(prefix='csmake-bench-')
+    results = {}
+    try:
+        hotPath = HotPathBench(root, options.repeat)
+        try:
+            results.update(hotPath.run(params))
+        finally:
+            hotPath.close()
+        if not options.skip_engine:
+            results.update(EngineBench(root, options.repeat).run(params))
+    finally:
+        shutil.rmtree(root)
+
+    report = {
+        'commit' : commit(),
+        'python' : sys.version.split()[0],
+        'params' : params,
+        'results' : results }
+    print "Seconds per operation (best of %d):" % options.repeat
+    for name in sorted(results):
+        print "    %-40s %12.6f" % (name, results[name])
+    if options.out is not None:
+        with open(options.out, 'w') as out:
+            json.dump(report, out, indent=4, sort_keys=True)
+    if options.compare is not None:
+        with open(options.compare) as before:
+            if len(compare(json.load(before), report, options.threshold)) > 0:
+                return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # </copyright>
 from Csmake.CsmakeModuleAllPhase import CsmakeModuleAllPhase
-import threading
+from Csmake.StepScheduler import StepScheduler
 
 class command(CsmakeModuleAllPhase):
     """Purpose: Execute a series of build steps - the initial step is
@@ -29,6 +29,14 @@ class command(CsmakeModuleAllPhase):
                  & - denotes steps that can be run in parallel
            description - Provides a description of the command that
                          csmake will use for --list-commands.
+           max-parallel - (OPTIONAL) The most steps from an '&' group
+                         that will run at once.  The steps past the limit
+                         wait for a running step to complete.
+                         This also holds with --jobs.
+                         Default: no limit other than --parallel-limit
+                                  (or --jobs)
+       The members of an '&' group that took the longest in past
+       builds are started first.
        Example:
            [command@build-pond]
            description = "This will build a small pond"
@@ -43,9 +51,18 @@ class command(CsmakeModuleAllPhase):
            Then repo4 would execute
            Then createPond would execute
            Finally, stockFish would execute
+
+       Scheduling: When csmake is run with --jobs=N, the ',' and '&'
+           ordering is treated as a default and the steps are run
+           as soon as the steps they depend on are complete (up to N
+           at a time).  Dependencies come from the **files, **maps,
+           and **yields-files declarations and env= references of the
+           steps.  Steps that declare none of these, and steps such as
+           environment, metadata, include, and (sub)commands, are run
+           in order with everything before them complete.
     """
 
-    RESERVED_FLAGS = ['description']
+    RESERVED_FLAGS = ['description', 'max-parallel']
 
     def __repr__(self):
         return "<<command step definition>>"
@@ -70,31 +87,65 @@ class command(CsmakeModuleAllPhase):
         self.log.devdebug("The command structure is %s", str(result))
         return result
 
-    def default(self, options):
-        class CommandThread(threading.Thread):
-            def __init__(innerself, parallelpart):
-
-                threading.Thread.__init__(innerself)
-                innerself.parallelpart = parallelpart.strip()
-                innerself.failure = True
-                innerself._parent = threading.currentThread()
+    def _getScheduledJobs(self):
+        jobs = self.engine.settings['jobs']
+        if jobs is None:
+            return None
+        try:
+            jobs = int(jobs)
+        except ValueError:
+            self.log.error("--jobs must be a number, got '%s'", jobs)
+            raise
+        if jobs < 1:
+            raise ValueError("--jobs must be at least 1")
+        return jobs
 
-            def run(innerself):
-                result = self.engine.launchStep(
-                    innerself.parallelpart,
-                    self.engine.getPhase())
-                innerself.failure = result is None or not result._didPass()
+    def _getMaxParallel(self, options):
+        if 'max-parallel' not in options:
+            return 0
+        limit = options['max-parallel']
+        try:
+            limit = int(limit)
+        except ValueError:
+            self.log.error("max-parallel must be a number, got '%s'", limit)
+            raise
+        if limit < 1:
+            raise ValueError("max-parallel must be at least 1")
+        return limit
 
-            def failed(innerself):
-                return innerself.failure
+    def _launchParallelPart(self, parallelpart):
+        result = self.engine.launchParallelStep(
+            parallelpart,
+            self.engine.getPhase())
+        return result is not None and result._didPass()
 
-            def parent(innerself):
-                return innerself._parent
+    def _runScheduled(self, steps, jobs, maxParallel):
+        scheduler = StepScheduler(
+            self.engine,
+            steps,
+            jobs,
+            self.log,
+            maxParallel )
+        passed = scheduler.run()
+        if not passed and not self.engine.settings['keep-going']:
+            return None
+        if passed:
+            self.log.passed()
+        return steps
 
+    def default(self, options):
         steps = self._prepareCommand(options)
+        self.engine.announceCommand(self.calledId, steps)
+        jobs = self._getScheduledJobs()
+        maxParallel = self._getMaxParallel(options)
+        if jobs is not None:
+            return self._runScheduled(steps, jobs, maxParallel)
         failure = False
         for step in steps:
-            threads = []
+            batch = None
+            tasks = []
+            if len(step) > 1:
+                step = self.engine.longestFirst(step, self.engine.getPhase())
             for parallelpart in step:
                 if len(step) < 2:
                     result = self.engine.launchStep(
@@ -107,21 +158,32 @@ class command(CsmakeModuleAllPhase):
                         if not self.engine.settings['keep-going']:
                             return None
                 else:
-                    threads.append(
-                        CommandThread(
-                            parallelpart ) )
-                    threads[-1].start()
-            for thread in threads:
-                if thread.isAlive():
-                    thread.join()
-                if thread.failed():
-                    self.log.error("XXXXXX Step '%s' FAILED XXXXXX" % thread.parallelpart)
-                    self.log.failed()
-                    failure = True
+                    if batch is None:
+                        batch = self.engine.getParallelExecutor().batch(
+                            maxParallel )
+                    parallelpart = parallelpart.strip()
+                    tasks.append(batch.submit(
+                        parallelpart,
+                        lambda part=parallelpart: self._launchParallelPart(part) ))
+            if batch is not None:
+                batch.join()
+                for task in tasks:
+                    self.log.info(
+                        "Step '%s' waited %0.3f seconds to start",
+                        task.name,
+                        task.waited() )
+                    if task.failed():
+                        self.log.error(
+                            "Step '%s' raised: %s",
+                            task.name,
+                            str(task.excinfo[1]) )
+                    if task.failed() or not task.result:
+                        self.log.error("XXXXXX Step '%s' FAILED XXXXXX" % task.name)
+                        self.log.failed()
+                        failure = True
             if failure and not self.engine.settings['keep-going']:
                 return None
 
         if not failure:
             self.log.passed()
         return steps
-
@@ -30,6 +30,9 @@ class environment(CsmakeModuleAllPhase):
                  /another/abs/this is/a really/coolpathPath/yeah
            and both "mypath" and "dpath" would be entered into the csmake
            environment.
+           Options may refer to each other to any depth, in any order,
+           but not in a cycle.  An option that refers to itself, like
+           path = %(path)s:/more, gets the value it had before.
        Usage:
            csmake environment variables may be accessed using the python
            dictionary "mod" operator notation, %(<variable>)s
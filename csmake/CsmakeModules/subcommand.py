@@ -29,6 +29,8 @@ class subcommand(command):
                    & - denotes steps that can be run in parallel
            description - provides a description (documentation) of what
                          the subcommand is supposed to accomplish.
+           max-parallel - (OPTIONAL) The most steps from an '&' group
+                         that will run at once (see command)
        Example:
            [subcommand@some-common-steps]
            description = "Encapsulates all the steps"
@@ -56,7 +58,7 @@ class subcommand(command):
            Finally, 'stockfish' would execute.
     """
 
-    RESERVED_FLAGS = ['description']
+    RESERVED_FLAGS = ['description', 'max-parallel']
 
     def __repr__(self):
         return "<<subcommand step definition>>"